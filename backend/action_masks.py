@@ -0,0 +1,91 @@
+"""Precomputed legal-action masks for the 132-action layout used by every agent.
+
+Action `a` decodes to type `a // 66` (0 bid, 1 challenge), quantity
+`(a % 66) // 6 + 1` and face value `a % 6 + 1`. All 66 challenge indices mean
+"challenge"; `DISTINCT_ACTIONS` keeps only the first one for search.
+
+`ACTION_MASKS[quantity, face_value, total_dice, last_action_was_challenge]`
+is the boolean row of actions `generate_ai_response` accepts in that position.
+"""
+import random
+
+import numpy as np
+
+from liars_dice_game_logic import GameState
+
+ACTION_SIZE = 132
+ACTIONS_PER_TYPE = ACTION_SIZE // 2
+MAX_QUANTITY = 10
+MAX_TOTAL_DICE = 10
+NUM_FACES = 6
+CHALLENGE_ACTION = ACTIONS_PER_TYPE
+
+_actions = np.arange(ACTION_SIZE)
+ACTION_TYPES = _actions // ACTIONS_PER_TYPE
+ACTION_QUANTITIES = (_actions % ACTIONS_PER_TYPE) // NUM_FACES + 1
+ACTION_FACE_VALUES = _actions % NUM_FACES + 1
+
+DISTINCT_ACTIONS = (ACTION_TYPES == 0) | (_actions == CHALLENGE_ACTION)
+
+
+def _build_action_masks():
+    quantity = np.arange(MAX_QUANTITY + 1)[:, None, None, None, None]
+    face_value = np.arange(NUM_FACES + 1)[None, :, None, None, None]
+    total_dice = np.arange(MAX_TOTAL_DICE + 1)[None, None, :, None, None]
+    challenged = np.array([False, True])[None, None, None, :, None]
+
+    raises = (ACTION_QUANTITIES > quantity) | ((ACTION_QUANTITIES == quantity) & (ACTION_FACE_VALUES > face_value))
+    valid_bid = (ACTION_TYPES == 0) & (ACTION_QUANTITIES <= total_dice) & raises
+    valid_challenge = (ACTION_TYPES == 1) & ~challenged
+    masks = valid_bid | valid_challenge
+    masks.setflags(write=False)
+    return masks
+
+
+ACTION_MASKS = _build_action_masks()
+
+
+def decode_action(action):
+    if isinstance(action, tuple):
+        return action
+    return int(ACTION_TYPES[action]), int(ACTION_QUANTITIES[action]), int(ACTION_FACE_VALUES[action])
+
+
+def action_mask(current_bid, total_dice, last_action_was_challenge):
+    return ACTION_MASKS[current_bid[0], current_bid[1], total_dice, int(last_action_was_challenge)]
+
+
+def state_action_mask(state):
+    """Mask for a `GameState` or a `LiarDiceGame.get_game_state()` dict."""
+    if isinstance(state, GameState):
+        return action_mask(state.current_bid, state.dice_count[0] + state.dice_count[1], state.last_action_was_challenge)
+    dice_count = state["dice_count"]
+    return action_mask(state["current_bid"], dice_count[1] + dice_count[2], state["last_action_was_challenge"])
+
+
+def batch_action_masks(current_bid, total_dice, last_action_was_challenge):
+    """(N, ACTION_SIZE) masks for arrays of bids (N, 2), dice totals (N,) and flags (N,)."""
+    current_bid = np.asarray(current_bid, dtype=np.intp)
+    return ACTION_MASKS[current_bid[:, 0], current_bid[:, 1], total_dice, np.asarray(last_action_was_challenge, dtype=np.intp)]
+
+
+def masked_argmax(values, mask):
+    """Index of the best legal action; works on one row or an (N, ACTION_SIZE) batch."""
+    return np.where(mask, values, -np.inf).argmax(axis=-1)
+
+
+def random_valid_action(mask):
+    valid_actions = np.flatnonzero(mask)
+    if len(valid_actions) == 0:
+        return random.randrange(ACTION_SIZE)
+    return int(valid_actions[random.randrange(len(valid_actions))])
+
+
+def epsilon_greedy_batch(values, masks, epsilon):
+    """Masked argmax per row, replaced by a uniform legal action with probability `epsilon`."""
+    actions = masked_argmax(values, masks)
+    explore = np.random.rand(len(actions)) <= epsilon
+    if explore.any():
+        # The argmax of uniform noise over the legal actions is a uniform legal action
+        actions[explore] = masked_argmax(np.random.rand(int(explore.sum()), masks.shape[-1]), masks[explore])
+    return actions
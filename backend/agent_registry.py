@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AgentRegistry:
+    """Loads each difficulty's agent on first use instead of at import time.
+
+    `loaders` maps a difficulty to a zero-argument function returning its
+    agent. `get` loads synchronously, `aget` loads on a worker thread so the
+    event loop keeps serving other rooms, and `warm_up` loads a list up front.
+    A loader that raises marks the difficulty failed; `get` then returns None
+    until the next `warm_up` retries it.
+    """
+
+    def __init__(self, loaders):
+        self.loaders = dict(loaders)
+        self.agents = {}
+        self.errors = {}
+        self.load_seconds = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, difficulty):
+        return difficulty in self.loaders or difficulty in self.agents
+
+    def register(self, difficulty, agent=None, loader=None):
+        """Adds an already built agent, or a loader for one."""
+        with self._lock:
+            if loader is not None:
+                self.loaders[difficulty] = loader
+            if agent is not None:
+                # Replaces the reference in one step; callers holding the old agent keep using it
+                self.agents[difficulty] = agent
+            elif loader is not None:
+                self.agents.pop(difficulty, None)
+            self.errors.pop(difficulty, None)
+
+    def get_loaded(self, difficulty):
+        """The agent if it is already loaded; never loads."""
+        return self.agents.get(difficulty)
+
+    def get(self, difficulty):
+        agent = self.agents.get(difficulty)
+        if agent is not None or difficulty not in self.loaders or difficulty in self.errors:
+            return agent
+        with self._lock:
+            if difficulty not in self.agents and difficulty not in self.errors:
+                self._load(difficulty)
+        return self.agents.get(difficulty)
+
+    async def aget(self, difficulty):
+        agent = self.agents.get(difficulty)
+        if agent is not None or difficulty not in self.loaders or difficulty in self.errors:
+            return agent
+        return await asyncio.to_thread(self.get, difficulty)
+
+    def _load(self, difficulty):
+        start = time.perf_counter()
+        try:
+            self.agents[difficulty] = self.loaders[difficulty]()
+        except Exception as e:
+            self.errors[difficulty] = f"{type(e).__name__}: {e}"
+            logger.exception(f"Loading the {difficulty} agent failed")
+        finally:
+            self.load_seconds[difficulty] = time.perf_counter() - start
+        if difficulty in self.agents:
+            logger.info(f"Loaded the {difficulty} agent in {self.load_seconds[difficulty]:.3f}s")
+
+    def warm_up(self, difficulties=None):
+        for difficulty in difficulties if difficulties is not None else list(self.loaders):
+            self.errors.pop(difficulty, None)
+            self.get(difficulty)
+
+    def loaded(self):
+        return dict(self.agents)
+
+    def is_ready(self, difficulties):
+        return all(difficulty in self.agents for difficulty in difficulties)
+
+    def status(self):
+        status = {}
+        for difficulty in set(self.loaders) | set(self.agents):
+            if difficulty in self.agents:
+                state = "loaded"
+            elif difficulty in self.errors:
+                state = "failed"
+            else:
+                state = "not_loaded"
+            status[difficulty] = {"state": state, "load_seconds": self.load_seconds.get(difficulty)}
+            if difficulty in self.errors:
+                status[difficulty]["error"] = self.errors[difficulty]
+        return status
@@ -0,0 +1,141 @@
+import asyncio
+import functools
+import itertools
+import logging
+import multiprocessing
+import weakref
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class AIExecutorSaturated(Exception):
+    pass
+
+
+def parse_limits(value):
+    # "easy=64,medium=64,hard=4" -> {"easy": 64, "medium": 64, "hard": 4}
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        difficulty, limit = item.split("=")
+        limits[difficulty.strip()] = int(limit)
+    return limits
+
+
+# Worker-process side of `run_batch`: difficulty -> (token, model), only the latest model per difficulty
+_worker_models = {}
+
+
+def _init_worker():
+    # Pays for the agent imports when the worker starts rather than on its first batch
+    import load_agents  # noqa: F401
+
+
+def _act_batch(difficulty, token, model, inputs, masks):
+    if model is None:
+        cached_token, model = _worker_models.get(difficulty, (None, None))
+        if cached_token != token:
+            return None  # not seen here yet; the caller resends with the model
+    else:
+        _worker_models[difficulty] = (token, model)
+    return model.act_batch(inputs, masks)
+
+
+class AIExecutor:
+    """Runs AI decisions off the event loop with per-difficulty concurrency limits.
+
+    `run` executes a function in a thread pool (or, with kind="process", a
+    process pool; the function and its arguments must then be picklable).
+    `run_threaded` always uses threads, for work that has to mutate state in
+    this process, such as a per-room agent's search tree or belief.
+    `run_batch` calls `model.act_batch`; a process worker keeps the model it
+    was sent, so later batches of the same model only carry their inputs.
+    Each difficulty may have `limits[difficulty]` jobs running, where one job is
+    an MCTS search or one micro-batch of DQN/Q-table decisions, and at most
+    `max_waiting` more queued behind them. Past that `run` raises
+    `AIExecutorSaturated` so the caller can degrade instead of queueing forever.
+    """
+
+    def __init__(self, kind="thread", max_workers=None, limits=None, default_limit=8, max_waiting=64):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai")
+        if kind == "process":
+            # spawn: the serving process already runs the event loop and the "ai" threads
+            self.pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker)
+        else:
+            self.pool = self.threads
+        self.kind = kind
+        self.limits = limits or {}
+        self.default_limit = default_limit
+        self.max_waiting = max_waiting
+        self.semaphores = {}
+        self.waiting = defaultdict(int)
+        self.running = defaultdict(int)
+        self.rejected = defaultdict(int)
+        self._tokens = weakref.WeakKeyDictionary()  # model -> token naming it to the worker processes
+        self._next_token = itertools.count()
+
+    def _semaphore(self, difficulty):
+        semaphore = self.semaphores.get(difficulty)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limits.get(difficulty, self.default_limit))
+            self.semaphores[difficulty] = semaphore
+        return semaphore
+
+    async def run(self, difficulty, fn, *args):
+        return await self._run(self.pool, difficulty, fn, args)
+
+    async def run_threaded(self, difficulty, fn, *args):
+        return await self._run(self.threads, difficulty, fn, args)
+
+    async def run_batch(self, difficulty, model, inputs, masks):
+        if self.kind == "thread":
+            return await self.run(difficulty, model.act_batch, inputs, masks)
+        token = self._tokens.get(model)
+        if token is None:
+            token = self._tokens[model] = next(self._next_token)
+        actions = await self.run(difficulty, _act_batch, difficulty, token, None, inputs, masks)
+        if actions is None:
+            # At most once per worker and model; tables and strategies pickle as their filename
+            actions = await self.run(difficulty, _act_batch, difficulty, token, model, inputs, masks)
+        return actions
+
+    async def _run(self, pool, difficulty, fn, args):
+        semaphore = self._semaphore(difficulty)
+        if semaphore.locked() and self.waiting[difficulty] >= self.max_waiting:
+            self.rejected[difficulty] += 1
+            raise AIExecutorSaturated(difficulty)
+
+        self.waiting[difficulty] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting[difficulty] -= 1
+
+        self.running[difficulty] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, functools.partial(fn, *args))
+        finally:
+            self.running[difficulty] -= 1
+            semaphore.release()
+
+    def stats(self):
+        difficulties = set(self.semaphores) | set(self.rejected)
+        return {
+            difficulty: {
+                "limit": self.limits.get(difficulty, self.default_limit),
+                "running": self.running[difficulty],
+                "waiting": self.waiting[difficulty],
+                "rejected": self.rejected[difficulty],
+            }
+            for difficulty in difficulties
+        }
+
+    def shutdown(self, wait=True):
+        if self.pool is not self.threads:
+            self.pool.shutdown(wait=wait)
+        self.threads.shutdown(wait=wait)
@@ -0,0 +1,145 @@
+import numpy as np
+
+NUM_PLAYERS = 2
+MAX_DICE = 5
+MAX_QUANTITY = 10
+NUM_FACES = 6
+
+
+class BatchedLiarDiceGame:
+    """Runs `num_games` independent LiarDiceGame instances as NumPy arrays.
+
+    Rules mirror `LiarDiceGame.make_bid`/`challenge`. Player numbers stay 1 and 2
+    (column 0 of the per-player arrays is player 1). Absent dice are stored as 0.
+    """
+
+    def __init__(self, num_games, seed=None):
+        self.num_games = num_games
+        self.rng = np.random.default_rng(seed)
+        self.dice = np.zeros((num_games, NUM_PLAYERS, MAX_DICE), dtype=np.int8)
+        self.dice_count = np.zeros((num_games, NUM_PLAYERS), dtype=np.int8)
+        self.current_bid = np.zeros((num_games, 2), dtype=np.int8)
+        self.current_player = np.zeros(num_games, dtype=np.int8)
+        self.last_action_was_challenge = np.zeros(num_games, dtype=bool)
+        self.scores = np.zeros((num_games, NUM_PLAYERS), dtype=np.int32)
+        self._slots = np.arange(MAX_DICE)
+        self._rows = np.arange(num_games)
+        self.reset()
+
+    def _mask(self, mask):
+        if mask is None:
+            return np.ones(self.num_games, dtype=bool)
+        return np.asarray(mask, dtype=bool)
+
+    def reset(self, mask=None):
+        mask = self._mask(mask)
+        self.dice_count[mask] = MAX_DICE
+        self.current_bid[mask] = (1, 1)  # Minimum bid to start each round
+        self.current_player[mask] = 1
+        self.last_action_was_challenge[mask] = False
+        self.scores[mask] = 0
+        self.roll_dice(mask)
+
+    def roll_dice(self, mask=None):
+        mask = self._mask(mask)
+        n = int(mask.sum())
+        faces = self.rng.integers(1, NUM_FACES + 1, size=(n, NUM_PLAYERS, MAX_DICE), dtype=np.int8)
+        alive = self._slots < self.dice_count[mask][:, :, None]
+        self.dice[mask] = np.where(alive, faces, 0)
+
+    def switch_player(self, mask=None):
+        mask = self._mask(mask)
+        self.current_player[mask] = 3 - self.current_player[mask]
+
+    def count_bid_face(self):
+        # 1s are wild unless the bid itself is on 1s; absent dice (0) never match
+        face = self.current_bid[:, 1][:, None, None]
+        matches = (self.dice == face) | ((self.dice == 1) & (face != 1))
+        matches &= self.dice > 0
+        return matches.sum(axis=(1, 2))
+
+    def make_bid(self, quantity, face_value, mask=None):
+        mask = self._mask(mask)
+        quantity = np.broadcast_to(np.asarray(quantity, dtype=np.int16), (self.num_games,))
+        face_value = np.broadcast_to(np.asarray(face_value, dtype=np.int16), (self.num_games,))
+        current_quantity = self.current_bid[:, 0]
+        current_face = self.current_bid[:, 1]
+
+        opening = (current_quantity == 1) & (current_face == 1)
+        raises = (quantity > current_quantity) | ((quantity == current_quantity) & (face_value > current_face))
+        valid = (
+            mask
+            & (face_value >= 1) & (face_value <= NUM_FACES)
+            & (quantity >= 1) & (quantity <= MAX_QUANTITY)
+            & (opening | raises)
+        )
+
+        self.current_bid[valid, 0] = quantity[valid]
+        self.current_bid[valid, 1] = face_value[valid]
+        self.last_action_was_challenge[valid] = False
+        self.switch_player(valid)
+        return valid
+
+    def challenge(self, mask=None):
+        """Current player challenges the standing bid in every masked game.
+
+        Returns a boolean array that is True where the challenge succeeded.
+        """
+        mask = self._mask(mask)
+        total_quantity = self.count_bid_face()
+        successful = mask & (total_quantity < self.current_bid[:, 0])
+
+        challenger = self.current_player.astype(np.intp) - 1
+        other = 1 - challenger
+        loser = np.where(successful, other, challenger)
+        winner = 1 - loser
+
+        rows = self._rows[mask]
+        loser, winner = loser[mask], winner[mask]
+        self.dice_count[rows, loser] = np.maximum(self.dice_count[rows, loser] - 1, 0)
+        self.scores[rows, winner] += 100
+        self.scores[rows, loser] = np.maximum(self.scores[rows, loser] - 100, 0)
+
+        self.switch_player(mask)
+        self.last_action_was_challenge[mask] = True
+        self.current_bid[mask] = 0
+        self.roll_dice(mask)
+        return successful
+
+    def step(self, action_type, quantity, face_value, mask=None):
+        """Vectorized `LiarDiceGame.step`; returns (rewards, dones)."""
+        mask = self._mask(mask)
+        action_type = np.broadcast_to(np.asarray(action_type), (self.num_games,))
+        bidding = mask & (action_type == 0)
+        challenging = mask & (action_type == 1)
+
+        rewards = np.zeros(self.num_games, dtype=np.int8)
+        valid_bid = self.make_bid(quantity, face_value, bidding)
+        rewards[bidding & ~valid_bid] = -1
+
+        successful = self.challenge(challenging)
+        rewards[challenging] = np.where(successful[challenging], 1, -1)
+
+        dones = mask & (self.is_game_over() | (bidding & ~valid_bid))
+        return rewards, dones
+
+    def is_game_over(self):
+        return (self.dice_count == 0).any(axis=1)
+
+    def get_winner(self):
+        # 0 where the game is still running, mirroring `LiarDiceGame.get_winner` returning None
+        winner = np.zeros(self.num_games, dtype=np.int8)
+        winner[self.dice_count[:, 1] == 0] = 1
+        winner[self.dice_count[:, 0] == 0] = 2
+        return winner
+
+    def get_game_state(self, index):
+        counts = self.dice_count[index]
+        return {
+            "dice_count": {1: int(counts[0]), 2: int(counts[1])},
+            "players": {p: [int(d) for d in self.dice[index, p - 1, :counts[p - 1]]] for p in (1, 2)},
+            "current_bid": (int(self.current_bid[index, 0]), int(self.current_bid[index, 1])),
+            "current_player": int(self.current_player[index]),
+            "last_action_was_challenge": bool(self.last_action_was_challenge[index]),
+            "scores": {1: int(self.scores[index, 0]), 2: int(self.scores[index, 1])},
+        }
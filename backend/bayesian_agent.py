@@ -1,68 +1,160 @@
-import logging
+"""Exact Bayesian inference over the opponent's hidden dice.
+
+Only how many dice of each face the opponent holds matters to a bid, so the
+belief is a posterior over face-count histograms: 252 of them for five dice,
+all enumerated once per dice count with their multinomial prior
+(`HISTOGRAMS`, `PRIOR`, `MATCHES`, `AT_LEAST`).
+
+Each opponent bid multiplies the posterior by its likelihood under a simple
+opponent model: with probability `bluff_rate` the bid says nothing, otherwise
+the opponent bids in proportion to how likely the bid is from their side of
+the table (`BID_TRUTH` with their matching dice). That is one gather and one
+multiply over the histograms. One matrix-vector product with the round's
+truth matrix (`AT_LEAST` shifted by the agent's own dice) then turns the
+posterior into the probability that each bid is true (`bid_truths`), so "is
+this bid true" is a lookup until the next bid.
+
+The posterior belongs to a round: dice are re-rolled after every challenge.
+`select_action(..., session=room)` keeps it between the moves of a room so
+every bid of the round counts; without a session only the standing bid is
+used. At most `max_sessions` beliefs are kept, least recently used first out.
+"""
+import threading
+from collections import OrderedDict
+from itertools import combinations_with_replacement
+from math import factorial, prod
+
 import numpy as np
 
-class BayesianAgent:
-    def __init__(self, num_players, num_dice):
-        self.num_players = num_players
+from action_masks import ACTION_FACE_VALUES, ACTION_QUANTITIES, CHALLENGE_ACTION, NUM_FACES, state_action_mask
+from batched_liars_dice_game import MAX_DICE
+from probability import BID_TRUTH, matching_counts
+
+DEFAULT_BLUFF_RATE = 0.2
+DEFAULT_CHALLENGE_THRESHOLD = 0.5
+DEFAULT_MAX_SESSIONS = 1024
+OPENING_BID = (1, 1)  # the standing bid of a new game, not a move of the opponent's
+BID_QUANTITIES = ACTION_QUANTITIES[:CHALLENGE_ACTION]
+BID_FACE_VALUES = ACTION_FACE_VALUES[:CHALLENGE_ACTION]
+
+
+def _histograms(num_dice):
+    # Every way num_dice dice can fall, as counts of faces 1..6
+    hands = np.array(list(combinations_with_replacement(range(NUM_FACES), num_dice)), dtype=np.intp)
+    counts = np.zeros((len(hands), NUM_FACES), dtype=np.intp)
+    for column in hands.T:
+        counts[np.arange(len(hands)), column] += 1
+    return counts
+
+
+def _build_tables():
+    histograms, prior, matches, at_least = [], [], [], []
+    for num_dice in range(MAX_DICE + 1):
+        counts = _histograms(num_dice)
+        histograms.append(counts)
+        prior.append(np.array([factorial(num_dice) / prod(factorial(c) for c in row) for row in counts]) / NUM_FACES ** num_dice)
+        # matching[h, f]: dice of histogram h that count towards a bid on face f (column 0 unused)
+        matching = np.zeros((len(counts), NUM_FACES + 1), dtype=np.intp)
+        matching[:, 1:] = counts + counts[:, :1]
+        matching[:, 1] = counts[:, 0]
+        matches.append(matching)
+        # at_least[f, m, h]: histogram h has m or more dice matching f, for every bid quantity m. Kept as
+        # bool since each session holds a (bids x histograms) slice; it is exact and an eighth of float64
+        at_least.append(np.ascontiguousarray(matching.T[:, None, :] >= np.arange(BID_QUANTITIES.max() + 1)[:, None]))
+    for table in histograms + prior + matches + at_least:
+        table.setflags(write=False)
+    return histograms, prior, matches, at_least
+
+
+# Indexed by the opponent's dice count
+HISTOGRAMS, PRIOR, MATCHES, AT_LEAST = _build_tables()
+
+
+class OpponentBelief:
+    """Posterior over the opponent's face counts during one round, seen by the holder of `own_dice`."""
+
+    __slots__ = ("num_dice", "own_dice_count", "round", "posterior", "truth_matrix", "bid_truths", "last_bid")
+
+    def __init__(self, num_dice, own_dice, round_key=None):
         self.num_dice = num_dice
-        self.beliefs = self.initialize_beliefs()
-
-    def initialize_beliefs(self):
-        beliefs = np.ones((self.num_players, 6)) / 6
-        return beliefs
-
-    def update_beliefs(self, state, action):
-        current_player = state['current_player']
-        if action['type'] == 'bid':
-            bid_quantity, bid_face = action['quantity'], action['face']
-            for player in range(self.num_players):
-                if player != current_player:
-                    self.beliefs[player, bid_face - 1] *= bid_quantity / self.num_dice
-                    self.beliefs[player] /= np.sum(self.beliefs[player])
-        elif action['type'] == 'challenge':
-            challenged_bid = state['current_bid']
-            actual_quantity = sum(state['players'][player].count(challenged_bid[1]) for player in range(self.num_players))
-            if actual_quantity >= challenged_bid[0]:
-                for player in range(self.num_players):
-                    if player != current_player:
-                        self.beliefs[player, challenged_bid[1] - 1] *= actual_quantity / self.num_dice
-                        self.beliefs[player] /= np.sum(self.beliefs[player])
-            else:
-                for player in range(self.num_players):
-                    if player != current_player:
-                        self.beliefs[player, challenged_bid[1] - 1] *= (self.num_dice - actual_quantity) / self.num_dice
-                        self.beliefs[player] /= np.sum(self.beliefs[player])
-
-    def get_action(self, state):
-        current_bid = state['current_bid']
-        if current_bid == (1, 1):
-            return {'type': 'bid', 'quantity': 1, 'face': 1}
-
-        current_player = state['current_player']
-        total_dice = self.num_dice * self.num_players
-
-        # Ensure `current_bid[1]` is within valid range
-        if not (1 <= current_bid[1] <= 6):
-            logging.error(f"Invalid bid face value: {current_bid[1]}")
-            return {'type': 'challenge'}
-
-        dice_count = state['dice_count']
-        if not (0 <= current_bid[1] - 1 < len(dice_count)):
-            logging.error(f"Invalid dice count index for bid face value: {current_bid[1]}")
-            return {'type': 'challenge'}
-
-        remaining_dice = total_dice - dice_count[current_bid[1] - 1]
-        prob_bid_correct = np.prod([np.sum(self.beliefs[player, current_bid[1] - 1:]) for player in range(self.num_players) if player != current_player])
-
-        if prob_bid_correct > 0.7:
-            quantity = current_bid[0] + 1
-            face = current_bid[1]
-            while quantity > remaining_dice:
-                quantity -= remaining_dice
-                face += 1
-            if face > 6:
-                logging.error(f"Invalid face value after adjustment: {face}")
-                return {'type': 'challenge'}
-            return {'type': 'bid', 'quantity': quantity, 'face': face}
-        else:
-            return {'type': 'challenge'}
+        self.own_dice_count = len(own_dice)  # the dice the opponent cannot see
+        self.round = round_key
+        self.posterior = PRIOR[num_dice]
+        self.last_bid = (0, 0)
+        # truth_matrix[a, h]: bid action a is true when the opponent's dice are histogram h
+        needed = np.maximum(BID_QUANTITIES - matching_counts(own_dice)[BID_FACE_VALUES], 0)
+        self.truth_matrix = AT_LEAST[num_dice][BID_FACE_VALUES, needed]
+        self.bid_truths = self.truth_matrix @ self.posterior
+
+    def observe_bid(self, quantity, face_value, bluff_rate=DEFAULT_BLUFF_RATE):
+        """Conditions the posterior on the opponent having bid `quantity` x `face_value`."""
+        # P(bid | the opponent holds m matching dice) for m = 0..MAX_DICE, then spread over the histograms
+        likelihood = bluff_rate + (1 - bluff_rate) * BID_TRUTH[self.own_dice_count, :MAX_DICE + 1, quantity, face_value]
+        posterior = self.posterior * likelihood[MATCHES[self.num_dice][:, face_value]]
+        self.posterior = posterior / posterior.sum()
+        self.last_bid = (quantity, face_value)
+        self.bid_truths = self.truth_matrix @ self.posterior
+
+    def bid_truth(self, quantity, face_value):
+        """P(the bid `quantity` x `face_value` is true); the (0, 0) bid after a challenge always is."""
+        if face_value == 0:
+            return 1.0
+        return float(self.bid_truths[(quantity - 1) * NUM_FACES + face_value - 1])
+
+
+class BayesianAgent:
+    def __init__(self, bluff_rate=DEFAULT_BLUFF_RATE, challenge_threshold=DEFAULT_CHALLENGE_THRESHOLD,
+                 max_sessions=DEFAULT_MAX_SESSIONS):
+        self.bluff_rate = bluff_rate
+        self.challenge_threshold = challenge_threshold
+        self.max_sessions = max_sessions
+        self._beliefs = OrderedDict()  # session -> OpponentBelief of its current round
+        self._beliefs_lock = threading.Lock()
+
+    def __getstate__(self):
+        return {key: value for key, value in self.__dict__.items() if not key.startswith("_")}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.__dict__.update(state)
+
+    def release(self, session):
+        """Drops the belief kept for `session` (e.g. when its room closes)."""
+        with self._beliefs_lock:
+            self._beliefs.pop(session, None)
+
+    def belief(self, state, session=None):
+        """The posterior of the player to move in a `GameState`, conditioned on the standing bid."""
+        player = state.current_player
+        round_key = (state.dice_count, state.dice[player - 1])
+        belief = None
+        if session is not None:
+            with self._beliefs_lock:
+                belief = self._beliefs.pop(session, None)
+        if belief is None or belief.round != round_key:
+            belief = OpponentBelief(state.dice_count[2 - player], state.dice[player - 1], round_key)
+
+        # Bids only go up within a round, so a bid above the last one seen is the opponent's new move
+        bid = state.current_bid
+        if bid[1] and bid != OPENING_BID and bid > belief.last_bid:
+            belief.observe_bid(bid[0], bid[1], self.bluff_rate)
+
+        if session is not None:
+            with self._beliefs_lock:
+                self._beliefs[session] = belief
+                while len(self._beliefs) > self.max_sessions:
+                    self._beliefs.popitem(last=False)
+        return belief
+
+    def select_action(self, state, env, session=None):
+        """Challenges an unlikely standing bid, otherwise makes the likeliest of the next few raises."""
+        game_state = env.state
+        mask = state_action_mask(game_state)
+        belief = self.belief(game_state, session)
+        if mask[CHALLENGE_ACTION] and belief.bid_truth(*game_state.current_bid) < self.challenge_threshold:
+            return CHALLENGE_ACTION
+        # Bid indices grow with (quantity, face_value), so the smallest raises come first
+        candidates = np.flatnonzero(mask[:CHALLENGE_ACTION])[:NUM_FACES]
+        if len(candidates) == 0:
+            return CHALLENGE_ACTION
+        return int(candidates[belief.bid_truths[candidates].argmax()])
@@ -0,0 +1,72 @@
+"""Serves the strategy table exported by `cfr_solver.py`.
+
+Rows are information sets of the solver's abstraction: the mover's dice
+count, the opponent's dice count, the standing bid and the mover's own hand.
+Each row holds the likeliest actions (`action_masks` layout) with their
+probabilities quantized to uint8, and the agent samples from them: the solved
+strategy is mixed, and bluffing at the right rate is what makes it hard to
+exploit. Decisions go through the batched interface (`batch_input`/
+`act_batch`) like a `PolicyTable`.
+"""
+import numpy as np
+
+from action_masks import masked_argmax, state_action_mask
+from cfr_solver import num_slots
+from policy_table import HAND_INDEX, HANDS, bid_slot
+
+
+class CFRAgent:
+    def __init__(self, offsets, actions, probs, source=None):
+        self.offsets = offsets
+        self.actions = actions
+        self.probs = probs
+        self.source = source
+
+    def __getstate__(self):
+        # A loaded strategy is sent to worker processes as its filename; they read it themselves
+        if self.source is not None:
+            return {"source": self.source}
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        if set(state) == {"source"}:
+            state = CFRAgent.load(state["source"]).__dict__
+        self.__dict__.update(state)
+
+    def batch_input(self, state):
+        player = state.current_player
+        hand = tuple(sorted(state.dice[player - 1]))
+        own, opponent = len(hand), state.dice_count[2 - player]
+        slot = min(bid_slot(state.current_bid), num_slots(own + opponent) - 1)
+        return self.offsets[own, opponent] + slot * len(HANDS[own]) + HAND_INDEX[hand]
+
+    def act(self, state, mask=None):
+        mask = state_action_mask(state) if mask is None else mask
+        return int(self.act_batch(np.array([self.batch_input(state)]), mask[None])[0])
+
+    def act_batch(self, rows, masks):
+        rows = np.asarray(rows, dtype=np.intp)
+        actions = self.actions[rows].astype(np.intp)
+        # Probabilities rounded to zero and actions the position does not allow get no weight
+        probs = self.probs[rows] * np.take_along_axis(masks, actions, axis=1)
+        totals = probs.sum(axis=1)
+        picks = (np.random.rand(len(rows), 1) * totals[:, None] < probs.cumsum(axis=1)).argmax(axis=1)
+        chosen = actions[np.arange(len(rows)), picks]
+        missing = totals == 0
+        if missing.any():
+            chosen[missing] = masked_argmax(np.random.rand(int(missing.sum()), masks.shape[-1]), masks[missing])
+        return chosen
+
+    def snapshot(self):
+        return self
+
+    def save(self, filename):
+        if filename == self.source:
+            return
+        with open(filename, "wb") as f:
+            np.savez(f, offsets=self.offsets, actions=self.actions, probs=self.probs)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as arrays:
+            return cls(arrays["offsets"], arrays["actions"], arrays["probs"], source=filename)
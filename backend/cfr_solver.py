@@ -0,0 +1,344 @@
+"""Offline counterfactual regret minimization (CFR+) for the production rules.
+
+    python cfr_solver.py --iterations 1000 --checkpoint-dir cfr_checkpoints --output cfr_strategy.npz
+
+A game is a chain of rounds. Every challenge costs the loser a die, re-rolls
+all dice and hands the next round's opening bid to the player who made the
+challenged bid, so the value of a round start depends only on the two dice
+counts. Rounds are solved bottom-up by the total number of dice left (a
+level): the rounds of a level end in rounds of the level below, whose values
+are already known, or in the end of the game (+1 / -1).
+
+Information sets are (own dice count, opponent's dice count, standing bid,
+own hand), the view every served agent has (see PRIVATE_VIEW in
+policy_table.py): earlier bids of the round and the seat are forgotten. Both
+seats share one strategy, so the two roles of a round are played by the same
+regret minimizer (self-play in a symmetric zero-sum game). Hands are
+face-count histograms weighted by their multinomial prior (bayesian_agent).
+
+One iteration of a level is a forward pass of reach over the bid slots and a
+backward pass computing, for every node, the value matrix (mover's hands x
+opponent's hands) and the regret of every action. Both are batched array
+operations over hands; the dice splits of a slot run on `threads` threads
+(NumPy releases the GIL). Each level is checkpointed every
+`checkpoint_every` iterations and can be resumed.
+
+Exploitability is measured per level against a best response that also sees
+only the standing bid, with next-round values fixed to the solved ones: the
+average of what it gains as opener and as responder in one round, in game
+results (a win is +1, a loss -1).
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from action_masks import CHALLENGE_ACTION
+from batched_liars_dice_game import MAX_DICE, MAX_QUANTITY, NUM_FACES
+from bayesian_agent import MATCHES, PRIOR
+from checkpoint import atomic_save
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_WIDTH = 4  # actions kept per information set in the exported table
+
+
+def num_slots(total_dice):
+    # Slot 0 is the opening of a round; slot (q - 1) * 6 + f is the bid q x f, at most one per die on the table
+    return NUM_FACES * min(total_dice, MAX_QUANTITY) + 1
+
+
+def slot_bid(slot):
+    return (slot - 1) // NUM_FACES + 1, (slot - 1) % NUM_FACES + 1
+
+
+class _NpzSnapshot:
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            np.savez(f, **self.arrays)
+
+
+class LevelSolver:
+    """CFR+ over the rounds that start with `total` dice on the table.
+
+    A node is (seat, x, slot): a mover holding x dice against total - x at a
+    bid slot. Action 0 challenges the standing bid and action j >= 1 raises
+    it to slot + j. The solver itself plays both seats with one strategy
+    (seat None); best responses give one seat its own. Reach is kept per
+    node as a matrix over both players' hands, summed over every bidding
+    history that ends there: with the history forgotten, a node's hands are
+    not independent any more, and regrets weigh each history by how likely
+    both players were to get there. `round_values[(a, b)]` is the value of a
+    round start to an opener with a dice against b, for every level below.
+    """
+
+    def __init__(self, total, round_values, threads=1):
+        self.total = total
+        self.slots = num_slots(total)
+        self.counts = [x for x in range(1, MAX_DICE + 1) if 1 <= total - x <= MAX_DICE]
+        self.iterations = 0
+        self.pool = ThreadPoolExecutor(threads) if threads > 1 and len(self.counts) > 1 else None
+
+        slots = np.arange(self.slots)
+        self.legal = np.zeros((self.slots, self.slots), dtype=bool)
+        self.legal[:, 1:] = slots[:, None] + slots[None, 1:] < self.slots
+        self.legal[1:, 0] = True  # nothing to challenge at the opening
+
+        self.regrets, self.strategy_sums, self.challenge = {}, {}, {}
+        for x in self.counts:
+            y = total - x
+            self.regrets[x] = np.zeros((self.slots, len(PRIOR[x]), self.slots))
+            self.strategy_sums[x] = np.zeros((self.slots, len(PRIOR[x]), self.slots))
+            self.challenge[x] = self._challenge_values(x, y, round_values)
+
+    @staticmethod
+    def _next_round(opener, responder, round_values):
+        # Value to the player who is not opening the next round
+        if opener == 0:
+            return 1.0
+        if responder == 0:
+            return -1.0
+        return -round_values[(opener, responder)]
+
+    def _challenge_values(self, x, y, round_values):
+        """values[s, h_x, h_y]: what challenging slot s is worth to the mover; the bidder opens next round."""
+        caught = self._next_round(y, x - 1, round_values)  # the bid was true: the challenger loses a die
+        called = self._next_round(y - 1, x, round_values)  # the bid was false: the bidder loses one
+        values = np.zeros((self.slots, len(PRIOR[x]), len(PRIOR[y])))
+        for slot in range(1, self.slots):
+            quantity, face_value = slot_bid(slot)
+            matching = MATCHES[x][:, face_value, None] + MATCHES[y][None, :, face_value]
+            values[slot] = np.where(matching >= quantity, caught, called)
+        return values
+
+    def _nodes(self, seats):
+        return [(seat, x) for seat in seats for x in self.counts]
+
+    def _opponent(self, node):
+        seat, x = node
+        return (None if seat is None else 1 - seat, self.total - x)
+
+    def _map(self, fn, nodes):
+        if self.pool is None:
+            return [fn(node) for node in nodes]
+        return list(self.pool.map(fn, nodes))
+
+    def current_strategy(self, x):
+        positive = np.where(self.legal[:, None, :], np.maximum(self.regrets[x], 0.0), 0.0)
+        total = positive.sum(axis=2, keepdims=True)
+        uniform = self.legal[:, None, :] / self.legal.sum(axis=1)[:, None, None]
+        return np.where(total > 0, positive / np.where(total > 0, total, 1.0), uniform)
+
+    def average_strategy(self, x):
+        total = self.strategy_sums[x].sum(axis=2, keepdims=True)
+        uniform = self.legal[:, None, :] / self.legal.sum(axis=1)[:, None, None]
+        return np.where(total > 0, self.strategy_sums[x] / np.where(total > 0, total, 1.0), uniform)
+
+    def _reach(self, strategy, roots):
+        """reach[node][s, h_mover, h_opponent] of every node, from round starts at `roots`."""
+        reach = {node: np.zeros((self.slots, len(PRIOR[node[1]]), len(PRIOR[self.total - node[1]])))
+                 for node in strategy}
+        for node in roots:
+            reach[node][0] = 1.0
+        for slot in range(self.slots - 1):
+            def step(node):
+                child = reach[self._opponent(node)]
+                raises = strategy[node][slot][:, 1:self.slots - slot]
+                # Raising to slot + j hands the move to the opponent; CFR+ leaves many raises at exactly zero
+                for j in np.flatnonzero(raises.any(axis=0)):
+                    child[slot + 1 + j] += reach[node][slot].T * raises[:, j]
+            self._map(step, list(strategy))
+        return reach
+
+    def _values(self, strategy, reach=None, best_response=()):
+        """Value matrices (mover's hands x opponent's hands) of every node, last slot first.
+
+        Returns the slot 0 matrices and, with `reach`, the regret of every action at every node.
+        Nodes in `best_response` play, per hand, the action worth most against the reach there;
+        their strategy is overwritten with it (hands never reached keep their choice).
+        """
+        children = {node: np.zeros((len(PRIOR[node[1]]), self.slots, len(PRIOR[self.total - node[1]])))
+                    for node in strategy}
+        regrets, roots = {}, {}
+        for slot in range(self.slots - 1, -1, -1):
+            def step(node):
+                x = node[1]
+                y = self.total - x
+                actions = self.slots - slot
+                # values[h_x, a, h_y] of every action to the mover
+                values = np.empty((len(PRIOR[x]), actions, len(PRIOR[y])))
+                values[:, 0] = self.challenge[x][slot]
+                values[:, 1:] = children[node][:, slot + 1:]
+                policy = strategy[node][slot]
+                if reach is not None:
+                    weights = reach[node][slot] * PRIOR[y]
+                    action_values = np.einsum("hab,hb->ha", values, weights)
+                if node in best_response:
+                    choice = np.where(weights.any(axis=1),
+                                      np.where(self.legal[slot, :actions], action_values, -np.inf).argmax(axis=1),
+                                      policy.argmax(axis=1))
+                    policy[:] = 0.0
+                    policy[np.arange(len(choice)), choice] = 1.0
+                value = (policy[:, None, :actions] @ values)[:, 0]
+                if reach is not None and node not in best_response:
+                    regret = action_values - (value * weights).sum(axis=1)[:, None]
+                    regrets[node, slot] = np.where(self.legal[slot, :actions], regret, 0.0)
+                return value
+
+            nodes = list(strategy)
+            for node, value in zip(nodes, self._map(step, nodes)):
+                children[self._opponent(node)][:, slot] = -value.T  # zero-sum: the parent's mover is this node's opponent
+                if slot == 0:
+                    roots[node] = value
+        return roots, regrets
+
+    def iterate(self):
+        self.iterations += 1
+        strategy = {node: self.current_strategy(node[1]) for node in self._nodes([None])}
+        reach = self._reach(strategy, list(strategy))
+        _, regrets = self._values(strategy, reach)
+        for (node, slot), regret in regrets.items():
+            x, actions = node[1], self.slots - slot
+            # CFR+: floor cumulative regrets at zero and weight the average linearly
+            self.regrets[x][slot, :, :actions] = np.maximum(self.regrets[x][slot, :, :actions] + regret, 0.0)
+            own_reach = (reach[node][slot] * PRIOR[self.total - x]).sum(axis=1)
+            self.strategy_sums[x][slot] += self.iterations * own_reach[:, None] * strategy[node][slot]
+
+    def round_values(self):
+        """Value of a round start to the opener under the average strategy, for every split of the level."""
+        strategy = {node: self.average_strategy(node[1]) for node in self._nodes([None])}
+        roots, _ = self._values(strategy)
+        return {(x, self.total - x): float(PRIOR[x] @ roots[None, x] @ PRIOR[self.total - x]) for x in self.counts}
+
+    def best_response_gains(self, opener, max_sweeps=20):
+        """What a best response to the average strategy gains as opener (or responder), per split.
+
+        Seat 0 responds, seat 1 plays the average strategy. Without the history a best response is
+        not one backward pass: choices change the reach of later nodes they share. Sweeps of the
+        backward pass each improve the best responder's choices given the reach of the previous
+        one, starting from the average strategy's likeliest actions, until the gain stops growing;
+        the result is a lower bound of the exact best response.
+        """
+        values = self.round_values()
+        strategy = {node: self.average_strategy(node[1]) for node in self._nodes([0, 1])}
+        best_response = set(self._nodes([0]))
+        roots = self._nodes([0 if opener else 1])
+        gains, total = None, -np.inf
+        for _ in range(max_sweeps):
+            reach = self._reach(strategy, roots)
+            root_values, _ = self._values(strategy, reach, best_response)
+            sweep = []
+            for seat, x in roots:
+                value = float(PRIOR[x] @ root_values[seat, x] @ PRIOR[self.total - x])
+                # Values are the mover's, and a best response that does not open plays against the opener
+                sweep.append(value - values[x, self.total - x] if opener else values[x, self.total - x] - value)
+            if sum(sweep) <= total + 1e-12:
+                break
+            gains, total = sweep, sum(sweep)
+        return dict(zip([x for _, x in roots], gains))
+
+    def exploitability(self):
+        """Mean over the level's splits of what a best response gains, as opener and as responder, per round."""
+        as_opener = self.best_response_gains(True)
+        as_responder = self.best_response_gains(False)
+        return float(np.mean([(as_opener[x] + as_responder[self.total - x]) / 2 for x in self.counts]))
+
+    def state(self):
+        arrays = {"iterations": np.array(self.iterations)}
+        for x in self.counts:
+            arrays[f"regrets_{x}"] = self.regrets[x]
+            arrays[f"strategy_sums_{x}"] = self.strategy_sums[x]
+        return arrays
+
+    def load_state(self, arrays):
+        self.iterations = int(arrays["iterations"])
+        for x in self.counts:
+            self.regrets[x] = np.array(arrays[f"regrets_{x}"])
+            self.strategy_sums[x] = np.array(arrays[f"strategy_sums_{x}"])
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def export_strategy(levels, filename, width=STRATEGY_WIDTH):
+    """Writes the `width` likeliest actions and their probabilities of every information set.
+
+    Rows are indexed by `offsets[own, opponent] + slot * hands(own) + hand`, where hand is the index
+    of the sorted hand in `combinations_with_replacement` order (policy_table.HAND_INDEX).
+    """
+    offsets = np.zeros((MAX_DICE + 1, MAX_DICE + 1), dtype=np.int64)
+    blocks_actions, blocks_probs, row = [], [], 0
+    for own in range(1, MAX_DICE + 1):
+        for opponent in range(1, MAX_DICE + 1):
+            level = levels[own + opponent]
+            strategy = level.average_strategy(own)
+            # Slot s, action 0 is the challenge; action j is the bid of slot s + j, action index s + j - 1
+            order = np.argsort(-strategy, axis=2, kind="stable")[:, :, :width]
+            probs = np.take_along_axis(strategy, order, axis=2)
+            slots = np.arange(level.slots)[:, None, None]
+            actions = np.where(order == 0, CHALLENGE_ACTION, slots + order - 1)
+            offsets[own, opponent] = row
+            row += level.slots * len(PRIOR[own])
+            blocks_actions.append(actions.reshape(-1, width).astype(np.uint8))
+            blocks_probs.append(np.round(probs.reshape(-1, width) * 255).astype(np.uint8))
+    arrays = {
+        "offsets": offsets,
+        "actions": np.concatenate(blocks_actions),
+        "probs": np.concatenate(blocks_probs),
+        "iterations": np.array([levels[total].iterations for total in sorted(levels)]),
+    }
+    return atomic_save(_NpzSnapshot(arrays), filename)
+
+
+def solve(iterations, checkpoint_dir=None, checkpoint_every=100, report_every=50, threads=1):
+    """Solves every level from two dice upwards; returns {total: LevelSolver}."""
+    round_values, levels = {}, {}
+    for total in range(2, 2 * MAX_DICE + 1):
+        level = LevelSolver(total, round_values, threads)
+        checkpoint = os.path.join(checkpoint_dir, f"level_{total:02d}.npz") if checkpoint_dir else None
+        if checkpoint and os.path.exists(checkpoint):
+            with np.load(checkpoint) as arrays:
+                level.load_state(arrays)
+            logger.info(f"Level {total}: resumed at iteration {level.iterations}")
+
+        start = time.perf_counter()
+        while level.iterations < iterations:
+            level.iterate()
+            if checkpoint and (level.iterations % checkpoint_every == 0 or level.iterations == iterations):
+                atomic_save(_NpzSnapshot(level.state()), checkpoint)
+            if level.iterations % report_every == 0:
+                logger.info(f"Level {total}: iteration {level.iterations}, "
+                            f"exploitability {level.exploitability():.4f}, {time.perf_counter() - start:.1f}s")
+        values = level.round_values()
+        round_values.update(values)
+        logger.info(f"Level {total}: exploitability {level.exploitability():.4f}, opener values "
+                    + ", ".join(f"{x}v{y} {value:+.3f}" for (x, y), value in values.items()))
+        level.close()
+        levels[total] = level
+    return levels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve Liar's Dice with CFR+ and export the expert strategy")
+    parser.add_argument("--iterations", type=int, default=1000, help="per level")
+    parser.add_argument("--checkpoint-dir", default=None)
+    parser.add_argument("--checkpoint-every", type=int, default=100)
+    parser.add_argument("--report-every", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default="cfr_strategy.npz")
+    parser.add_argument("--width", type=int, default=STRATEGY_WIDTH, help="actions kept per information set")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.checkpoint_dir:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+    levels = solve(args.iterations, args.checkpoint_dir, args.checkpoint_every, args.report_every, args.threads)
+    size = export_strategy(levels, args.output, args.width)
+    print(f"Wrote {args.output} ({size} bytes)")
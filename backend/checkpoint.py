@@ -0,0 +1,119 @@
+"""Background, atomic agent checkpoints.
+
+`CheckpointWriter.submit` takes `{filename: agent}`, snapshots every agent on
+the caller's thread (`agent.snapshot()`, a copy of anything that can still
+change) and serializes the snapshots on a single writer thread. Each file is
+written to a temporary name in the same directory, fsynced and renamed over
+the old one, so readers and crashes only ever see a complete checkpoint.
+"""
+import logging
+import os
+import pickle
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class PickleSnapshot:
+    """A checkpoint dict copied out of an agent, written with pickle."""
+
+    def __init__(self, checkpoint):
+        self.checkpoint = checkpoint
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            pickle.dump(self.checkpoint, f)
+
+
+def temporary_name(filename):
+    # Keeps the extension: np.savez appends ".npz" to names without it
+    root, ext = os.path.splitext(filename)
+    return f"{root}.tmp-{os.getpid()}{ext}"
+
+
+def atomic_save(snapshot, filename):
+    """Writes `snapshot.save()` output to `filename` atomically; returns its size in bytes."""
+    tmp = temporary_name(filename)
+    try:
+        snapshot.save(tmp)
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    directory = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    except OSError:  # not supported on every filesystem
+        pass
+    finally:
+        os.close(directory)
+    return os.path.getsize(filename)
+
+
+class CheckpointWriter:
+    def __init__(self, history_size=20):
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self.running = None  # Future of the checkpoint being written
+        self.history = deque(maxlen=history_size)
+        self.skipped = 0
+        self.failed = 0
+
+    def submit(self, agents):
+        """Snapshots `{filename: agent}` now and writes it in the background.
+
+        Returns the Future, or None if the previous checkpoint is still being
+        written; the next call picks up everything this one would have saved.
+        """
+        if self.running is not None and not self.running.done():
+            self.skipped += 1
+            logger.info("Checkpoint still running, skipping this one")
+            return None
+
+        start = time.perf_counter()
+        snapshots = {}
+        for filename, agent in agents.items():
+            snapshot = agent.snapshot()
+            # A snapshot that is still the file it was loaded from has nothing new to write
+            if getattr(snapshot, "source", None) != filename:
+                snapshots[filename] = snapshot
+        snapshot_seconds = time.perf_counter() - start
+        self.running = self.pool.submit(self._write, snapshots, snapshot_seconds)
+        return self.running
+
+    def _write(self, snapshots, snapshot_seconds):
+        start = time.perf_counter()
+        record = {"time": time.time(), "snapshot_seconds": snapshot_seconds, "files": {}}
+        try:
+            for filename, snapshot in snapshots.items():
+                file_start = time.perf_counter()
+                size = atomic_save(snapshot, filename)
+                record["files"][filename] = {"bytes": size, "seconds": time.perf_counter() - file_start}
+        except Exception:
+            self.failed += 1
+            logger.exception("Checkpoint failed")
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            self.history.append(record)
+        if record["files"]:
+            logger.info(
+                f"Checkpoint wrote {len(record['files'])} files, "
+                f"{sum(f['bytes'] for f in record['files'].values())} bytes in {record['seconds']:.3f}s"
+            )
+        return record
+
+    def stats(self):
+        return {
+            "running": self.running is not None and not self.running.done(),
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "last": self.history[-1] if self.history else None,
+        }
+
+    def close(self, wait=True):
+        self.pool.shutdown(wait=wait)
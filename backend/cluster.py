@@ -0,0 +1,35 @@
+"""Sharding helpers for running the Socket.IO server as several workers.
+
+Each worker is started with its own `WORKER_SHARD` (0..`NUM_SHARDS`-1) and
+only creates rooms whose name hashes to that shard, so a proxy that routes by
+room name (`shard_for`, i.e. crc32 of the name modulo the shard count) sends a
+room's reconnects back to the worker holding it. Broadcasts go through a shared
+client manager (Redis or AMQP) so any worker can emit to any room.
+"""
+import uuid
+import zlib
+
+import socketio
+
+
+def shard_for(room, num_shards):
+    return zlib.crc32(room.encode()) % num_shards
+
+
+def generate_room_name(difficulty, shard=0, num_shards=1):
+    # About num_shards tries on average; room names stay "<difficulty>_<uuid>"
+    while True:
+        room = f"{difficulty}_{uuid.uuid4()}"
+        if num_shards <= 1 or shard_for(room, num_shards) == shard:
+            return room
+
+
+def create_client_manager(url):
+    """None (the default in-process manager) unless a message queue URL is configured."""
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return socketio.AsyncRedisManager(url)
+    if url.startswith(("amqp://", "amqps://")):
+        return socketio.AsyncAioPikaManager(url)
+    raise ValueError(f"Unsupported message queue URL: {url}")
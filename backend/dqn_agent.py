@@ -4,8 +4,12 @@ import torch.nn as nn
 import torch.optim as optim
 import numpy as np
 import random
-from collections import deque
 import pickle
+import copy
+from state_codec import state_features
+from action_masks import masked_argmax, random_valid_action, state_action_mask
+from checkpoint import PickleSnapshot
+from replay_buffer import PrioritizedReplayBuffer, ReplayBuffer
 
 class DQNetwork(nn.Module):
     def __init__(self, state_size, action_size):
@@ -20,7 +24,8 @@ class DQNetwork(nn.Module):
         return self.fc3(x)
 
 class DQNAgent:
-    def __init__(self, state_size, action_size, network=None, epsilon=1.0, epsilon_decay=0.995, epsilon_min=0.01, gamma=0.99, batch_size=32, memory_size=1000):
+    def __init__(self, state_size, action_size, network=None, epsilon=1.0, epsilon_decay=0.995, epsilon_min=0.01, gamma=0.99, batch_size=32, memory_size=1000,
+                 prioritized=False, target_update_interval=100):
         self.state_size = state_size
         self.action_size = action_size
         self.epsilon = epsilon
@@ -28,97 +33,112 @@ class DQNAgent:
         self.epsilon_min = epsilon_min
         self.gamma = gamma
         self.batch_size = batch_size
-        self.memory = deque(maxlen=memory_size)
+        self.prioritized = prioritized
+        self.memory = self._new_memory(memory_size)
         self.update_counter = 0
+        # Targets come from a copy of the network that is synced every target_update_interval updates
+        self.target_update_interval = target_update_interval
 
         if network:
             self.network = network
         else:
             self.network = DQNetwork(state_size, action_size)
+        self.target_network = self._copy_network()
 
         self.optimizer = optim.Adam(self.network.parameters(), lr=0.001)
-        self.criterion = nn.MSELoss()
+        self.criterion = nn.MSELoss(reduction='none')
 
-    def act(self, state):
+    def _new_memory(self, memory_size):
+        buffer = PrioritizedReplayBuffer if self.prioritized else ReplayBuffer
+        return buffer(memory_size, self.state_size, self.action_size)
+
+    def _copy_network(self):
+        target_network = copy.deepcopy(self.network)
+        target_network.requires_grad_(False)
+        return target_network
+
+    def update_target_network(self):
+        self.target_network.load_state_dict(self.network.state_dict())
+
+    def act(self, state, mask=None):
         if np.random.rand() <= self.epsilon:
-            action = random.randrange(self.action_size)
+            action = random_valid_action(mask) if mask is not None else random.randrange(self.action_size)
         else:
-            state = torch.FloatTensor(state).unsqueeze(0)
+            state = torch.from_numpy(np.asarray(state, dtype=np.float32)).unsqueeze(0)
             q_values = self.network(state)
-            action = q_values.max(1)[1].item()
+            if mask is not None:
+                action = int(masked_argmax(q_values.detach().numpy()[0], mask))
+            else:
+                action = q_values.max(1)[1].item()
         
         logging.debug(f"DQNAgent selected action: {action}")
         return action
 
     def get_valid_random_action(self, state):
-        valid_actions = self.get_valid_actions(state)
-        logging.debug(f"Valid actions for random selection: {valid_actions}")
-        if valid_actions:
-            return random.choice(valid_actions)
-        return random.choice(range(self.action_size))
+        return random_valid_action(state_action_mask(state))
 
     def get_valid_actions(self, state):
-        total_dice = sum(state["dice_count"])
-        current_quantity, current_face_value = state["current_bid"]
-        valid_actions = []
-        for action in range(self.action_size):
-            action_type = action // 66
-            quantity = (action % 66) // 6 + 1
-            face_value = action % 6 + 1
-            if quantity > total_dice:
-                continue  # Skip invalid quantities
-            if action_type == 0 and (quantity > current_quantity or (quantity == current_quantity and face_value > current_face_value)):
-                valid_actions.append(action)
-            elif action_type == 1 and not state["last_action_was_challenge"]:
-                valid_actions.append(action)
-        logging.debug(f"Valid actions: {valid_actions}")
-        return valid_actions
+        return np.flatnonzero(state_action_mask(state)).tolist()
 
     def update_epsilon(self):
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
 
-    def remember(self, state, action, reward, next_state, done):
-        state = np.array(list(state["dice_count"]) + list(state["current_bid"]) + list(state["scores"]) + [state["current_player"]])
-        next_state = np.array(list(next_state["dice_count"]) + list(next_state["current_bid"]) + list(next_state["scores"]) + [next_state["current_player"]])
-        self.memory.append((state, action, reward, next_state, done))
+    def remember(self, state, action, reward, next_state, done, next_mask=None):
+        # States are game states (GameState or get_game_state() dicts); next_mask limits the
+        # bootstrapped max to actions that are legal in next_state
+        if next_mask is None:
+            next_mask = state_action_mask(next_state)
+        self.memory.add(state_features(state), action, reward, state_features(next_state), done, next_mask)
 
     def replay(self):
         if len(self.memory) < self.batch_size:
-            return
-        minibatch = random.sample(self.memory, self.batch_size)
-        for state, action, reward, next_state, done in minibatch:
-            target = reward
-            if not done:
-                next_state = torch.FloatTensor(next_state).unsqueeze(0)
-                target = reward + self.gamma * torch.max(self.network(next_state)[0]).item()
-            target_f = self.network(torch.FloatTensor(state).unsqueeze(0))
-            target_f = target_f.cpu().detach().numpy()
-            target_f[0][action] = target
-            target_f = torch.FloatTensor(target_f)
-            state = torch.FloatFloat(state).unsqueeze(0)
-            output = self.network(state)
-            loss = self.criterion(output, target_f)
-            self.optimizer.zero_grad()
-            loss.backward()
-            self.optimizer.step()
-
+            return None
+        idx, batch, weights = self.memory.sample(self.batch_size)
+        states, actions, rewards, next_states, dones, next_masks = (torch.from_numpy(a) for a in batch)
+
+        with torch.no_grad():
+            next_q = self.target_network(next_states).masked_fill(~next_masks, float('-inf')).max(1)[0]
+            next_q = torch.where(torch.isfinite(next_q), next_q, torch.zeros_like(next_q))
+            # Self-play: the next state is the opponent's decision, so its value is the mover's loss (negamax)
+            targets = rewards - self.gamma * next_q * (1 - dones)
+
+        q = self.network(states).gather(1, actions.unsqueeze(1)).squeeze(1)
+        loss = (torch.from_numpy(weights) * self.criterion(q, targets)).mean()
+        self.optimizer.zero_grad()
+        loss.backward()
+        self.optimizer.step()
+
+        self.memory.update_priorities(idx, (targets - q).detach().numpy())
+        self.update_counter += 1
+        if self.update_counter % self.target_update_interval == 0:
+            self.update_target_network()
         self.update_epsilon()
+        return loss.item()
+
+    def checkpoint(self):
+        # Copies of everything training mutates, so the result can be pickled on another thread
+        return {
+            'state_size': self.state_size,
+            'action_size': self.action_size,
+            'gamma': self.gamma,
+            'epsilon': self.epsilon,
+            'epsilon_decay': self.epsilon_decay,
+            'epsilon_min': self.epsilon_min,
+            'batch_size': self.batch_size,
+            'memory': self.memory.transitions(),
+            'memory_size': self.memory.capacity,
+            'prioritized': self.prioritized,
+            'network_state': {k: v.detach().clone() for k, v in self.network.state_dict().items()},
+            'optimizer_state': copy.deepcopy(self.optimizer.state_dict()),
+        }
+
+    def snapshot(self):
+        return PickleSnapshot(self.checkpoint())
 
     def save(self, filename):
         with open(filename, 'wb') as f:
-            pickle.dump({
-                'state_size': self.state_size,
-                'action_size': self.action_size,
-                'gamma': self.gamma,
-                'epsilon': self.epsilon,
-                'epsilon_decay': self.epsilon_decay,
-                'epsilon_min': self.epsilon_min,
-                'batch_size': self.batch_size,
-                'memory': list(self.memory),
-                'network_state': self.network.state_dict(),
-                'optimizer_state': self.optimizer.state_dict(),
-            }, f)
+            pickle.dump(self.checkpoint(), f)
 
     def load(self, filename):
         with open(filename, 'rb') as f:
@@ -130,23 +150,44 @@ class DQNAgent:
             self.epsilon_decay = checkpoint['epsilon_decay']
             self.epsilon_min = checkpoint['epsilon_min']
             self.batch_size = checkpoint['batch_size']
-            self.memory = deque(checkpoint['memory'], maxlen=1000)
+            self.prioritized = checkpoint.get('prioritized', False)
+            self.memory = self._new_memory(checkpoint.get('memory_size', 1000))
+            self._load_memory(checkpoint['memory'])
             self.network = DQNetwork(self.state_size, self.action_size)
             self.network.load_state_dict(checkpoint['network_state'])
+            self.target_network = self._copy_network()
             self.optimizer = optim.Adam(self.network.parameters(), lr=0.001)
             self.optimizer.load_state_dict(checkpoint['optimizer_state'])
 
+    def _load_memory(self, memory):
+        if isinstance(memory, dict):
+            self.memory.load_transitions(memory)
+            return
+        # Older checkpoints stored a list of (state, action, reward, next_state, done) tuples
+        for state, action, reward, next_state, done in memory:
+            self.memory.add(state, action, reward, next_state, done)
+
     def __getstate__(self):
         state = self.__dict__.copy()
         state['network_state'] = self.network.state_dict()
         state['optimizer_state'] = self.optimizer.state_dict()
         del state['network']
         del state['optimizer']
+        state.pop('target_network', None)
         return state
 
     def __setstate__(self, state):
+        memory = state.pop('memory')
         self.__dict__.update(state)
+        self.prioritized = state.get('prioritized', False)
+        self.target_update_interval = state.get('target_update_interval', 100)
+        if isinstance(memory, ReplayBuffer):
+            self.memory = memory
+        else:  # a deque of tuples from before the ring buffer
+            self.memory = self._new_memory(memory.maxlen or 1000)
+            self._load_memory(memory)
         self.network = DQNetwork(self.state_size, self.action_size)
         self.optimizer = optim.Adam(self.network.parameters(), lr=0.001)
         self.network.load_state_dict(state['network_state'])
-        self.optimizer.load_state_dict(state['optimizer_state'])
\ No newline at end of file
+        self.optimizer.load_state_dict(state['optimizer_state'])
+        self.target_network = self._copy_network()
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""Torch-free inference for `DQNetwork`.
+
+`export_weights` writes the three linear layers of a trained network to an
+`.npz` file (float32, or int8 with one float32 scale per output unit), and
+`NumpyDQNAgent` computes the same Q-values with NumPy matrix products. Only
+exporting touches torch; serving the medium agent does not import it.
+
+int8 is a storage format only: the weights are dequantized to float32 once
+when the network is built, so both formats run the same float32 forward pass.
+"""
+import argparse
+import logging
+import random
+
+import numpy as np
+
+from action_masks import epsilon_greedy_batch, masked_argmax, random_valid_action, state_action_mask
+from state_codec import state_features
+
+LAYERS = ("fc1", "fc2", "fc3")
+
+
+def _to_numpy(value):
+    if hasattr(value, "detach"):  # torch tensor
+        value = value.detach().cpu().numpy()
+    return np.asarray(value, dtype=np.float32)
+
+
+def quantize_int8(weight):
+    # Symmetric per-output-unit quantization: weight ~= q * scale[:, None]
+    scale = np.abs(weight).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    q = np.clip(np.rint(weight / scale[:, None]), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+def export_weights(state_dict, filename, quantize=False, epsilon=0.0):
+    """Writes a `DQNetwork.state_dict()` (tensors or arrays) to an `.npz` file."""
+    arrays = {"epsilon": np.float32(epsilon), "quantized": np.bool_(quantize)}
+    for layer in LAYERS:
+        weight = _to_numpy(state_dict[f"{layer}.weight"])
+        bias = _to_numpy(state_dict[f"{layer}.bias"])
+        if quantize:
+            arrays[f"{layer}.weight"], arrays[f"{layer}.scale"] = quantize_int8(weight)
+        else:
+            arrays[f"{layer}.weight"] = weight
+        arrays[f"{layer}.bias"] = bias
+    np.savez(filename, **arrays)
+
+
+class NumpyDQN:
+    def __init__(self, weights, biases, scales=None):
+        if scales is not None:
+            weights = [w.astype(np.float32) * scale[:, None] for w, scale in zip(weights, scales)]
+        # Weights are stored transposed so a batch is computed as x @ w + b
+        self.weights = [np.ascontiguousarray(w.T, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.quantized = scales is not None  # written back as int8 by `save`
+        self.state_size = self.weights[0].shape[0]
+        self.action_size = self.weights[-1].shape[1]
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            weights = [data[f"{layer}.weight"] for layer in LAYERS]
+            biases = [data[f"{layer}.bias"] for layer in LAYERS]
+            scales = [data[f"{layer}.scale"] for layer in LAYERS] if bool(data["quantized"]) else None
+        return cls(weights, biases, scales)
+
+    @classmethod
+    def from_state_dict(cls, state_dict):
+        weights = [_to_numpy(state_dict[f"{layer}.weight"]) for layer in LAYERS]
+        biases = [_to_numpy(state_dict[f"{layer}.bias"]) for layer in LAYERS]
+        return cls(weights, biases)
+
+    def state_dict(self):
+        state_dict = {}
+        for i, layer in enumerate(LAYERS):
+            state_dict[f"{layer}.weight"] = self.weights[i].T
+            state_dict[f"{layer}.bias"] = self.biases[i]
+        return state_dict
+
+    def q_values(self, states):
+        """Q-values for one state (STATE_SIZE,) or a batch (N, STATE_SIZE)."""
+        x = np.asarray(states, dtype=np.float32)
+        last = len(self.weights) - 1
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            x = x @ weight
+            x += bias
+            if i < last:
+                np.maximum(x, 0, out=x)
+        return x
+
+
+class NumpyDQNAgent:
+    """Serves a DQN policy with the same interface as `DQNAgent.act`."""
+
+    def __init__(self, network, epsilon=0.0, source=None):
+        self.network = network
+        self.state_size = network.state_size
+        self.action_size = network.action_size
+        self.epsilon = epsilon
+        self.source = source
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            epsilon = float(data["epsilon"])
+        return cls(NumpyDQN.load(filename), epsilon=epsilon, source=filename)
+
+    def act(self, state, mask=None):
+        if np.random.rand() <= self.epsilon:
+            action = random_valid_action(mask) if mask is not None else random.randrange(self.action_size)
+        else:
+            q_values = self.network.q_values(state)
+            action = int(masked_argmax(q_values, mask) if mask is not None else q_values.argmax())
+
+        logging.debug(f"NumpyDQNAgent selected action: {action}")
+        return action
+
+    def batch_input(self, state):
+        return state_features(state)
+
+    def act_batch(self, states, masks):
+        """`act` for (N, STATE_SIZE) states under (N, ACTION_SIZE) masks in one forward pass."""
+        return epsilon_greedy_batch(self.network.q_values(states), masks, self.epsilon)
+
+    def get_valid_random_action(self, state):
+        return random_valid_action(state_action_mask(state))
+
+    def snapshot(self):
+        # Served weights are never updated, so the agent can be written as it is
+        return self
+
+    def save(self, filename):
+        # Inference weights are never updated while serving, so only write a copy elsewhere
+        if filename != self.source:
+            export_weights(self.network.state_dict(), filename, quantize=self.network.quantized, epsilon=self.epsilon)
+
+
+def checkpoint_network_state(checkpoint):
+    # Backend checkpoints use 'network_state'; the ones trained in ai_training/ use 'model_state_dict'
+    if "network_state" in checkpoint:
+        return checkpoint["network_state"]
+    return checkpoint["model_state_dict"]
+
+
+def export_checkpoint(checkpoint_filename, npz_filename, quantize=False):
+    """Exports the network of a pickled `DQNAgent` checkpoint (e.g. dqn_agent.pkl). Needs torch."""
+    from load_agents import CustomUnpickler
+
+    with open(checkpoint_filename, "rb") as f:
+        checkpoint = CustomUnpickler(f).load()
+    if not isinstance(checkpoint, dict):
+        checkpoint = checkpoint.__getstate__()
+    export_weights(checkpoint_network_state(checkpoint), npz_filename, quantize=quantize, epsilon=checkpoint.get("epsilon", 0.0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export DQN checkpoint weights for torch-free inference")
+    parser.add_argument("checkpoint_filename")
+    parser.add_argument("npz_filename")
+    parser.add_argument("--int8", action="store_true", help="store int8 weights with per-unit scales")
+    args = parser.parse_args()
+    export_checkpoint(args.checkpoint_filename, args.npz_filename, quantize=args.int8)
+    print(f"Exported {args.checkpoint_filename} to {args.npz_filename}")
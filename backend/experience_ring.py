@@ -0,0 +1,164 @@
+"""Shared-memory transport between self-play workers and the learner in train.py.
+
+`ExperienceRing` is a single-producer, single-consumer ring of transitions in
+one `multiprocessing.shared_memory` block: a worker appends whole batches and
+then advances the `written` counter, the learner copies out everything up to
+it and advances `consumed`. A worker whose ring is full waits for the learner
+instead of overwriting transitions that were never learned from.
+
+`SharedPolicy` publishes the learner's DQN weights and epsilon; workers pick
+up a new version between steps.
+"""
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+HEADER = 64  # int64 written counter, stop flag, consumed counter
+
+
+def _layout(capacity, state_size, action_size):
+    fields = (
+        ("keys", np.int64, ()),
+        ("next_keys", np.int64, ()),
+        ("states", np.float32, (state_size,)),
+        ("next_states", np.float32, (state_size,)),
+        ("actions", np.int16, ()),
+        ("next_actions", np.int16, ()),
+        ("rewards", np.float32, ()),
+        ("dones", np.float32, ()),
+        ("next_masks", np.bool_, (action_size,)),
+    )
+    layout, offset = [], HEADER
+    for name, dtype, shape in fields:
+        layout.append((name, dtype, (capacity,) + shape, offset))
+        offset += int(np.prod((capacity,) + shape)) * np.dtype(dtype).itemsize
+        offset = (offset + 63) // 64 * 64
+    return layout, offset
+
+
+class ExperienceRing:
+    FIELDS = ("keys", "next_keys", "states", "next_states", "actions", "next_actions", "rewards", "dones", "next_masks")
+
+    def __init__(self, capacity, state_size, action_size, name=None):
+        self.capacity = capacity
+        self.spec = (capacity, state_size, action_size)
+        layout, size = _layout(capacity, state_size, action_size)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.header = np.ndarray((3,), dtype=np.int64, buffer=self.shm.buf)
+        if self.owner:
+            self.header[:] = 0
+        self.arrays = {field: np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+                       for field, dtype, shape, offset in layout}
+        self.waits = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @classmethod
+    def attach(cls, name, capacity, state_size, action_size):
+        return cls(capacity, state_size, action_size, name=name)
+
+    @property
+    def written(self):
+        return int(self.header[0])
+
+    @property
+    def consumed(self):
+        return int(self.header[2])
+
+    @property
+    def stopped(self):
+        return bool(self.header[1])
+
+    def stop(self):
+        self.header[1] = 1
+
+    def write(self, batch):
+        n = len(batch["actions"])
+        if n > self.capacity:
+            raise ValueError(f"A batch of {n} transitions does not fit a ring of {self.capacity}")
+        start = self.written
+        while start + n - self.consumed > self.capacity and not self.stopped:
+            self.waits += 1
+            time.sleep(0.001)
+        idx = (start + np.arange(n)) % self.capacity
+        for field in self.FIELDS:
+            self.arrays[field][idx] = batch[field]
+        self.header[0] = start + n  # published only after the rows are in place
+
+    def read(self, limit=None):
+        """Copies of the transitions written since the last read (at most `limit`), oldest first."""
+        consumed, written = self.consumed, self.written
+        if limit is not None:
+            written = min(written, consumed + limit)
+        idx = (consumed + np.arange(written - consumed)) % self.capacity
+        batch = {field: self.arrays[field][idx] for field in self.FIELDS}
+        self.header[2] = written  # the rows may be overwritten from here on
+        return batch
+
+    def close(self):
+        self.arrays = {}
+        self.header = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedPolicy:
+    """Flat float32 layer weights plus a version counter and epsilon, in shared memory.
+
+    The version is a seqlock: `publish` makes it odd while it writes and even
+    again when done, and `read` retries until it copied under one even version.
+    """
+
+    def __init__(self, shapes, name=None):
+        self.shapes = shapes  # [(weight shape, bias shape)] per layer
+        self.size = sum(int(np.prod(w)) + int(np.prod(b)) for w, b in shapes)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=16 + 4 * self.size)
+        self.version = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.epsilon = np.ndarray((1,), dtype=np.float32, buffer=self.shm.buf, offset=8)
+        self.flat = np.ndarray((self.size,), dtype=np.float32, buffer=self.shm.buf, offset=16)
+        if self.owner:
+            self.version[0] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def publish(self, weights, biases, epsilon):
+        parts = [np.asarray(a, dtype=np.float32).ravel() for pair in zip(weights, biases) for a in pair]
+        flat = np.concatenate(parts) if parts else None  # tabular agents share only version and epsilon
+        self.version[0] += 1  # odd: a write is in progress
+        if flat is not None:
+            self.flat[:] = flat
+        self.epsilon[0] = epsilon
+        self.version[0] += 1
+
+    def read(self):
+        """(version, weights, biases, epsilon) copied out of shared memory."""
+        while True:
+            version = int(self.version[0])
+            if version % 2 == 0:
+                flat, epsilon = self.flat.copy(), float(self.epsilon[0])
+                if int(self.version[0]) == version:
+                    break
+            time.sleep(0)  # the learner is publishing
+        weights, biases, offset = [], [], 0
+        for weight_shape, bias_shape in self.shapes:
+            n = int(np.prod(weight_shape))
+            weights.append(flat[offset:offset + n].reshape(weight_shape))
+            offset += n
+            n = int(np.prod(bias_shape))
+            biases.append(flat[offset:offset + n].reshape(bias_shape))
+            offset += n
+        return version, weights, biases, epsilon
+
+    def close(self):
+        self.flat = self.version = self.epsilon = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,167 @@
+"""Versioned `game_update` wire protocol.
+
+Clients that connect with `proto=json` or `proto=bin` get one full snapshot
+(`game_update`, the `get_game_state()` dict plus `v` and `seq`) and then
+`game_delta` events holding only the fields that changed since the last
+update. Clients without `proto` keep receiving full `game_update` dicts.
+
+A JSON delta is `{"seq": n, <changed get_game_state() fields>}`. A binary
+delta is little-endian bytes:
+
+    u8 version, u8 field mask, u32 seq, then for each bit set in the mask:
+    bit 0 current_bid               u8 quantity, u8 face value
+    bit 1 current_player            u8
+    bit 2 last_action_was_challenge u8
+    bit 3 dice_count                u8, u8
+    bit 4 players (dice)            u8 n1, n1 x u8, u8 n2, n2 x u8
+    bit 5 scores                    u32, u32
+
+Player names only change through `player_names`, which sends a new snapshot.
+A client that sees a gap in `seq` emits `resync` to get a snapshot.
+"""
+import json
+import struct
+
+PROTOCOL_VERSION = 1
+PROTOCOLS = ("full", "json", "bin")
+
+BID, PLAYER, CHALLENGE, DICE_COUNT, DICE, SCORES = (1 << bit for bit in range(6))
+
+_HEADER = struct.Struct("<BBI")
+_SCORES = struct.Struct("<II")
+
+
+def snapshot_message(game, seq):
+    message = game.get_game_state()
+    message["v"] = PROTOCOL_VERSION
+    message["seq"] = seq
+    return message
+
+
+class GameUpdates:
+    """Tracks what one room's client has seen and encodes what changed since."""
+
+    def __init__(self, protocol="full"):
+        self.protocol = protocol if protocol in PROTOCOLS else "full"
+        self.seq = 0
+        self.sent = None  # GameState.snapshot() of the last update
+
+    def snapshot(self, game):
+        self.seq += 1
+        self.sent = game.state.snapshot()
+        return "game_update", snapshot_message(game, self.seq)
+
+    def update(self, game):
+        """(event, payload) for the next update, or None if nothing changed since the last one."""
+        if self.protocol == "full" or self.sent is None:
+            return self.snapshot(game)
+
+        current = game.state.snapshot()
+        dice, dice_count, current_bid, current_player, challenged, scores = current
+        sent_dice, sent_dice_count, sent_bid, sent_player, sent_challenged, sent_scores = self.sent
+        mask = ((current_bid != sent_bid) * BID
+                | (current_player != sent_player) * PLAYER
+                | (challenged != sent_challenged) * CHALLENGE
+                | (dice_count != sent_dice_count) * DICE_COUNT
+                | (dice != sent_dice) * DICE
+                | (scores != sent_scores) * SCORES)
+        if not mask:
+            return None
+        self.seq += 1
+        self.sent = current
+        if self.protocol == "bin":
+            return "game_delta", encode_binary_delta(mask, self.seq, current)
+        return "game_delta", encode_json_delta(mask, self.seq, current)
+
+
+def encode_json_delta(mask, seq, state):
+    dice, dice_count, current_bid, current_player, challenged, scores = state
+    delta = {"seq": seq}
+    if mask & BID:
+        delta["current_bid"] = current_bid
+    if mask & PLAYER:
+        delta["current_player"] = current_player
+    if mask & CHALLENGE:
+        delta["last_action_was_challenge"] = challenged
+    if mask & DICE_COUNT:
+        delta["dice_count"] = {1: dice_count[0], 2: dice_count[1]}
+    if mask & DICE:
+        delta["players"] = {1: dice[0], 2: dice[1]}
+    if mask & SCORES:
+        delta["scores"] = {1: scores[0], 2: scores[1]}
+    return delta
+
+
+def encode_binary_delta(mask, seq, state):
+    dice, dice_count, current_bid, current_player, challenged, scores = state
+    out = bytearray(_HEADER.pack(PROTOCOL_VERSION, mask, seq))
+    if mask & BID:
+        out += bytes(current_bid)
+    if mask & PLAYER:
+        out.append(current_player)
+    if mask & CHALLENGE:
+        out.append(challenged)
+    if mask & DICE_COUNT:
+        out += bytes(dice_count)
+    if mask & DICE:
+        out.append(len(dice[0]))
+        out += bytes(dice[0])
+        out.append(len(dice[1]))
+        out += bytes(dice[1])
+    if mask & SCORES:
+        out += _SCORES.pack(*scores)
+    return bytes(out)
+
+
+def decode_binary_delta(data):
+    """Inverse of `encode_binary_delta`, as the JSON delta dict; mirrors the client's decoder."""
+    version, mask, seq = _HEADER.unpack_from(data)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported protocol version {version}")
+    delta = {"seq": seq}
+    offset = _HEADER.size
+    if mask & BID:
+        delta["current_bid"] = (data[offset], data[offset + 1])
+        offset += 2
+    if mask & PLAYER:
+        delta["current_player"] = data[offset]
+        offset += 1
+    if mask & CHALLENGE:
+        delta["last_action_was_challenge"] = bool(data[offset])
+        offset += 1
+    if mask & DICE_COUNT:
+        delta["dice_count"] = {1: data[offset], 2: data[offset + 1]}
+        offset += 2
+    if mask & DICE:
+        players = {}
+        for player in (1, 2):
+            n = data[offset]
+            players[player] = tuple(data[offset + 1:offset + 1 + n])
+            offset += 1 + n
+        delta["players"] = players
+    if mask & SCORES:
+        score1, score2 = _SCORES.unpack_from(data, offset)
+        delta["scores"] = {1: score1, 2: score2}
+    return delta
+
+
+class OrjsonCodec:
+    """`json`-compatible module for `socketio.AsyncServer(json=...)` backed by orjson."""
+
+    def __init__(self, orjson):
+        self.orjson = orjson
+
+    def dumps(self, obj, **kwargs):
+        # get_game_state() dicts are keyed by player number
+        return self.orjson.dumps(obj, option=self.orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, data, **kwargs):
+        return self.orjson.loads(data)
+
+
+def packet_json():
+    try:
+        import orjson
+    except ImportError:
+        return json
+    return OrjsonCodec(orjson)
@@ -0,0 +1,93 @@
+"""Game-state backends shared by the workers of a sharded deployment.
+
+A worker always plays a room from the `LiarDiceGame` held in its own
+`RoomRegistry`; the store is the copy another worker (or the same one after a
+restart) resumes from. With no store configured nothing is persisted, which is
+the single-process default.
+
+- `LocalGameStore` keeps serialized games in a process-local dict. It behaves
+  like a remote store (every load is a fresh copy) and stands in for one in tests.
+- `RedisGameStore` keeps them in Redis with an expiry; needs the `redis` package.
+"""
+import json
+
+from liars_dice_game_logic import GameState, LiarDiceGame
+
+
+def encode_game(game):
+    state = game.state
+    return json.dumps({
+        "dice": state.dice,
+        "dice_count": state.dice_count,
+        "current_bid": state.current_bid,
+        "current_player": state.current_player,
+        "last_action_was_challenge": state.last_action_was_challenge,
+        "scores": state.scores,
+        "player_names": [game.player_names[1], game.player_names[2]],
+    }, separators=(",", ":")).encode()
+
+
+def decode_game(data):
+    fields = json.loads(data)
+    game = LiarDiceGame.__new__(LiarDiceGame)
+    game.state = GameState(
+        tuple(tuple(dice) for dice in fields["dice"]),
+        tuple(fields["dice_count"]),
+        tuple(fields["current_bid"]),
+        fields["current_player"],
+        fields["last_action_was_challenge"],
+        tuple(fields["scores"]),
+    )
+    game.player_names = {1: fields["player_names"][0], 2: fields["player_names"][1]}
+    return game
+
+
+class LocalGameStore:
+    def __init__(self):
+        self.data = {}
+
+    async def load(self, room):
+        data = self.data.get(room)
+        return decode_game(data) if data is not None else None
+
+    async def save(self, room, game):
+        self.data[room] = encode_game(game)
+
+    async def delete(self, room):
+        self.data.pop(room, None)
+
+    async def close(self):
+        pass
+
+
+class RedisGameStore:
+    def __init__(self, url, ttl=1800, prefix="game:"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    async def load(self, room):
+        data = await self.redis.get(self.prefix + room)
+        return decode_game(data) if data is not None else None
+
+    async def save(self, room, game):
+        await self.redis.set(self.prefix + room, encode_game(game), ex=self.ttl)
+
+    async def delete(self, room):
+        await self.redis.delete(self.prefix + room)
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_game_store(url, ttl=1800):
+    """"" -> None (in-memory only), "local://" -> LocalGameStore, "redis://..." -> RedisGameStore."""
+    if not url:
+        return None
+    if url.startswith("local://"):
+        return LocalGameStore()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisGameStore(url, ttl=ttl)
+    raise ValueError(f"Unsupported game store URL: {url}")
@@ -0,0 +1,53 @@
+"""Reports which imports dominate the start-up time of a module (default: main).
+
+    python import_profile.py [module] [--top N]
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+lists the slowest imports by cumulative and by self time, in milliseconds.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+def profile_imports(module):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    wall_seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.splitlines()[-1] if result.stderr else f"import {module} failed")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000, len(name) - len(name.lstrip())))
+    return rows, wall_seconds
+
+
+def report(module, top=20):
+    rows, wall_seconds = profile_imports(module)
+    lines = [f"import {module}: {wall_seconds * 1000:.0f} ms wall (interpreter start included), {len(rows)} modules"]
+    lines.append(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_ms, cumulative_ms, _ in sorted(rows, key=lambda row: row[2], reverse=True)[:top]:
+        lines.append(f"{cumulative_ms:14.1f} {self_ms:9.1f}  {name}")
+    heavy = [name for name in ("torch", "gymnasium", "gym", "sqlalchemy", "pandas", "matplotlib") if any(row[0] == name for row in rows)]
+    if heavy:
+        lines.append(f"heavy packages imported: {', '.join(heavy)}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time profile of a backend module")
+    parser.add_argument("module", nargs="?", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+    print(report(args.module, args.top))
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceScheduler:
+    """Micro-batches AI move decisions across rooms.
+
+    `decide` queues one decision per call. Decisions for the same model that
+    arrive within `window` seconds (or until `max_batch_size` are queued) run
+    as one `model.act_batch(inputs, masks)` call, i.e. one DQN forward pass or
+    one Q-table gather, and each waiting coroutine gets its own action back.
+    Models need `batch_input(state)` and `act_batch(inputs, masks)`.
+    """
+
+    def __init__(self, window=0.005, max_batch_size=256, executor=None):
+        self.window = window
+        self.executor = executor  # AIExecutor running the batched calls; None runs them on the loop
+        self.max_batch_size = max_batch_size
+        # model -> (difficulty label used for the executor's limits, list of (input, mask, future)).
+        # Entries go away on flush, so a swapped-out model is not kept alive here
+        self.pending = {}
+        self.timers = {}  # model -> TimerHandle of the scheduled flush
+        self.tasks = set()
+        self.batches = 0
+        self.decisions = 0
+
+    async def decide(self, model, state, mask, difficulty=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        _, batch = self.pending.setdefault(model, (difficulty, []))
+        batch.append((model.batch_input(state), mask, future))
+
+        if len(batch) >= self.max_batch_size:
+            self.flush(model)
+        elif model not in self.timers:
+            self.timers[model] = loop.call_later(self.window, self.flush, model)
+        return await future
+
+    def flush(self, model):
+        timer = self.timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+        difficulty, batch = self.pending.pop(model, (None, None))
+        if not batch:
+            return
+
+        inputs = np.stack([row_input for row_input, _, _ in batch])
+        masks = np.stack([mask for _, mask, _ in batch])
+        futures = [future for _, _, future in batch]
+        if self.executor is None:
+            self._resolve(model, futures, self._compute(model, inputs, masks))
+            return
+        # Keep a reference so the task is not garbage collected while it runs
+        task = asyncio.ensure_future(self._run_in_executor(model, difficulty, inputs, masks, futures))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    @staticmethod
+    def _compute(model, inputs, masks):
+        try:
+            return model.act_batch(inputs, masks)
+        except Exception as e:
+            return e
+
+    async def _run_in_executor(self, model, difficulty, inputs, masks, futures):
+        try:
+            actions = await self.executor.run_batch(difficulty, model, inputs, masks)
+        except Exception as e:  # e.g. AIExecutorSaturated; every room in the batch sees it
+            actions = e
+        self._resolve(model, futures, actions)
+
+    def _resolve(self, model, futures, actions):
+        if isinstance(actions, Exception):
+            for future in futures:
+                if not future.done():
+                    future.set_exception(actions)
+            return
+
+        for future, action in zip(futures, actions.tolist()):
+            if not future.done():  # the waiting room may have been cancelled
+                future.set_result(action)
+
+        self.batches += 1
+        self.decisions += len(futures)
+        logger.debug(f"{type(model).__name__}: batch of {len(futures)} decisions")
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "decisions": self.decisions,
+            "mean_batch_size": self.decisions / self.batches if self.batches else 0.0,
+            "pending": sum(len(batch) for _, batch in self.pending.values()),
+        }
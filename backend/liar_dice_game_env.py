@@ -1,12 +1,94 @@
+"""Gymnasium environments on the production Liar's Dice rules.
+
+Both seats are played by the agent (self-play): every observation is from the
+point of view of the player to move and every reward goes to the player who
+just acted, as in `LiarDiceGame.step`.
+
+Observations are float32 vectors of OBSERVATION_SIZE: the `state_features`
+layout (agents with STATE_SIZE inputs can use `obs[..., :STATE_SIZE]`)
+followed by the mover's own dice, zero-padded to five. Actions are
+Discrete(ACTION_SIZE) in the `action_masks` layout. `action_masks()` and
+info["action_mask"] give the legal ones; an illegal bid ends the game with -1.
+
+`LiarDiceGameEnv` plays one `LiarDiceGame`. `SyncVectorLiarDiceEnv` steps N
+games together on `BatchedLiarDiceGame` and `SubprocVectorLiarDiceEnv` splits
+N games over worker processes, each stepping its share as one batch. The
+vector envs follow the gymnasium 0.29 `VectorEnv` API: finished games reset
+automatically and their last observation is in info["final_observation"].
+"""
+import multiprocessing
+import os
+import random
+
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+from gymnasium.vector import VectorEnv
+
+from action_masks import ACTION_FACE_VALUES, ACTION_QUANTITIES, ACTION_SIZE, ACTION_TYPES, batch_action_masks, decode_action, state_action_mask
+from batched_liars_dice_game import MAX_DICE, MAX_QUANTITY, NUM_FACES, BatchedLiarDiceGame
 from liars_dice_game_logic import LiarDiceGame
+from state_codec import STATE_SIZE, batched_game_features, state_features
+
+OBSERVATION_SIZE = STATE_SIZE + MAX_DICE
+MAX_SCORE = 100 * (2 * MAX_DICE - 1)  # every challenge moves 100 points and a game has at most 9
+
+OBSERVATION_SPACE = spaces.Box(
+    low=0,
+    high=np.array([MAX_DICE, MAX_DICE, MAX_QUANTITY, NUM_FACES, MAX_SCORE, MAX_SCORE, 1] + [NUM_FACES] * MAX_DICE, dtype=np.float32),
+    dtype=np.float32,
+)
+ACTION_SPACE = spaces.Discrete(ACTION_SIZE)
+
+
+def observation(state):
+    """Observation of a `GameState` for the player to move."""
+    obs = np.zeros(OBSERVATION_SIZE, dtype=np.float32)
+    state_features(state, out=obs)
+    dice = state.dice[state.current_player - 1]
+    obs[STATE_SIZE:STATE_SIZE + len(dice)] = dice
+    return obs
+
+
+def batch_observations(game):
+    """(N, OBSERVATION_SIZE) observations of every game in a `BatchedLiarDiceGame`."""
+    obs = np.empty((game.num_games, OBSERVATION_SIZE), dtype=np.float32)
+    obs[:, :STATE_SIZE] = batched_game_features(game)
+    obs[:, STATE_SIZE:] = game.dice[np.arange(game.num_games), game.current_player.astype(np.intp) - 1]
+    return obs
 
-class LiarDiceGameEnv:
-    def __init__(self):
-        self.game = LiarDiceGame()
 
-    def reset(self):
-        self.game.__init__()
-        return self.get_state()
+def batch_masks(game):
+    return batch_action_masks(game.current_bid, game.dice_count.sum(axis=1), game.last_action_was_challenge)
+
+
+class LiarDiceGameEnv(gym.Env):
+    metadata = {"render_modes": ["ansi"]}
+
+    def __init__(self, render_mode=None):
+        self.observation_space = OBSERVATION_SPACE
+        self.action_space = ACTION_SPACE
+        self.render_mode = render_mode
+        self.game = self._new_game()
+
+    def _new_game(self):
+        # The game's dice come from a generator of its own, drawn from the env's np_random
+        return LiarDiceGame(rng=random.Random(int(self.np_random.integers(2 ** 63))))
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        self.game = self._new_game()
+        return observation(self.game.state), self._info()
+
+    def step(self, action):
+        reward, terminated = self.game.state.step(decode_action(int(action)))
+        return observation(self.game.state), float(reward), terminated, False, self._info()
+
+    def action_masks(self):
+        return state_action_mask(self.game.state)
+
+    def _info(self):
+        return {"action_mask": self.action_masks()}
 
     def get_state(self):
         return {
@@ -17,28 +99,131 @@ class LiarDiceGameEnv:
             'scores': self.game.scores,
         }
 
-    def step(self, action):
-        action_type, quantity, face_value = action
+    def render(self):
+        if self.render_mode == "ansi":
+            return str(self.game.get_game_state())
 
-        if action_type == "bid":
-            valid_bid = self.make_bid(self.current_player, quantity, face_value)
-            if not valid_bid:
-                return self.get_game_state(), -1, True, {}
+    def get_winner(self):
+        return self.game.get_winner()
 
-            state = self.get_game_state()
-            reward = 0
-            done = self.is_game_over()
-            return state, reward, done, {}
 
-        elif action_type == "challenge":
-            result = self.challenge(self.current_player)
-            state = self.get_game_state()
-            reward = 1 if 'successful' in result else -1
-            done = self.is_game_over()
-            return state, reward, done, {}
+class SyncVectorLiarDiceEnv(VectorEnv):
+    def __init__(self, num_envs, seed=None):
+        super().__init__(num_envs, OBSERVATION_SPACE, ACTION_SPACE)
+        self.game = BatchedLiarDiceGame(num_envs, seed=seed)
+        self._actions = None
 
-    def render(self):
-        pass  # Optional: Add rendering logic if needed
+    def reset_wait(self, seed=None, options=None):
+        if seed is not None:
+            self.game.rng = np.random.default_rng(seed)
+        self.game.reset()
+        return batch_observations(self.game), {"action_mask": batch_masks(self.game)}
 
-    def get_winner(self):
-        return self.game.get_winner()
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.intp)
+
+    def step_wait(self):
+        actions = self._actions
+        rewards, terminated = self.game.step(ACTION_TYPES[actions], ACTION_QUANTITIES[actions], ACTION_FACE_VALUES[actions])
+        obs = batch_observations(self.game)
+        infos = {}
+        if terminated.any():
+            final = np.full(self.num_envs, None, dtype=object)
+            for i in np.flatnonzero(terminated):
+                final[i] = obs[i].copy()
+            infos["final_observation"], infos["_final_observation"] = final, terminated.copy()
+            self.game.reset(terminated)
+            obs[terminated] = batch_observations(self.game)[terminated]
+        infos["action_mask"] = batch_masks(self.game)
+        return obs, rewards.astype(np.float64), terminated, np.zeros(self.num_envs, dtype=bool), infos
+
+    def action_masks(self):
+        return batch_masks(self.game)
+
+
+def _subproc_worker(pipe, num_envs, seed):
+    env = SyncVectorLiarDiceEnv(num_envs, seed=seed)
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == "step":
+                pipe.send(env.step(data))
+            elif command == "reset":
+                pipe.send(env.reset(seed=data))
+            elif command == "action_masks":
+                pipe.send(env.action_masks())
+            elif command == "close":
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        pipe.close()
+
+
+def _merge_infos(infos, sizes):
+    merged = {"action_mask": np.concatenate([info["action_mask"] for info in infos])}
+    if any("final_observation" in info for info in infos):
+        merged["final_observation"] = np.concatenate(
+            [info.get("final_observation", np.full(size, None, dtype=object)) for info, size in zip(infos, sizes)])
+        merged["_final_observation"] = np.concatenate(
+            [info.get("_final_observation", np.zeros(size, dtype=bool)) for info, size in zip(infos, sizes)])
+    return merged
+
+
+class SubprocVectorLiarDiceEnv(VectorEnv):
+    """Runs `num_envs` games split over `num_workers` processes, one batched chunk each."""
+
+    def __init__(self, num_envs, num_workers=None, seed=None, context="spawn"):
+        super().__init__(num_envs, OBSERVATION_SPACE, ACTION_SPACE)
+        num_workers = max(1, min(num_envs, num_workers or os.cpu_count() or 1))
+        self.sizes = [len(chunk) for chunk in np.array_split(np.arange(num_envs), num_workers)]
+        self.splits = np.cumsum(self.sizes)[:-1]
+        ctx = multiprocessing.get_context(context)
+        self.pipes, self.processes = [], []
+        for i, size in enumerate(self.sizes):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=_subproc_worker, args=(child, size, self._worker_seed(seed, i)), daemon=True)
+            process.start()
+            child.close()
+            self.pipes.append(parent)
+            self.processes.append(process)
+
+    @staticmethod
+    def _worker_seed(seed, worker):
+        return None if seed is None else [seed, worker]
+
+    def reset_async(self, seed=None, options=None):
+        for i, pipe in enumerate(self.pipes):
+            pipe.send(("reset", self._worker_seed(seed, i)))
+
+    def reset_wait(self, seed=None, options=None):
+        results = [pipe.recv() for pipe in self.pipes]
+        return np.concatenate([obs for obs, _ in results]), _merge_infos([info for _, info in results], self.sizes)
+
+    def step_async(self, actions):
+        for pipe, chunk in zip(self.pipes, np.split(np.asarray(actions), self.splits)):
+            pipe.send(("step", chunk))
+
+    def step_wait(self):
+        results = [pipe.recv() for pipe in self.pipes]
+        obs, rewards, terminated, truncated, infos = zip(*results)
+        return (np.concatenate(obs), np.concatenate(rewards), np.concatenate(terminated),
+                np.concatenate(truncated), _merge_infos(infos, self.sizes))
+
+    def action_masks(self):
+        for pipe in self.pipes:
+            pipe.send(("action_masks", None))
+        return np.concatenate([pipe.recv() for pipe in self.pipes])
+
+    def close_extras(self, **kwargs):
+        for pipe in self.pipes:
+            try:
+                pipe.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for pipe in self.pipes:
+            pipe.close()
@@ -1,10 +1,15 @@
 import random
 
 class ActionSpace:
+    __slots__ = ("action_types", "quantities", "face_values")
+
     def __init__(self, action_types, quantities, face_values):
-        self.action_types = action_types
-        self.quantities = quantities
-        self.face_values = face_values
+        object.__setattr__(self, "action_types", tuple(action_types))
+        object.__setattr__(self, "quantities", tuple(quantities))
+        object.__setattr__(self, "face_values", tuple(face_values))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ActionSpace is immutable")
 
     def sample(self):
         action_type = random.choice(self.action_types)
@@ -12,104 +17,219 @@ class ActionSpace:
         face_value = random.choice(self.face_values)
         return action_type, quantity, face_value
 
-class LiarDiceGame:
-    def __init__(self):
-        self.dice_count = {1: 5, 2: 5}
-        self.players = {1: [random.randint(1, 6) for _ in range(self.dice_count[1])], 
-                        2: [random.randint(1, 6) for _ in range(self.dice_count[2])]}
-        self.current_bid = (1, 1)  # Minimum bid to start each round
-        self.current_player = 1
-        self.last_action_was_challenge = False
-        self.scores = {1: 0, 2: 0}
-        self.player_names = {1: 'Player 1', 2: 'Player 2'} # default player names
 
-        self.action_space = ActionSpace([0, 1], range(1, 11), range(1, 7))
+# Shared by every game; the action space never depends on game state
+ACTION_SPACE = ActionSpace([0, 1], range(1, 11), range(1, 7))
 
-    def set_player_names(self, player1_name, player2_name):
-        self.player_names[1] = player1_name
-        self.player_names[2] = player2_name
+
+def roll(num_dice, rng=None):
+    # rng is a random.Random; None rolls with the module-level generator
+    randint = (rng or random).randint
+    return tuple(randint(1, 6) for _ in range(num_dice))
+
+
+class GameState:
+    """Rules-only game state used by LiarDiceGame and by search.
+
+    Every field holds an immutable value (ints, and tuples indexed by player - 1),
+    so `clone()` and `snapshot()` copy six references and `restore()` rebinds
+    them. No dicts are built and no strings are formatted here. `rng` (a
+    `random.Random`, or None for the module-level generator) rolls the dice; it
+    is carried by clones but is not part of a snapshot.
+    """
+
+    __slots__ = ("dice", "dice_count", "current_bid", "current_player", "last_action_was_challenge", "scores", "rng")
+
+    def __init__(self, dice, dice_count, current_bid, current_player, last_action_was_challenge, scores, rng=None):
+        self.dice = dice
+        self.dice_count = dice_count
+        self.current_bid = current_bid
+        self.current_player = current_player
+        self.last_action_was_challenge = last_action_was_challenge
+        self.scores = scores
+        self.rng = rng
+
+    @classmethod
+    def new(cls, num_dice=5, rng=None):
+        # (1, 1) is the minimum bid to start each round
+        return cls((roll(num_dice, rng), roll(num_dice, rng)), (num_dice, num_dice), (1, 1), 1, False, (0, 0), rng)
+
+    def clone(self):
+        return GameState(self.dice, self.dice_count, self.current_bid, self.current_player,
+                         self.last_action_was_challenge, self.scores, self.rng)
+
+    def snapshot(self):
+        return (self.dice, self.dice_count, self.current_bid, self.current_player,
+                self.last_action_was_challenge, self.scores)
+
+    def restore(self, snapshot):
+        (self.dice, self.dice_count, self.current_bid, self.current_player,
+         self.last_action_was_challenge, self.scores) = snapshot
 
     def roll_dice(self):
-        for player in self.players:
-            self.players[player] = [random.randint(1, 6) for _ in range(self.dice_count[player])]
+        self.dice = (roll(self.dice_count[0], self.rng), roll(self.dice_count[1], self.rng))
 
-    def reveal_dice(self):
-        return self.players
+    def count_bid_face(self):
+        face_value = self.current_bid[1]
+        dice1, dice2 = self.dice
+        if face_value == 1:
+            return dice1.count(1) + dice2.count(1)
+        return dice1.count(face_value) + dice1.count(1) + dice2.count(face_value) + dice2.count(1)
 
-    def make_bid(self, player, quantity, face_value):
-        if face_value not in range(1, 7):
+    def make_bid(self, quantity, face_value):
+        if face_value < 1 or face_value > 6:
             return False
-        
+
         if quantity > 10 or quantity < 1:
             return False
 
-        if self.current_bid == (1, 1):
-            if quantity < 1 or face_value < 1:
-                return False
-        else:
-            if quantity < self.current_bid[0] or (quantity == self.current_bid[0] and face_value <= self.current_bid[1]):
+        if self.current_bid != (1, 1):
+            current_quantity, current_face_value = self.current_bid
+            if quantity < current_quantity or (quantity == current_quantity and face_value <= current_face_value):
                 return False
 
         self.current_bid = (quantity, face_value)
         self.last_action_was_challenge = False
-        self.switch_player()
+        self.current_player = 3 - self.current_player
         return True
-    
-    def adjust_scores(self, winner, loser):
-        self.scores[winner] += 100
-        self.scores[loser] = max(0, self.scores[loser] - 100)
 
+    def challenge(self, challenger):
+        """Resolves a challenge and returns (successful, total_quantity).
+
+        The loser drops a die and 100 points, the winner gains 100 points, the
+        turn passes to the player who did not challenge and all dice are re-rolled.
+        """
+        total_quantity = self.count_bid_face()
+        other = 3 - challenger
+        successful = total_quantity < self.current_bid[0]
+        winner, loser = (challenger, other) if successful else (other, challenger)
+
+        dice_count = list(self.dice_count)
+        dice_count[loser - 1] = max(0, dice_count[loser - 1] - 1)
+        scores = list(self.scores)
+        scores[winner - 1] += 100
+        scores[loser - 1] = max(0, scores[loser - 1] - 100)
+
+        self.dice_count = (dice_count[0], dice_count[1])
+        self.scores = (scores[0], scores[1])
+        self.current_player = other
+        self.last_action_was_challenge = True
+        self.current_bid = (0, 0)
+        self.roll_dice()
+        return successful, total_quantity
+
+    def step(self, action):
+        """Same transition and reward as `LiarDiceGame.step`, returned as (reward, done)."""
+        action_type, quantity, face_value = action
+        if action_type == 0:  # Bid
+            if not self.make_bid(quantity, face_value):
+                return -1, True
+            return 0, self.is_game_over()
+        successful, _ = self.challenge(self.current_player)
+        return (1 if successful else -1), self.is_game_over()
+
+    def is_game_over(self):
+        return self.dice_count[0] == 0 or self.dice_count[1] == 0
+
+    def get_winner(self):
+        if self.dice_count[0] == 0:
+            return 2
+        elif self.dice_count[1] == 0:
+            return 1
+        return None
+
+
+class LiarDiceGame:
+    action_space = ACTION_SPACE
+
+    def __init__(self, rng=None):
+        self.state = GameState.new(rng=rng)
+        self.player_names = {1: 'Player 1', 2: 'Player 2'} # default player names
+
+    @property
+    def dice_count(self):
+        return {1: self.state.dice_count[0], 2: self.state.dice_count[1]}
+
+    @property
+    def players(self):
+        return {1: list(self.state.dice[0]), 2: list(self.state.dice[1])}
+
+    @property
+    def scores(self):
+        return {1: self.state.scores[0], 2: self.state.scores[1]}
+
+    @property
+    def current_bid(self):
+        return self.state.current_bid
+
+    @current_bid.setter
+    def current_bid(self, value):
+        self.state.current_bid = tuple(value)
+
+    @property
+    def current_player(self):
+        return self.state.current_player
+
+    @current_player.setter
+    def current_player(self, value):
+        self.state.current_player = value
+
+    @property
+    def last_action_was_challenge(self):
+        return self.state.last_action_was_challenge
+
+    @last_action_was_challenge.setter
+    def last_action_was_challenge(self, value):
+        self.state.last_action_was_challenge = value
+
+    def clone(self):
+        # Player names are shared rather than copied; search never renames players
+        game = LiarDiceGame.__new__(LiarDiceGame)
+        game.state = self.state.clone()
+        game.player_names = self.player_names
+        return game
+
+    def snapshot(self):
+        return self.state.snapshot()
+
+    def restore(self, snapshot):
+        self.state.restore(snapshot)
+
+    def set_player_names(self, player1_name, player2_name):
+        self.player_names[1] = player1_name
+        self.player_names[2] = player2_name
+
+    def roll_dice(self):
+        self.state.roll_dice()
+
+    def reveal_dice(self):
+        return self.players
+
+    def make_bid(self, player, quantity, face_value):
+        return self.state.make_bid(quantity, face_value)
 
     def challenge(self, challenger):
-        players_dice = self.reveal_dice()
-        if self.current_bid[1] == 1:
-            total_quantity = sum(dice.count(1) for dice in players_dice.values())
-        else:
-            total_quantity = sum(dice.count(self.current_bid[1]) + dice.count(1) for dice in players_dice.values())
+        dice_faces = {player: " ".join(str(die) for die in dice) for player, dice in self.reveal_dice().items()}
 
-        result = None
-        dice_faces = {player: " ".join(str(die) for die in dice) for player, dice in players_dice.items()}
+        successful, total_quantity = self.state.challenge(challenger)
 
-        if total_quantity >= self.current_bid[0]:
-            self.switch_player()
+        if not successful:
             result = f"Challenge failed. Total dice count is {total_quantity}. {self.player_names[challenger]} loses a dice and 100 points. {self.player_names[self.current_player]} wins 100 points.\n" \
                      f"{self.player_names[1]}'s dice: {dice_faces[1]}\n{self.player_names[2]}'s dice: {dice_faces[2]}"
-            if self.dice_count[challenger] > 0:
-                self.dice_count[challenger] -= 1
-                if self.players[challenger]:
-                    self.players[challenger].pop()
-            self.adjust_scores(self.current_player, challenger)
         else:
-            self.switch_player()
             result = f"Challenge successful. Total dice count is {total_quantity}. {self.player_names[self.current_player]} loses a dice and 100 points. {self.player_names[challenger]} wins 100 points.\n" \
                      f"{self.player_names[1]}'s dice: {dice_faces[1]}\n{self.player_names[2]}'s dice: {dice_faces[2]}"
-            if self.dice_count[self.current_player] > 0:
-                self.dice_count[self.current_player] -= 1
-                if self.players[self.current_player]:
-                    self.players[self.current_player].pop()
-            self.adjust_scores(challenger, self.current_player)
-
-        self.last_action_was_challenge = True
-        self.current_bid = (0, 0)
-        self.roll_dice()
 
-        if self.is_game_over():
-            return result
-        
         return result
 
     def switch_player(self):
-        self.current_player = 1 if self.current_player == 2 else 2
+        self.state.current_player = 3 - self.state.current_player
 
     def is_game_over(self):
-        return any(count == 0 for count in self.dice_count.values())
+        return self.state.is_game_over()
 
     def get_winner(self):
-        if self.dice_count[1] == 0:
-            return 2
-        elif self.dice_count[2] == 0:
-            return 1
-        return None
+        return self.state.get_winner()
 
     def random_bid(self):
         total_dice = self.dice_count[self.current_player]
@@ -147,7 +267,6 @@ class LiarDiceGame:
 
 
     def get_game_state(self):
-        print(self.get_dice_counts())
         return {
             "dice_count": self.get_dice_counts(),
             "players": self.players,
@@ -1,41 +1,66 @@
 import pickle
 from q_learning_agent import QLearningAgent
-from dqn_agent import DQNAgent, DQNetwork
 from sarsa_agent import SARSAAgent
 from mcts_agent import MCTSAgent
-import numpy as np
-from collections import defaultdict
+from q_table_store import QTableStore
+from dqn_inference import NumpyDQN, NumpyDQNAgent, checkpoint_network_state
+from policy_table import PolicyTable
+from cfr_agent import CFRAgent
 
 class CustomUnpickler(pickle.Unpickler):
     def find_class(self, module, name):
         if name == 'QLearningAgent':
             return QLearningAgent
-        if name == 'DQNetwork':
-            return DQNetwork
-        if name == 'DQNAgent':
-            return DQNAgent
+        if name in ('DQNetwork', 'DQNAgent'):
+            # Imported lazily: only legacy torch checkpoints need torch
+            import dqn_agent
+            return getattr(dqn_agent, name)
         if name == 'SARSAAgent':
             return SARSAAgent
         if name == 'MCTSAgent':
             return MCTSAgent
         return super().find_class(module, name)
 
-def load_agents(easy_filename='ai_models/q_learning_agent.pkl', medium_filename='ai_models/dqn_agent.pkl', hard_filename='ai_models/sarsa_agent.pkl'):
-    with open(easy_filename, 'rb') as f:
-        q_table_dict = CustomUnpickler(f).load()
+def read_q_table(f, filename, action_size):
+    # .qtable files are memory-mapped read-only and shared by every worker process
+    if filename.endswith('.qtable'):
+        return QTableStore.load(filename)
+    return QTableStore.from_dict(CustomUnpickler(f).load(), action_size)
+
+def load_easy_agent(filename):
+    if filename.endswith('.policy'):
+        return PolicyTable.load(filename)
+    with open(filename, 'rb') as f:
         easy_agent = QLearningAgent(state_size=7, action_size=132)  # Adjust state_size and action_size accordingly
-        easy_agent.q_table = defaultdict(lambda: np.zeros(easy_agent.action_size), q_table_dict)
-    
-    with open(medium_filename, 'rb') as f:
+        easy_agent.q_table = read_q_table(f, filename, easy_agent.action_size)
+    easy_agent.epsilon = easy_agent.epsilon_min  # the constructor's 1.0 is for the start of training
+    return easy_agent
+
+def load_medium_agent(filename):
+    if filename.endswith('.policy'):
+        return PolicyTable.load(filename)
+    if filename.endswith('.npz'):
+        return NumpyDQNAgent.load(filename)
+    with open(filename, 'rb') as f:
         medium_agent_state = CustomUnpickler(f).load()
-        if isinstance(medium_agent_state, dict):
-            state_size = medium_agent_state['state_size']
-            action_size = medium_agent_state['action_size']
-            medium_agent = DQNAgent(state_size, action_size)
-    
-    with open(hard_filename, 'rb') as f:
-        q_table_dict = CustomUnpickler(f).load()
+    if not isinstance(medium_agent_state, dict):
+        medium_agent_state = medium_agent_state.__getstate__()
+    network = NumpyDQN.from_state_dict(checkpoint_network_state(medium_agent_state))
+    return NumpyDQNAgent(network, epsilon=medium_agent_state['epsilon'])
+
+def load_hard_agent(filename):
+    if filename.endswith('.policy'):
+        return PolicyTable.load(filename)
+    with open(filename, 'rb') as f:
         hard_agent = SARSAAgent(state_size=7, action_size=132)  # Adjust state_size and action_size accordingly
-        hard_agent.q_table = defaultdict(lambda: np.zeros(hard_agent.action_size), q_table_dict)
-    
-    return easy_agent, medium_agent, hard_agent
\ No newline at end of file
+        hard_agent.q_table = read_q_table(f, filename, hard_agent.action_size)
+    hard_agent.epsilon = hard_agent.epsilon_min  # the constructor's 1.0 is for the start of training
+    return hard_agent
+
+def load_expert_agent(filename):
+    if filename.endswith('.policy'):
+        return PolicyTable.load(filename)
+    return CFRAgent.load(filename)
+
+def load_agents(easy_filename='ai_models/q_learning_agent.pkl', medium_filename='ai_models/dqn_agent.pkl', hard_filename='ai_models/sarsa_agent.pkl'):
+    return load_easy_agent(easy_filename), load_medium_agent(medium_filename), load_hard_agent(hard_filename)
@@ -5,7 +5,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
 from dotenv import load_dotenv
 import os
-from sockets import socketio_app
+import asyncio
+from fastapi.responses import JSONResponse
+from sockets import socketio_app, room_registry, checkpoint_writer, agent_registry, model_registry, AI_WARMUP
 from endpoints import router as highscore_router
 # Load environment variables from .env file
 load_dotenv()
@@ -56,5 +58,28 @@ app.add_middleware(
 async def home():
     return {'message': 'Hello👋 Developers💻'}
 
+@app.on_event('startup')
+async def warm_up_agents():
+    # Runs in the background: the server accepts connections while the models load
+    if AI_WARMUP:
+        asyncio.create_task(asyncio.to_thread(agent_registry.warm_up, AI_WARMUP))
+
+@app.on_event('shutdown')
+async def finish_checkpoint():
+    # Let a checkpoint that is being written complete its rename
+    checkpoint_writer.close(wait=True)
+
+@app.get('/ready')
+async def ready():
+    # 503 until every AI_WARMUP agent has loaded
+    body = {'ready': agent_registry.is_ready(AI_WARMUP), 'agents': agent_registry.status()}
+    if model_registry is not None:
+        body['model_versions'] = model_registry.live
+    return JSONResponse(body, status_code=200 if body['ready'] else 503)
+
+@app.get('/rooms/stats')
+async def room_stats():
+    return room_registry.stats()
+
 if __name__ == '__main__':
     uvicorn.run('main:app', reload=True)
\ No newline at end of file
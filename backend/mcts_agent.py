@@ -1,118 +1,334 @@
+"""Information-set Monte Carlo tree search for Liar's Dice.
+
+The searching player sees its own dice but not the opponent's, so every
+simulation first determinizes: the opponent's dice are sampled uniformly
+(they are re-rolled after every challenge and bids may be bluffs, so any roll
+is consistent with what has been observed). The simulation then runs on a
+clone of that state: UCB1 selection down the tree, expansion up to the first
+new move of the searcher's, a heuristic rollout and backpropagation of the
+result from the searcher's point of view.
+
+Nodes live in a transposition table keyed by the information set of the
+player to move: the `state_codec` key, whether the last move was a challenge
+and that player's own (sorted) dice. Move orders that reach the same bid
+share statistics. Only the challenge and the smallest raises are searched,
+and the rollout policy's move is expanded first.
+
+Search is anytime: it stops at `time_budget_ms` (or after `num_simulations`,
+whichever comes first) and plays the most visited root action. With
+`workers` > 1 the search is root-parallel: independent trees with their own
+seeds run in a process pool until the same deadline, and their root visit
+counts and values are summed before the action is picked.
+
+`select_action(..., session=room)` keeps the (caller's) tree between moves of
+a room: the next search starts from the node the game actually reached,
+after nodes that can no longer occur (earlier bids of the round, rounds with
+more dice, the searcher's other possible rolls) are pruned. At most
+`max_trees` sessions are kept, least recently used first out.
+"""
 import logging
+import math
+import multiprocessing
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
 
-class MCTSAgent:
-    def __init__(self, num_simulations=100):
-        self.num_simulations = num_simulations
+import numpy as np
 
-    def select_action(self, state, env):
-        root = Node(state, None, None, env)
-        for _ in range(self.num_simulations):
-            leaf = self.traverse(root, env)
-            reward = self.simulate(leaf.state, env)
-            self.backpropagate(leaf, reward)
-        best_action_node = self.best_action(root)
-        logging.info(f"Best action node: {best_action_node.action}, Reward: {best_action_node.reward}, Visits: {best_action_node.visits}")
-        return best_action_node.action
-
-    def traverse(self, node, env):
-        while not node.is_terminal():
-            if node.is_fully_expanded():
-                node = self.best_child(node)
-            else:
-                return self.expand(node, env)
-        return node
+from action_masks import CHALLENGE_ACTION, DISTINCT_ACTIONS, NUM_FACES, decode_action, state_action_mask
+from probability import BID_TRUTH, matching_counts
+from liars_dice_game_logic import GameState, roll
+from state_codec import decode_state, encode_state
 
-    def expand(self, node, env):
-        action = node.untried_actions.pop()
-        action_type, quantity, face_value = decode_action(action)
-        next_state, _, done, _ = env.step((action_type, quantity, face_value))
-        child_node = Node(next_state, node, action, env)
-        node.children.append(child_node)
-        return child_node
-
-    def simulate(self, state, env):
-        action = env.action_space.sample()  # Or use a more sophisticated strategy
-        action_type, quantity, face_value = decode_action(action)
-        if not is_valid_action(action_type, quantity, face_value, state):
-            return 0
-        next_state, reward, done, _ = env.step((action_type, quantity, face_value))
-        return reward
-
-    def backpropagate(self, node, reward):
-        while node is not None:
-            node.visits += 1
-            node.reward += reward
-            node = node.parent
+DEFAULT_TIME_BUDGET_MS = 200
+DEFAULT_EXPLORATION = 0.7
+DEFAULT_ROLLOUT_DEPTH = 30
+DEFAULT_MAX_NODES = 50_000  # per tree
+DEFAULT_MAX_TREES = 64
+DEFAULT_MAX_RAISE = 1
+RESULT_GRACE_SECONDS = 0.05
+
+
+def rollout_action(state):
+    """A quick heuristic move: challenge an unlikely bid, otherwise make the likeliest of the next few raises."""
+    mask = state_action_mask(state) & DISTINCT_ACTIONS
+    player = state.current_player
+    unknown = state.dice_count[2 - player]
+    matching = matching_counts(state.dice[player - 1])
+    if mask[CHALLENGE_ACTION]:
+        quantity, face_value = state.current_bid
+        if BID_TRUTH[unknown, matching[face_value], quantity, face_value] < 0.5:
+            return CHALLENGE_ACTION
+    bids = np.flatnonzero(mask[:CHALLENGE_ACTION])
+    if len(bids) == 0:
+        return CHALLENGE_ACTION
+    # Bid indices grow with (quantity, face_value), so the smallest raises come first
+    candidates = bids[:NUM_FACES]
+    quantities = candidates // NUM_FACES + 1
+    faces = candidates % NUM_FACES + 1
+    truth = BID_TRUTH[unknown, matching[faces], quantities, faces]
+    return int(candidates[truth.argmax()])
 
-    def best_action(self, node):
-        return max(node.children, key=lambda child: child.reward / child.visits)
+
+def candidate_actions(state, max_raise):
+    """The challenge (if legal) and the bids at most `max_raise` quantities above the lowest legal one."""
+    # Every challenge index means the same move, so only one of them is searched
+    mask = state_action_mask(state) & DISTINCT_ACTIONS
+    actions = [CHALLENGE_ACTION] if mask[CHALLENGE_ACTION] else []
+    bids = np.flatnonzero(mask[:CHALLENGE_ACTION])
+    if len(bids):
+        # Bid indices grow with (quantity, face_value): index // NUM_FACES is quantity - 1
+        actions += bids[bids // NUM_FACES <= bids[0] // NUM_FACES + max_raise].tolist()
+    return actions
 
 
 class Node:
-    def __init__(self, state, parent, action, env):
-        self.state = state
-        self.parent = parent
-        self.children = []
-        self.visits = 0
-        self.reward = 0
-        self.untried_actions = self.get_untried_actions(state)
-        self.env = env
-        self.action = action
+    __slots__ = ("player", "actions", "untried", "visits", "child_visits", "child_value")
 
-    def is_terminal(self):
-        return self.env.is_game_over()
+    def __init__(self, state, max_raise):
+        self.player = state.current_player
+        self.actions = candidate_actions(state, max_raise)
+        # Popped from the end: the rollout policy's move first, then the challenge and the smallest raises
+        self.untried = list(range(len(self.actions) - 1, -1, -1))
+        preferred = rollout_action(state)
+        if preferred in self.actions:
+            self.untried.remove(self.actions.index(preferred))
+            self.untried.append(self.actions.index(preferred))
+        self.visits = 0
+        self.child_visits = [0] * len(self.actions)
+        self.child_value = [0.0] * len(self.actions)
 
     def is_fully_expanded(self):
-        return len(self.untried_actions) == 0
-
-    def best_child(self):
-        return max(self.children, key=lambda child: child.reward / child.visits)
-
-    def get_untried_actions(self, state):
-        actions = []
-        total_dice = sum(state["dice_count"])
-        current_quantity, current_face_value = state["current_bid"]
-
-        for action in range(2 * 10 * 6):  # Assuming 2 action types, 10 quantities, 6 face values
-            action_type, quantity, face_value = decode_action(action)
-            if action_type == 0:  # Bid
-                if 1 <= quantity <= total_dice and 1 <= face_value <= 6:
-                    if quantity > current_quantity or (quantity == current_quantity and face_value > current_face_value):
-                        actions.append(action)
-            elif action_type == 1:  # Challenge
-                if not state["last_action_was_challenge"]:
-                    actions.append(action)
-        return actions
-
-
-
-def decode_action(action):
-    if isinstance(action, tuple):
-        return action
-    else:
-        action_type = action // 60 
-        quantity = (action % 60) // 6 + 1  
-        face_value = action % 6 + 1
-        return action_type, quantity, face_value
-
-def is_valid_action(action_type, quantity, face_value, state):
-    current_quantity, current_face_value = state["current_bid"]
-    total_dice = sum(state["dice_count"])
-
-    if action_type == 0:  # Bid
-        if quantity > total_dice or quantity < 1:
-            return False
-        if face_value < 1 or face_value > 6:
-            return False
-        if quantity < current_quantity or (
-            quantity == current_quantity and face_value <= current_face_value
-        ):
-            return False
-    elif action_type == 1:  # Challenge
-        if state["last_action_was_challenge"]:
-            return False
-        if current_quantity == 1 and current_face_value == 1:
-            return True  # Always valid to challenge the first bid
-        if quantity > total_dice:
-            return False  # Quantity should not exceed total dice
-    return True
+        return not self.untried
+
+    def best_child(self, exploration):
+        """Index of the action with the highest UCB1 score for the player to move."""
+        log_visits = math.log(self.visits)
+        best, best_score = 0, -math.inf
+        for i, (visits, value) in enumerate(zip(self.child_visits, self.child_value)):
+            score = value / visits + exploration * math.sqrt(log_visits / visits)
+            if score > best_score:
+                best, best_score = i, score
+        return best
+
+
+def _search_worker(agent, snapshot, seed, deadline):
+    """One root-parallel tree in a worker process, searched until the wall-clock `deadline`."""
+    random.seed(seed)  # dice are rolled with the random module
+    budget = max(deadline - time.time(), 0.0)
+    return agent.search(GameState(*snapshot), time.perf_counter() + budget)
+
+
+class MCTSAgent:
+    def __init__(self, num_simulations=None, time_budget_ms=DEFAULT_TIME_BUDGET_MS, exploration=DEFAULT_EXPLORATION,
+                 rollout_depth=DEFAULT_ROLLOUT_DEPTH, max_nodes=DEFAULT_MAX_NODES, max_raise=DEFAULT_MAX_RAISE,
+                 workers=1, max_trees=DEFAULT_MAX_TREES):
+        self.num_simulations = num_simulations
+        self.time_budget_ms = time_budget_ms
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        self.max_nodes = max_nodes
+        self.max_raise = max_raise
+        # Root parallelism: workers - 1 trees run in a process pool next to the caller's own tree
+        self.workers = workers
+        self.max_trees = max_trees
+        self.last_search = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._trees = OrderedDict()  # session -> transposition table kept between moves
+        self._trees_lock = threading.Lock()
+
+    def __getstate__(self):
+        # Pools, locks and kept trees stay in this process (workers get a fresh copy each move)
+        return {key: value for key, value in self.__dict__.items() if not key.startswith("_")}
+
+    def __setstate__(self, state):
+        # Agents pickled before the time budget existed only carry num_simulations
+        self.__init__()
+        self.__dict__.update(state)
+
+    def pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: the serving process has threads, and workers only need this module
+                self._pool = ProcessPoolExecutor(self.workers - 1, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def warm_up(self):
+        """Starts the worker processes now instead of on the first parallel move.
+
+        Each worker runs a one-simulation search, so it has imported this module
+        and built its tables before the first real move's deadline starts.
+        """
+        if self.workers > 1:
+            pool = self.pool()
+            snapshot = GameState.new().snapshot()
+            wait([pool.submit(_search_worker, self, snapshot, seed, 0.0) for seed in range(self.workers - 1)])
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def release(self, session):
+        """Drops the tree kept for `session` (e.g. when its room closes)."""
+        with self._trees_lock:
+            self._trees.pop(session, None)
+
+    def session_table(self, session, root_state):
+        with self._trees_lock:
+            table = self._trees.pop(session, None)
+            reused = table is not None
+            self._trees[session] = table = table if reused else {}
+            while len(self._trees) > self.max_trees:
+                self._trees.popitem(last=False)
+        if reused:
+            self.prune(table, root_state)
+        return table
+
+    def prune(self, table, root_state):
+        """Removes the nodes of `table` that cannot follow `root_state`."""
+        searcher = root_state.current_player
+        counts = root_state.dice_count
+        own_dice = tuple(sorted(root_state.dice[searcher - 1]))
+        bid = root_state.current_bid
+        for key in list(table):
+            state_key, _, dice = key
+            dice_count_1, dice_count_2, quantity, face_value, _, _, player = decode_state(state_key)
+            if dice_count_1 > counts[0] or dice_count_2 > counts[1]:
+                del table[key]  # an earlier round: every challenge removes a die
+            elif (dice_count_1, dice_count_2) == counts and (
+                    (quantity, face_value) < bid or (player == searcher and dice != own_dice)):
+                del table[key]  # this round, but before the standing bid or with a roll the searcher does not hold
+
+    def select_action(self, state, env, session=None):
+        """Searches from the information set of the player to move in `env` and returns an action index.
+
+        With a `session` (e.g. the room name) the tree is kept and reused on the session's next move.
+        """
+        root_state = env.state.clone()  # the live game is never stepped
+        root_state.rng = None  # nor its dice generator: simulated re-rolls use the random module
+        actions = candidate_actions(root_state, self.max_raise)
+        if len(actions) == 1:
+            return actions[0]
+
+        start = time.perf_counter()
+        budget = self.time_budget_ms / 1000 if self.time_budget_ms else math.inf
+        table = self.session_table(session, root_state) if session is not None else None
+        if self.workers > 1:
+            stats = self.parallel_search(root_state, budget, table)
+        else:
+            stats = self.search(root_state, start + budget, table)
+
+        best = max(range(len(stats["actions"])), key=stats["visits"].__getitem__)
+        self.last_search = {
+            "simulations": stats["simulations"],
+            "reused_visits": stats["reused_visits"],
+            "trees": stats.get("trees", 1),
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+            "nodes": stats["nodes"],
+            "visits": stats["visits"][best],
+            "value": stats["values"][best] / max(stats["visits"][best], 1),
+        }
+        logging.info(f"MCTS best action: {stats['actions'][best]}, {self.last_search}")
+        return stats["actions"][best]
+
+    def search(self, root_state, deadline, table=None):
+        """Simulates from `root_state` until the `perf_counter` deadline (or `num_simulations`); returns root statistics."""
+        searcher = root_state.current_player
+        table = {} if table is None else table
+        root = self.node(table, root_state)
+        if root is None:  # a kept tree that is full: start over
+            table.clear()
+            root = self.node(table, root_state)
+        reused_visits = root.visits
+        limit = self.num_simulations if self.num_simulations else math.inf
+        simulations = 0
+        while simulations < limit and (simulations == 0 or time.perf_counter() < deadline):
+            self.simulate(table, root, self.determinize(root_state, searcher), searcher)
+            simulations += 1
+        return {"actions": root.actions, "visits": list(root.child_visits), "values": list(root.child_value),
+                "simulations": simulations, "reused_visits": reused_visits, "nodes": len(table)}
+
+    def parallel_search(self, root_state, budget, table=None):
+        """Searches independent trees, each with its own seed, and sums their root visits and values."""
+        deadline = time.time() + budget
+        futures = [
+            self.pool().submit(_search_worker, self, root_state.snapshot(), random.getrandbits(64), deadline)
+            for _ in range(self.workers - 1)
+        ]
+        results = [self.search(root_state, time.perf_counter() + budget, table)]
+        # Trees that have not reported shortly after the deadline (e.g. a busy pool) are left out
+        done, not_done = wait(futures, timeout=max(deadline - time.time(), 0) + RESULT_GRACE_SECONDS)
+        for future in not_done:
+            future.cancel()
+        results += [future.result() for future in done if not future.cancelled() and future.exception() is None]
+
+        merged = {"actions": results[0]["actions"], "visits": [0] * len(results[0]["actions"]),
+                  "values": [0.0] * len(results[0]["actions"]), "simulations": 0,
+                  "reused_visits": results[0]["reused_visits"], "nodes": 0, "trees": len(results)}
+        index = {action: i for i, action in enumerate(merged["actions"])}
+        for result in results:
+            for action, visits, value in zip(result["actions"], result["visits"], result["values"]):
+                merged["visits"][index[action]] += visits
+                merged["values"][index[action]] += value
+            merged["simulations"] += result["simulations"]
+            merged["nodes"] += result["nodes"]
+        return merged
+
+    def determinize(self, state, searcher):
+        """A clone of `state` with the opponent's dice resampled."""
+        state = state.clone()
+        dice = list(state.dice)
+        opponent = 2 - searcher
+        dice[opponent] = roll(state.dice_count[opponent])
+        state.dice = (dice[0], dice[1])
+        return state
+
+    def node(self, table, state):
+        # The information set of the player to move: public state plus that player's own dice
+        key = (encode_state(state), state.last_action_was_challenge, tuple(sorted(state.dice[state.current_player - 1])))
+        node = table.get(key)
+        if node is None and len(table) < self.max_nodes:
+            node = table[key] = Node(state, self.max_raise)
+        return node
+
+    def simulate(self, table, node, state, searcher):
+        path = []
+        # Selection and expansion
+        while node is not None and not state.is_game_over():
+            if node.is_fully_expanded():
+                index = node.best_child(self.exploration)
+                path.append((node, index))
+                state.step(decode_action(node.actions[index]))
+                node = self.node(table, state)
+            else:
+                index = node.untried.pop()
+                path.append((node, index))
+                state.step(decode_action(node.actions[index]))
+                # Expanding an opponent reply does not end the descent: opponent nodes are split by
+                # their sampled dice, and this lets the searcher's next decisions collect visits
+                if node.player == searcher:
+                    break
+                node = self.node(table, state)
+
+        value = self.rollout(state, searcher)
+
+        # Each edge is credited from the point of view of the player who chose it
+        for node, index in path:
+            node.visits += 1
+            node.child_visits[index] += 1
+            node.child_value[index] += value if node.player == searcher else -value
+
+    def rollout(self, state, searcher):
+        """Plays heuristic moves to the end of the game (or `rollout_depth`); +1 win, -1 loss for the searcher."""
+        for _ in range(self.rollout_depth):
+            if state.is_game_over():
+                break
+            state.step(decode_action(rollout_action(state)))
+        if state.is_game_over():
+            return 1.0 if state.get_winner() == searcher else -1.0
+        own, other = state.dice_count[searcher - 1], state.dice_count[2 - searcher]
+        return (own - other) / (own + other)
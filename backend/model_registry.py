@@ -0,0 +1,256 @@
+"""Versioned, checksummed model artifacts and the pointer to each difficulty's live version.
+
+Layout under the registry root:
+
+    <difficulty>/<version>/<artifact>       e.g. hard/v3/sarsa_agent.qtable
+    <difficulty>/<version>/manifest.json    kind, artifact, sha256, size, config, created
+    <difficulty>/CURRENT                    the promoted version
+
+Versions are immutable once published. `promote` rewrites CURRENT atomically;
+running workers see the change in `poll`, load and verify the new version off
+the event loop and swap it into their `AgentRegistry`. Decisions already in
+flight keep the agent object they started with.
+
+    python model_registry.py publish hard sarsa_agent.qtable --kind sarsa [--version v3] [--promote]
+    python model_registry.py publish hard --kind mcts --config '{"time_budget_ms": 300}'
+    python model_registry.py publish bayesian --kind bayesian --config '{"bluff_rate": 0.3}'
+    python model_registry.py publish hard sarsa_agent.policy --kind policy
+    python model_registry.py publish expert cfr_strategy.npz --kind cfr
+    python model_registry.py promote hard v3
+    python model_registry.py list [hard]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+from checkpoint import atomic_save
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+CONFIG_ARTIFACT = "config.json"
+KINDS = ("q_learning", "sarsa", "dqn", "mcts", "bayesian", "policy", "cfr")
+CONFIG_KINDS = ("mcts", "bayesian")  # built from settings alone, no trained artifact
+
+
+class ModelRegistryError(Exception):
+    pass
+
+
+def sha256_file(filename, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _TextSnapshot:
+    def __init__(self, text):
+        self.text = text
+
+    def save(self, filename):
+        with open(filename, "w") as f:
+            f.write(self.text)
+
+
+class _CopySnapshot:
+    def __init__(self, source):
+        self.source = source
+
+    def save(self, filename):
+        shutil.copyfile(self.source, filename)
+
+
+def build_agent(kind, artifact, config):
+    """Constructs a serving agent from a verified artifact file."""
+    from load_agents import load_easy_agent, load_expert_agent, load_hard_agent, load_medium_agent
+
+    if kind == "q_learning":
+        return load_easy_agent(artifact)
+    if kind == "sarsa":
+        return load_hard_agent(artifact)
+    if kind == "dqn":
+        return load_medium_agent(artifact)
+    if kind == "mcts":
+        from mcts_agent import MCTSAgent
+
+        agent = MCTSAgent(**config)
+        agent.warm_up()
+        return agent
+    if kind == "policy":
+        from policy_table import PolicyTable
+
+        return PolicyTable.load(artifact)
+    if kind == "bayesian":
+        from bayesian_agent import BayesianAgent
+
+        return BayesianAgent(**config)
+    if kind == "cfr":
+        return load_expert_agent(artifact)
+    raise ModelRegistryError(f"Unknown model kind: {kind}")
+
+
+class ModelRegistry:
+    def __init__(self, root):
+        self.root = root
+        self.live = {}  # difficulty -> version this process is serving
+        self.routed = set()  # difficulties whose AgentRegistry loader reads this registry; set by `loader`
+        self.rejected = {}  # difficulty -> promoted version that failed to load here
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def difficulties(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isfile(self._path(d, CURRENT)))
+
+    def versions(self, difficulty):
+        directory = self._path(difficulty)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(v for v in os.listdir(directory) if os.path.isfile(self._path(difficulty, v, MANIFEST)))
+
+    def manifest(self, difficulty, version):
+        try:
+            with open(self._path(difficulty, version, MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ModelRegistryError(f"{difficulty} has no version {version}") from None
+
+    def current_version(self, difficulty):
+        try:
+            with open(self._path(difficulty, CURRENT)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def publish(self, difficulty, kind, artifact=None, version=None, config=None, promote=False):
+        """Copies an artifact (or, for MCTS and Bayesian, a config) into a new immutable version; returns its manifest."""
+        if kind not in KINDS:
+            raise ModelRegistryError(f"Unknown model kind: {kind}")
+        if artifact is None and kind not in CONFIG_KINDS:
+            raise ModelRegistryError(f"A {kind} model needs an artifact file")
+        version = version or time.strftime("v%Y%m%d-%H%M%S")
+        directory = self._path(difficulty, version)
+        if os.path.exists(directory):
+            raise ModelRegistryError(f"{difficulty} version {version} already exists")
+        os.makedirs(directory)
+
+        name = os.path.basename(artifact) if artifact is not None else CONFIG_ARTIFACT
+        target = os.path.join(directory, name)
+        if artifact is not None:
+            atomic_save(_CopySnapshot(artifact), target)
+        else:
+            atomic_save(_TextSnapshot(json.dumps(config or {}, sort_keys=True)), target)
+
+        manifest = {
+            "difficulty": difficulty,
+            "version": version,
+            "kind": kind,
+            "artifact": name,
+            "sha256": sha256_file(target),
+            "size": os.path.getsize(target),
+            "config": config or {},
+            "created": time.time(),
+        }
+        # Written last: a version without a manifest is not listed
+        atomic_save(_TextSnapshot(json.dumps(manifest, indent=2, sort_keys=True)), os.path.join(directory, MANIFEST))
+        if promote:
+            self.promote(difficulty, version)
+        return manifest
+
+    def promote(self, difficulty, version):
+        self.manifest(difficulty, version)  # must exist
+        atomic_save(_TextSnapshot(version + "\n"), self._path(difficulty, CURRENT))
+        logger.info(f"Promoted {difficulty} to {version}")
+
+    def load(self, difficulty, version=None):
+        """Builds the agent of a version after checking its artifact against the manifest checksum."""
+        version = version or self.current_version(difficulty)
+        if version is None:
+            raise ModelRegistryError(f"{difficulty} has no promoted version")
+        manifest = self.manifest(difficulty, version)
+        artifact = self._path(difficulty, version, manifest["artifact"])
+        checksum = sha256_file(artifact)
+        if checksum != manifest["sha256"]:
+            raise ModelRegistryError(f"{difficulty} {version}: checksum mismatch for {manifest['artifact']}")
+        config = manifest["config"]
+        if manifest["kind"] in CONFIG_KINDS and not config:
+            with open(artifact) as f:
+                config = json.load(f)
+        return build_agent(manifest["kind"], artifact, config), version
+
+    def loader(self, difficulty):
+        """Zero-argument loader for `AgentRegistry` that serves the promoted version."""
+        self.routed.add(difficulty)
+
+        def load():
+            agent, version = self.load(difficulty)
+            self.live[difficulty] = version
+            return agent
+        return load
+
+    async def poll(self, agent_registry):
+        """Swaps in the promoted version of every difficulty this process serves from the registry."""
+        for difficulty in self.difficulties():
+            version = self.current_version(difficulty)
+            live = self.live.get(difficulty)
+            if version is None or version == live or version == self.rejected.get(difficulty):
+                continue
+            if agent_registry.get_loaded(difficulty) is None:
+                # Not in use here yet; the first request loads whatever is promoted then
+                if difficulty not in self.routed:
+                    agent_registry.register(difficulty, loader=self.loader(difficulty))
+                continue
+            try:
+                agent, version = await asyncio.to_thread(self.load, difficulty, version)
+            except Exception:
+                logger.exception(f"Could not load {difficulty} {version}; still serving {live}")
+                self.rejected[difficulty] = version  # do not retry a broken version every poll
+                continue
+            # A reference swap: decisions in flight keep the old agent object
+            previous = agent_registry.get_loaded(difficulty)
+            agent_registry.register(difficulty, agent=agent, loader=self.loader(difficulty))
+            if hasattr(previous, "close"):
+                previous.close()  # e.g. an MCTS worker pool; searches in flight finish with their local tree
+            self.live[difficulty] = version
+            logger.info(f"Hot-swapped {difficulty}: {live} -> {version}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish and promote versioned AI models")
+    parser.add_argument("--root", default=os.getenv("MODEL_REGISTRY_DIR", "model_registry"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish = commands.add_parser("publish")
+    publish.add_argument("difficulty")
+    publish.add_argument("artifact", nargs="?")
+    publish.add_argument("--kind", choices=KINDS, required=True)
+    publish.add_argument("--version")
+    publish.add_argument("--config", type=json.loads, default=None, help="JSON object, e.g. MCTS or Bayesian settings")
+    publish.add_argument("--promote", action="store_true")
+    promote = commands.add_parser("promote")
+    promote.add_argument("difficulty")
+    promote.add_argument("version")
+    listing = commands.add_parser("list")
+    listing.add_argument("difficulty", nargs="?")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == "publish":
+        manifest = registry.publish(args.difficulty, args.kind, args.artifact, args.version, args.config, args.promote)
+        print(json.dumps(manifest, indent=2, sort_keys=True))
+    elif args.command == "promote":
+        registry.promote(args.difficulty, args.version)
+        print(f"{args.difficulty} -> {args.version}")
+    else:
+        for difficulty in [args.difficulty] if args.difficulty else registry.difficulties():
+            current = registry.current_version(difficulty)
+            for version in registry.versions(difficulty):
+                print(f"{difficulty} {version}{' (current)' if version == current else ''}")
@@ -0,0 +1,252 @@
+"""Whole policies compiled into action lookup tables.
+
+Every decision a served agent can face is enumerated once, the agent's
+action for it is recorded in a uint8 array and serving becomes one indexed
+read. On disk the array sits behind a fixed 64-byte header in a `.policy`
+file that `PolicyTable.load` maps read-only, like a `.qtable`.
+
+Two index layouts (views) cover the agents:
+
+- PUBLIC_VIEW: the `state_codec` key. Q-learning, SARSA and the DQN see only
+  dice counts, the bid, scores and the player to move, so their table is
+  indexed by `encode_state` directly (NUM_STATES entries).
+- PRIVATE_VIEW: the mover's dice count, the opponent's dice count, the bid and
+  the mover's own hand (as a sorted tuple). MCTS and the Bayesian agent decide
+  on their own dice and ignore scores. The Bayesian agent is compiled without
+  a session, so its table only uses the standing bid.
+
+The agent's exploration rate is stored with the table and applied when
+serving; the table itself holds the greedy action. Entries no enumerated
+state maps to hold UNSET and are answered with a random legal action.
+
+    python policy_table.py q_learning_agent.qtable q_learning_agent.policy --kind q_learning
+    python policy_table.py - mcts.policy --kind mcts --config '{"time_budget_ms": 20}' --workers 8
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations_with_replacement
+
+import numpy as np
+
+from action_masks import NUM_FACES, masked_argmax, state_action_mask
+from liars_dice_game_logic import GameState, LiarDiceGame, roll
+from state_codec import NUM_STATES, SCORE_UNIT, encode_state
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PLCY"
+VERSION = 1
+HEADER = struct.Struct("<4sIIQf")
+HEADER_SIZE = 64
+UNSET = 255
+
+PUBLIC_VIEW = 0
+PRIVATE_VIEW = 1
+
+MAX_DICE = 5
+MAX_QUANTITY = 10
+MAX_SCORE_UNITS = 2 * MAX_DICE - 1  # every challenge moves 100 points and a game has at most 9
+BID_SLOTS = MAX_QUANTITY * NUM_FACES + 1  # slot 0 is the (0, 0) bid after a challenge
+HANDS = {count: list(combinations_with_replacement(range(1, NUM_FACES + 1), count)) for count in range(1, MAX_DICE + 1)}
+HAND_INDEX = {hand: index for hands in HANDS.values() for index, hand in enumerate(hands)}
+MAX_HANDS = max(len(hands) for hands in HANDS.values())
+PRIVATE_STATES = MAX_DICE * MAX_DICE * BID_SLOTS * MAX_HANDS
+
+
+def bid_slot(bid):
+    quantity, face_value = bid
+    return 0 if face_value == 0 else (quantity - 1) * NUM_FACES + face_value
+
+
+def private_index(state):
+    """PRIVATE_VIEW index of a `GameState` for the player to move."""
+    player = state.current_player
+    hand = tuple(sorted(state.dice[player - 1]))
+    row = (len(hand) - 1) * MAX_DICE + state.dice_count[2 - player] - 1
+    return (row * BID_SLOTS + bid_slot(state.current_bid)) * MAX_HANDS + HAND_INDEX[hand]
+
+
+class PolicyTable:
+    """Serves a compiled policy through the batched interface (`batch_input`/`act_batch`)."""
+
+    def __init__(self, actions, view, epsilon=0.0, source=None):
+        self.actions = actions
+        self.view = view
+        self.epsilon = epsilon
+        self.source = source  # set when the actions map a .policy file
+
+    def __getstate__(self):
+        # A mapped table is sent to worker processes as its filename; they map the same pages
+        if self.source is not None:
+            return {"source": self.source}
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        if set(state) == {"source"}:
+            state = PolicyTable.load(state["source"]).__dict__
+        self.__dict__.update(state)
+
+    def batch_input(self, state):
+        return encode_state(state) if self.view == PUBLIC_VIEW else private_index(state)
+
+    def act(self, state, mask=None):
+        mask = state_action_mask(state) if mask is None else mask
+        return int(self.act_batch(np.array([self.batch_input(state)]), mask[None])[0])
+
+    def act_batch(self, indices, masks):
+        actions = self.actions[np.asarray(indices, dtype=np.intp)].astype(np.intp)
+        explore = (actions == UNSET) | (np.random.rand(len(actions)) < self.epsilon)
+        if explore.any():
+            # The argmax of uniform noise over the legal actions is a uniform legal action
+            actions[explore] = masked_argmax(np.random.rand(int(explore.sum()), masks.shape[-1]), masks[explore])
+        return actions
+
+    def coverage(self):
+        return float(np.count_nonzero(np.asarray(self.actions) != UNSET)) / len(self.actions)
+
+    def snapshot(self):
+        # A compiled table never changes while serving, so it can be written as it is
+        return self
+
+    def save(self, filename):
+        if filename == self.source:
+            return
+        actions = np.ascontiguousarray(self.actions, dtype=np.uint8)
+        with open(filename, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.view, len(actions), self.epsilon).ljust(HEADER_SIZE, b"\0"))
+            f.write(actions.tobytes())
+
+    @classmethod
+    def load(cls, filename, mmap=True):
+        with open(filename, "rb") as f:
+            magic, version, view, count, epsilon = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filename} is not a version {VERSION} policy file")
+        if mmap:
+            actions = np.memmap(filename, dtype=np.uint8, mode="r", offset=HEADER_SIZE, shape=(count,))
+            return cls(actions, view, epsilon, source=filename)
+        return cls(np.fromfile(filename, dtype=np.uint8, count=count, offset=HEADER_SIZE), view, epsilon)
+
+
+def _bids():
+    yield (0, 0)
+    for quantity in range(1, MAX_QUANTITY + 1):
+        for face_value in range(1, NUM_FACES + 1):
+            yield (quantity, face_value)
+
+
+def public_states():
+    """Every decision of the PUBLIC_VIEW: both dice counts, the bid, both scores and the player to move."""
+    for count_1 in range(1, MAX_DICE + 1):
+        for count_2 in range(1, MAX_DICE + 1):
+            dice = ((1,) * count_1, (1,) * count_2)  # the public view never looks at dice
+            for bid in _bids():
+                for score_1 in range(MAX_SCORE_UNITS + 1):
+                    for score_2 in range(MAX_SCORE_UNITS + 1):
+                        for player in (1, 2):
+                            yield GameState(dice, (count_1, count_2), bid, player, bid == (0, 0),
+                                            (score_1 * SCORE_UNIT, score_2 * SCORE_UNIT))
+
+
+def private_states():
+    """Every decision of the PRIVATE_VIEW, from player 2's seat: own hand, the opponent's dice count and the bid."""
+    for own_count in range(1, MAX_DICE + 1):
+        for opponent_count in range(1, MAX_DICE + 1):
+            for bid in _bids():
+                for hand in HANDS[own_count]:
+                    # The opponent's dice are hidden from the mover; any roll of the right size will do
+                    yield GameState((roll(opponent_count), hand), (opponent_count, own_count), bid, 2,
+                                    bid == (0, 0), (0, 0))
+
+
+def _select_actions(agent, snapshots):
+    game = LiarDiceGame()
+    actions = []
+    for snapshot in snapshots:
+        game.state = GameState(*snapshot)
+        actions.append(agent.select_action(None, game))
+    return actions
+
+
+def compile_public(agent, batch_size=8192):
+    """Greedy actions of a batched agent (`batch_input`/`act_batch`) for every PUBLIC_VIEW state.
+
+    The table serves with the agent's exploration, capped at its `epsilon_min`
+    so a tabular agent left at its training epsilon does not compile to random play.
+    """
+    actions = np.full(NUM_STATES, UNSET, dtype=np.uint8)
+    epsilon = getattr(agent, "epsilon", 0.0)
+    agent.epsilon = 0.0
+    try:
+        states = list(public_states())
+        for start in range(0, len(states), batch_size):
+            chunk = states[start:start + batch_size]
+            keys = np.array([encode_state(state) for state in chunk])
+            inputs = np.array([agent.batch_input(state) for state in chunk])
+            masks = np.stack([state_action_mask(state) for state in chunk])
+            actions[keys] = agent.act_batch(inputs, masks)
+    finally:
+        agent.epsilon = epsilon
+    return PolicyTable(actions, PUBLIC_VIEW, min(epsilon, getattr(agent, "epsilon_min", epsilon)))
+
+
+def compile_private(agent, workers=1, chunk_size=256):
+    """Actions of a search agent (`select_action`) for every PRIVATE_VIEW state, optionally over a process pool."""
+    actions = np.full(PRIVATE_STATES, UNSET, dtype=np.uint8)
+    states = list(private_states())
+    indices = np.array([private_index(state) for state in states])
+    chunks = [[state.snapshot() for state in states[start:start + chunk_size]]
+              for start in range(0, len(states), chunk_size)]
+    start, done = time.perf_counter(), 0
+    if workers > 1:
+        # spawn: workers only need the agent and this module
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        results = pool.map(_select_actions, [agent] * len(chunks), chunks)
+    else:
+        pool = None
+        results = (_select_actions(agent, chunk) for chunk in chunks)
+    try:
+        for chunk, result in zip(chunks, results):
+            actions[indices[done:done + len(chunk)]] = result
+            done += len(chunk)
+            logger.info(f"Compiled {done}/{len(states)} states in {time.perf_counter() - start:.0f}s")
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return PolicyTable(actions, PRIVATE_VIEW)
+
+
+def compile_policy(agent, workers=1):
+    if hasattr(agent, "act_batch"):
+        return compile_public(agent)
+    return compile_private(agent, workers)
+
+
+if __name__ == "__main__":
+    from model_registry import KINDS, build_agent
+
+    parser = argparse.ArgumentParser(description="Compile a trained or search agent into a .policy lookup table")
+    parser.add_argument("artifact", help="model file, or - for agents built from --config alone")
+    parser.add_argument("output")
+    parser.add_argument("--kind", choices=[kind for kind in KINDS if kind not in ("policy", "cfr")], required=True)
+    parser.add_argument("--config", type=json.loads, default={}, help="JSON object, e.g. MCTS settings")
+    parser.add_argument("--workers", type=int, default=1, help="processes for search agents")
+    parser.add_argument("--epsilon", type=float, default=None, help="exploration when serving; the agent's own by default")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    start = time.perf_counter()
+    agent = build_agent(args.kind, None if args.artifact == "-" else args.artifact, args.config)
+    table = compile_policy(agent, args.workers)
+    if args.epsilon is not None:
+        table.epsilon = args.epsilon
+    if hasattr(agent, "close"):
+        agent.close()
+    table.save(args.output)
+    print(f"Wrote {args.output}: {len(table.actions)} entries, {table.coverage():.1%} set, "
+          f"epsilon {table.epsilon:g}, {time.perf_counter() - start:.1f}s")
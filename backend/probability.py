@@ -0,0 +1,66 @@
+from math import comb
+
+import numpy as np
+
+MAX_TOTAL_DICE = 10  # two players with five dice each
+MAX_QUANTITY = 10
+NUM_FACES = 6
+
+
+def face_probability(face_value):
+    # 1s are wild for every other face, so a single die matches with 2/6
+    return 1 / 6 if face_value == 1 else 2 / 6
+
+
+def _build_bid_truth_table():
+    # table[n, k, q, f] = P(at least q dice show face f among n unknown dice | k own dice already match f)
+    table = np.ones((MAX_TOTAL_DICE + 1, MAX_TOTAL_DICE + 1, MAX_QUANTITY + 1, NUM_FACES + 1))
+    for face_value in range(1, NUM_FACES + 1):
+        p = face_probability(face_value)
+        for unknown in range(MAX_TOTAL_DICE + 1):
+            pmf = np.array([comb(unknown, k) * p ** k * (1 - p) ** (unknown - k) for k in range(unknown + 1)])
+            # tail[m] = P(X >= m); anything needing more than `unknown` matches is impossible
+            tail = np.zeros(MAX_QUANTITY + 1)
+            tail[:unknown + 1] = np.minimum(pmf[::-1].cumsum()[::-1], 1.0)
+            for own in range(MAX_TOTAL_DICE + 1):
+                needed = np.maximum(np.arange(MAX_QUANTITY + 1) - own, 0)
+                table[unknown, own, :, face_value] = tail[needed]
+    table.setflags(write=False)
+    return table
+
+
+# Face 0 only occurs in the (0, 0) bid left after a challenge, which is always true
+BID_TRUTH = _build_bid_truth_table()
+
+
+def matching_dice(dice, face_value):
+    if face_value == 1:
+        return dice.count(1)
+    return dice.count(face_value) + dice.count(1)
+
+
+def matching_counts(dice):
+    """`own_matching` of every face 1..6 at once, indexed by face (index 0 unused).
+
+    1s are wild except on bids of 1s.
+    """
+    counts = np.bincount(np.asarray(dice, dtype=np.intp), minlength=NUM_FACES + 1)
+    matching = counts + counts[1]
+    matching[1] = counts[1]
+    return np.minimum(matching, MAX_TOTAL_DICE)
+
+
+def bid_probability(unknown_dice, own_matching, quantity, face_value):
+    """P(the bid `quantity` x `face_value` is true) given the caller's own matching dice.
+
+    Works on scalars or NumPy arrays of indices alike.
+    """
+    return BID_TRUTH[unknown_dice, np.minimum(own_matching, MAX_TOTAL_DICE), quantity, face_value]
+
+
+def state_bid_probability(state, player):
+    """Probability that the standing bid in a `GameState` is true, seen by `player`."""
+    quantity, face_value = state.current_bid
+    own_dice = state.dice[player - 1]
+    unknown_dice = state.dice_count[2 - player]
+    return float(BID_TRUTH[unknown_dice, matching_dice(own_dice, face_value), quantity, face_value])
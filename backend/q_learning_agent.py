@@ -1,14 +1,14 @@
 import logging
 import numpy as np
-from collections import defaultdict
-import random
-import pickle
+from state_codec import encode_state
+from q_table_store import QTableStore, load_q_table
+from action_masks import epsilon_greedy_batch, masked_argmax, random_valid_action, state_action_mask
 
 class QLearningAgent:
     def __init__(self, state_size, action_size, alpha=0.1, gamma=0.99, epsilon=1.0, epsilon_decay=0.995, epsilon_min=0.01):
         self.state_size = state_size
         self.action_size = action_size
-        self.q_table = defaultdict(lambda: np.zeros(action_size))
+        self.q_table = QTableStore(action_size)
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
@@ -16,67 +16,73 @@ class QLearningAgent:
         self.epsilon_min = epsilon_min
 
     def get_action(self, state):
-        state_key = self.get_state_key(state)
-        valid_actions = self.get_valid_actions(state)
+        mask = state_action_mask(state)
 
         if np.random.rand() <= self.epsilon:
-            action = random.choice(valid_actions)
+            action = random_valid_action(mask)
         else:
-            q_values = self.q_table[state_key]
-            action = np.argmax([q_values[a] if a in valid_actions else -np.inf for a in range(self.action_size)])
+            action = int(masked_argmax(self.q_table[self.get_state_key(state)], mask))
 
         logging.debug(f"QLearningAgent selected action: {action}")
         return action
 
+    def batch_input(self, state):
+        return self.get_state_key(state)
+
+    def act_batch(self, state_keys, masks):
+        """`get_action` for many states at once: one gather from the Q-table store."""
+        return epsilon_greedy_batch(self.q_table.gather(state_keys), masks, self.epsilon)
+
     def get_valid_random_action(self, state):
-        valid_actions = self.get_valid_actions(state)
-        logging.debug(f"Valid actions for random selection: {valid_actions}")
-        if valid_actions:
-            return random.choice(valid_actions)
-        return random.choice(range(self.action_size))
+        return random_valid_action(state_action_mask(state))
 
     def get_valid_actions(self, state):
-        current_quantity, current_face_value = state["current_bid"]
-        valid_actions = []
-        for action in range(self.action_size):
-            action_type = action // 66
-            quantity = (action % 66) // 6 + 1
-            face_value = action % 6 + 1
-            if action_type == 0 and (quantity > current_quantity or (quantity == current_quantity and face_value > current_face_value)):
-                valid_actions.append(action)
-            elif action_type == 1 and not state["last_action_was_challenge"]:
-                valid_actions.append(action)
-        logging.debug(f"Valid actions: {valid_actions}")
-        return valid_actions
-
-    def update_q_table(self, state, action, reward, next_state):
+        return np.flatnonzero(state_action_mask(state)).tolist()
+
+    def update_q_table(self, state, action, reward, next_state, done=False):
+        """One Q-learning step. Self-play: next_state is the opponent's decision, so its value is subtracted (negamax)."""
         state_key = self.get_state_key(state)
         next_state_key = self.get_state_key(next_state)
-        best_next_action = np.argmax(self.q_table[next_state_key])
-        td_target = reward + self.gamma * self.q_table[next_state_key][best_next_action]
-        td_error = td_target - self.q_table[state_key][action]
-        self.q_table[state_key][action] += self.alpha * td_error
+        next_value = 0.0 if done else self.q_table[next_state_key][state_action_mask(next_state)].max()
+        td_target = reward - self.gamma * next_value
+        q_values = self.q_table.row(state_key)
+        td_error = td_target - q_values[action]
+        q_values[action] += self.alpha * td_error
+
+    def update_batch(self, state_keys, actions, rewards, next_state_keys, next_masks=None, dones=None):
+        """`update_q_table` over arrays of encoded transitions, applied in order.
+
+        With `next_masks` the bootstrapped max only covers actions legal in the next state; `dones`
+        marks transitions that ended the game and are not bootstrapped.
+        """
+        next_masks = [None] * len(actions) if next_masks is None else next_masks
+        dones = [False] * len(actions) if dones is None else dones.tolist()
+        for state_key, action, reward, next_state_key, next_mask, done in zip(
+                state_keys.tolist(), actions.tolist(), rewards.tolist(), next_state_keys.tolist(), next_masks, dones):
+            next_q = self.q_table[next_state_key]
+            if next_mask is not None:
+                next_q = next_q[next_mask]
+            next_value = 0.0 if done or not len(next_q) else next_q.max()
+            # The next state is the opponent's decision: their value is the mover's loss (negamax)
+            td_target = reward - self.gamma * next_value
+            q_values = self.q_table.row(state_key)
+            q_values[action] += self.alpha * (td_target - q_values[action])
 
     def remember(self, state, action, reward, next_state, done):
-        state_key = self.get_state_key(state)
-        next_state_key = self.get_state_key(next_state)
-        best_next_action = np.argmax(self.q_table[next_state_key])
-        td_target = reward + self.gamma * self.q_table[next_state_key][best_next_action]
-        td_error = td_target - self.q_table[state_key][action]
-        self.q_table[state_key][action] += self.alpha * td_error
+        self.update_q_table(state, action, reward, next_state, done)
 
     def get_state_key(self, state):
-        return tuple(list(state["dice_count"]) + list(state["current_bid"]) + list(state["scores"]) + [state["current_player"]])
+        return encode_state(state)
 
     def decay_epsilon(self):
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
 
     def save(self, filename):
-        with open(filename, 'wb') as f:
-            pickle.dump(dict(self.q_table), f)
+        self.q_table.save(filename)
+
+    def snapshot(self):
+        return self.q_table.snapshot()
 
     def load(self, filename):
-        with open(filename, 'rb') as f:
-            q_table_dict = pickle.load(f)
-            self.q_table = defaultdict(lambda: np.zeros(self.action_size), q_table_dict)
+        self.q_table = load_q_table(filename, self.action_size)
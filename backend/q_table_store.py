@@ -0,0 +1,186 @@
+"""Array-backed Q-table store.
+
+A table is a sorted int64 array of `state_codec` keys plus one contiguous
+(num_states, action_size) float32 array of Q-values. On disk both live in one
+`.qtable` file behind a fixed 64-byte header, so `QTableStore.load` can map the
+file read-only and every worker process shares the same pages.
+
+Reads never allocate: a seen state returns a view of its row and an unseen
+state returns a shared all-zero row. Training writes go through `row()`, which
+switches the table to an in-memory copy that can grow.
+"""
+import argparse
+import pickle
+import struct
+
+import numpy as np
+
+from state_codec import rekey_legacy_table
+
+MAGIC = b"QTBL"
+VERSION = 1
+HEADER = struct.Struct("<4sIQI")
+HEADER_SIZE = 64
+
+
+class QTableStore:
+    def __init__(self, action_size, keys=None, values=None):
+        self.action_size = action_size
+        if keys is None:
+            keys = np.empty(0, dtype=np.int64)
+            values = np.empty((0, action_size), dtype=np.float32)
+        self.keys = keys
+        self.values = values
+        self.zeros = np.zeros(action_size, dtype=np.float32)
+        self.zeros.setflags(write=False)
+        self._index = None  # key -> row, only while the table is writable
+        self._size = len(keys)
+        self.source = None  # set when the arrays map a .qtable file
+
+    def __getstate__(self):
+        # A mapped table is sent to worker processes as its filename; they map the same pages
+        if self.source is not None and self._index is None:
+            return {"source": self.source}
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        if set(state) == {"source"}:
+            state = QTableStore.load(state["source"]).__dict__
+        self.__dict__.update(state)
+
+    @classmethod
+    def from_dict(cls, q_table, action_size):
+        q_table = rekey_legacy_table(q_table)
+        keys = np.array(sorted(q_table), dtype=np.int64)
+        values = np.zeros((len(keys), action_size), dtype=np.float32)
+        for row, key in enumerate(keys.tolist()):
+            row_values = np.asarray(q_table[key], dtype=np.float32)
+            values[row, :len(row_values)] = row_values[:action_size]
+        return cls(action_size, keys, values)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def _find(self, key):
+        if self._index is not None:
+            return self._index.get(key, -1)
+        row = int(np.searchsorted(self.keys, key))
+        if row < self._size and self.keys[row] == key:
+            return row
+        return -1
+
+    def __getitem__(self, key):
+        row = self._find(key)
+        if row < 0:
+            return self.zeros
+        return self.values[row]
+
+    def gather(self, keys):
+        """Q-value rows for an array of keys, zeros for unseen states; one (N, action_size) array."""
+        keys = np.asarray(keys, dtype=np.int64)
+        if self._index is not None:
+            rows = np.array([self._index.get(key, -1) for key in keys.tolist()], dtype=np.intp)
+        else:
+            rows = np.searchsorted(self.keys, keys)
+            found = rows < self._size
+            found[found] = self.keys[rows[found]] == keys[found]
+            rows[~found] = -1
+        out = np.zeros((len(keys), self.action_size), dtype=np.float32)
+        seen = rows >= 0
+        out[seen] = self.values[rows[seen]]
+        return out
+
+    def _make_writable(self):
+        # Copy out of a read-only mapping and index by dict so inserts stay O(1)
+        self.keys = np.array(self.keys[:self._size], dtype=np.int64)
+        self.values = np.array(self.values[:self._size], dtype=np.float32)
+        self._index = {key: row for row, key in enumerate(self.keys.tolist())}
+
+    def row(self, key):
+        """Writable Q-value row for `key`, inserted as zeros if the state is new."""
+        if self._index is None:
+            self._make_writable()
+        row = self._index.get(key)
+        if row is None:
+            row = self._size
+            if row == len(self.keys):
+                capacity = max(2 * row, 64)
+                self.keys = np.resize(self.keys, capacity)
+                values = np.zeros((capacity, self.action_size), dtype=np.float32)
+                values[:row] = self.values[:row]
+                self.values = values
+            self.keys[row] = key
+            self._index[key] = row
+            self._size += 1
+        return self.values[row]
+
+    def snapshot(self):
+        """A copy that later training writes do not touch; a read-only table is its own snapshot."""
+        if self._index is None:
+            return self
+        return QTableStore(self.action_size, self.keys[:self._size].copy(), self.values[:self._size].copy())
+
+    def items(self):
+        for row, key in enumerate(self.keys[:self._size].tolist()):
+            yield key, self.values[row]
+
+    def to_dict(self):
+        return {key: np.array(values) for key, values in self.items()}
+
+    def save(self, filename):
+        order = np.argsort(self.keys[:self._size], kind="stable")
+        keys = np.ascontiguousarray(self.keys[:self._size][order], dtype=np.int64)
+        values = np.ascontiguousarray(self.values[:self._size][order], dtype=np.float32)
+        with open(filename, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(keys), self.action_size).ljust(HEADER_SIZE, b"\0"))
+            f.write(keys.tobytes())
+            f.write(values.tobytes())
+
+    @classmethod
+    def load(cls, filename, mmap=True):
+        with open(filename, "rb") as f:
+            magic, version, count, action_size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filename} is not a version {VERSION} Q-table file")
+
+        if mmap and count:
+            keys = np.memmap(filename, dtype=np.int64, mode="r", offset=HEADER_SIZE, shape=(count,))
+            values = np.memmap(filename, dtype=np.float32, mode="r", offset=HEADER_SIZE + 8 * count,
+                               shape=(count, action_size))
+        else:
+            keys = np.fromfile(filename, dtype=np.int64, count=count, offset=HEADER_SIZE)
+            values = np.fromfile(filename, dtype=np.float32, count=count * action_size,
+                                 offset=HEADER_SIZE + 8 * count).reshape(count, action_size)
+        store = cls(action_size, keys, values)
+        if mmap and count:
+            store.source = filename
+        return store
+
+
+def load_q_table(filename, action_size, mmap=True):
+    """Loads a `.qtable` file, or converts a legacy pickled dict Q-table in memory."""
+    if filename.endswith(".qtable"):
+        return QTableStore.load(filename, mmap=mmap)
+    with open(filename, "rb") as f:
+        return QTableStore.from_dict(pickle.load(f), action_size)
+
+
+def convert_pickle(pickle_filename, qtable_filename, action_size=132):
+    """Migrates a pickled `{state: q_values}` dict (e.g. sarsa_agent.pkl) to a `.qtable` file."""
+    with open(pickle_filename, "rb") as f:
+        store = QTableStore.from_dict(pickle.load(f), action_size)
+    store.save(qtable_filename)
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert pickled Q-tables to memory-mappable .qtable files")
+    parser.add_argument("pickle_filename")
+    parser.add_argument("qtable_filename")
+    parser.add_argument("--action-size", type=int, default=132)
+    args = parser.parse_args()
+    store = convert_pickle(args.pickle_filename, args.qtable_filename, args.action_size)
+    print(f"Wrote {len(store)} states to {args.qtable_filename}")
@@ -0,0 +1,133 @@
+"""Preallocated ring-buffer experience replay for DQN training.
+
+`ReplayBuffer` stores transitions in fixed NumPy arrays (states, actions,
+rewards, next states, done flags and the legal-action mask of the next state),
+overwriting the oldest once full, and samples whole minibatches as arrays.
+`PrioritizedReplayBuffer` samples proportionally to priority ** alpha using a
+sum tree and returns importance-sampling weights (Schaul et al., 2016).
+"""
+import numpy as np
+
+from action_masks import ACTION_SIZE
+
+
+class ReplayBuffer:
+    def __init__(self, capacity, state_size, action_size=ACTION_SIZE, seed=None):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, state_size), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_size), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+        self.next_masks = np.ones((capacity, action_size), dtype=bool)
+        self.position = 0
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done, next_mask=None):
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.next_masks[i] = True if next_mask is None else next_mask
+        self._added(np.array([i]))
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def add_batch(self, states, actions, rewards, next_states, dones, next_masks=None):
+        """Adds N transitions at once (e.g. one step of N self-play games)."""
+        n = len(actions)
+        if n > self.capacity:  # only the newest `capacity` transitions would survive
+            states, actions, rewards, next_states, dones = (a[-self.capacity:] for a in (states, actions, rewards, next_states, dones))
+            next_masks = next_masks[-self.capacity:] if next_masks is not None else None
+            n = self.capacity
+        idx = (self.position + np.arange(n)) % self.capacity
+        self.states[idx] = states
+        self.actions[idx] = actions
+        self.rewards[idx] = rewards
+        self.next_states[idx] = next_states
+        self.dones[idx] = dones
+        self.next_masks[idx] = True if next_masks is None else next_masks
+        self._added(idx)
+        self.position = int((self.position + n) % self.capacity)
+        self.size = min(self.size + n, self.capacity)
+
+    def _added(self, idx):
+        pass
+
+    def _batch(self, idx):
+        return (self.states[idx], self.actions[idx], self.rewards[idx],
+                self.next_states[idx], self.dones[idx], self.next_masks[idx])
+
+    def sample(self, batch_size):
+        """(indices, (states, actions, rewards, next_states, dones, next_masks), weights)."""
+        idx = self.rng.integers(0, self.size, size=batch_size)
+        return idx, self._batch(idx), np.ones(batch_size, dtype=np.float32)
+
+    def update_priorities(self, idx, td_errors):
+        pass
+
+    def transitions(self):
+        """The stored transitions, oldest first, as copies."""
+        order = (self.position - self.size + np.arange(self.size)) % self.capacity
+        return {name: getattr(self, name)[order].copy()
+                for name in ("states", "actions", "rewards", "next_states", "dones", "next_masks")}
+
+    def load_transitions(self, transitions):
+        self.add_batch(transitions["states"], transitions["actions"], transitions["rewards"],
+                       transitions["next_states"], transitions["dones"], transitions.get("next_masks"))
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    def __init__(self, capacity, state_size, action_size=ACTION_SIZE, alpha=0.6, beta=0.4, beta_increment=1e-4,
+                 epsilon=1e-5, seed=None):
+        super().__init__(capacity, state_size, action_size, seed)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.tree_capacity = 1 << max(0, int(capacity - 1).bit_length())
+        self.tree = np.zeros(2 * self.tree_capacity, dtype=np.float64)  # node i has children 2i and 2i+1
+        self.max_priority = 1.0
+
+    def _set(self, idx, priorities):
+        # Leaves are written together; each level's parents are then recomputed once
+        nodes = np.asarray(idx) + self.tree_capacity
+        self.tree[nodes] = priorities
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    def _added(self, idx):
+        self._set(idx, self.max_priority ** self.alpha)
+
+    def sample(self, batch_size):
+        total = self.tree[1]
+        # One stratified draw per segment, then every descent runs level by level in lockstep
+        targets = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+        nodes = np.ones(batch_size, dtype=np.int64)
+        while nodes[0] < self.tree_capacity:
+            left = 2 * nodes
+            go_right = targets >= self.tree[left]
+            targets = np.where(go_right, targets - self.tree[left], targets)
+            nodes = left + go_right
+        idx = np.minimum(nodes - self.tree_capacity, self.size - 1)
+
+        probabilities = self.tree[idx + self.tree_capacity] / total
+        weights = (self.size * probabilities) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return idx, self._batch(idx), weights.astype(np.float32)
+
+    def update_priorities(self, idx, td_errors):
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self._set(idx, priorities ** self.alpha)
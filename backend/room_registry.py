@@ -0,0 +1,193 @@
+import sys
+import time
+from collections import OrderedDict
+from itertools import islice
+
+AI_SID_PREFIX = "ai_"
+
+
+class RoomLimitReached(Exception):
+    pass
+
+
+def ai_sid_for(room):
+    return f"{AI_SID_PREFIX}{room}"
+
+
+def is_ai_sid(sid):
+    return sid.startswith(AI_SID_PREFIX)
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate bytes held by `obj` and everything it references (dicts, sequences, slots)."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    else:
+        if hasattr(obj, "__dict__"):
+            size += deep_sizeof(obj.__dict__, seen)
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                size += deep_sizeof(getattr(obj, slot), seen)
+    return size
+
+
+class RoomRegistry:
+    """Rooms, their members and their games, indexed both ways.
+
+    Every lookup a socket handler does (`room_of`, `game_of`, `members`) is a
+    dict access, so handler cost does not depend on how many games are running.
+    A room exists from `create` until `destroy` (or until its last human member
+    leaves); the `ai_<room>` pseudo-sid counts as a member but never keeps a room
+    alive on its own.
+
+    Memory stays bounded: at most `max_live_games` unfinished games are accepted,
+    finished games are kept for their players in LRU order up to
+    `max_finished_games`, and `reap` expires rooms idle for `idle_timeout` seconds.
+    """
+
+    def __init__(self, idle_timeout=1800.0, max_live_games=10000, max_finished_games=1000, clock=time.monotonic):
+        self.idle_timeout = idle_timeout
+        self.max_live_games = max_live_games
+        self.max_finished_games = max_finished_games
+        self.clock = clock
+        self.sid_to_room = {}
+        self.room_members = {}
+        self.room_games = {}
+        self.last_active = OrderedDict()  # room -> last activity, least recently active first
+        self.finished = OrderedDict()  # finished rooms, least recently active first
+        self.evicted = 0
+        self.expired = 0
+        self.refused = 0
+
+    def __len__(self):
+        return len(self.room_games)
+
+    def __contains__(self, room):
+        return room in self.room_games
+
+    @property
+    def live_games(self):
+        return len(self.room_games) - len(self.finished)
+
+    def create(self, room, sid, game):
+        if room in self.room_games:
+            raise ValueError(f"Room {room} already exists")
+        if self.live_games >= self.max_live_games:
+            self.refused += 1
+            raise RoomLimitReached(f"{self.live_games} live games")
+        self.leave(sid)  # a sid belongs to at most one room
+        self.room_games[room] = game
+        self.room_members[room] = {sid}
+        self.sid_to_room[sid] = room
+        self.last_active[room] = self.clock()
+
+    def join(self, room, sid):
+        """Adds `sid` to an existing room; returns False if the room is gone."""
+        members = self.room_members.get(room)
+        if members is None:
+            return False
+        members.add(sid)
+        self.sid_to_room[sid] = room
+        return True
+
+    def leave(self, sid):
+        """Removes `sid` from its room and destroys the room once no human is left.
+
+        Returns `(room, destroyed)`, with `room` None if the sid was not in one.
+        """
+        room = self.sid_to_room.pop(sid, None)
+        if room is None:
+            return None, False
+        members = self.room_members[room]
+        members.discard(sid)
+        if all(is_ai_sid(member) for member in members):
+            self.destroy(room)
+            return room, True
+        return room, False
+
+    def destroy(self, room):
+        """Drops the room and its game; returns the sids that were still in it."""
+        members = self.room_members.pop(room, set())
+        for sid in members:
+            self.sid_to_room.pop(sid, None)
+        self.room_games.pop(room, None)
+        self.last_active.pop(room, None)
+        self.finished.pop(room, None)
+        return members
+
+    def touch(self, room):
+        if room in self.last_active:
+            self.last_active[room] = self.clock()
+            self.last_active.move_to_end(room)
+            if room in self.finished:
+                self.finished.move_to_end(room)
+
+    def mark_finished(self, room):
+        """Moves a room to the finished LRU; returns `{room: members}` of rooms evicted to make space."""
+        if room not in self.room_games:
+            return {}
+        self.finished[room] = True
+        self.finished.move_to_end(room)
+        evicted = {}
+        while len(self.finished) > self.max_finished_games:
+            oldest = next(iter(self.finished))
+            evicted[oldest] = self.destroy(oldest)
+            self.evicted += 1
+        return evicted
+
+    def reap(self):
+        """Destroys rooms idle for longer than `idle_timeout`; returns `{room: members}`."""
+        deadline = self.clock() - self.idle_timeout
+        expired = {}
+        while self.last_active:
+            room, last_active = next(iter(self.last_active.items()))
+            if last_active > deadline:
+                break
+            expired[room] = self.destroy(room)
+            self.expired += 1
+        return expired
+
+    def room_of(self, sid):
+        return self.sid_to_room.get(sid)
+
+    def game_of(self, sid):
+        room = self.sid_to_room.get(sid)
+        if room is None:
+            return None, None
+        return room, self.room_games[room]
+
+    def get_game(self, room):
+        return self.room_games.get(room)
+
+    def members(self, room):
+        return self.room_members.get(room, set())
+
+    def rooms(self):
+        return self.room_games.items()
+
+    def room_memory(self, room):
+        return deep_sizeof(self.room_games.get(room)) + deep_sizeof(self.room_members.get(room))
+
+    def stats(self, sample_size=100):
+        # Per-room memory is estimated from the most recently active rooms
+        sample = list(islice(reversed(self.last_active), sample_size))
+        room_bytes = sum(self.room_memory(room) for room in sample) / len(sample) if sample else 0.0
+        return {
+            "rooms": len(self.room_games),
+            "live_games": self.live_games,
+            "finished_games": len(self.finished),
+            "sids": len(self.sid_to_room),
+            "room_bytes": round(room_bytes),
+            "estimated_bytes": round(room_bytes * len(self.room_games)),
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "refused": self.refused,
+        }
@@ -1,57 +1,159 @@
 import random
 import socketio
-import uuid
 import logging
 import asyncio
-from q_learning_agent import QLearningAgent
-from mcts_agent import MCTSAgent
-from sarsa_agent import SARSAAgent
-from dqn_agent import DQNAgent
-from load_agents import load_agents
+import weakref
+import functools
+from load_agents import load_easy_agent, load_medium_agent, load_hard_agent, load_expert_agent
+from bayesian_agent import BayesianAgent
+from agent_registry import AgentRegistry
+from model_registry import ModelRegistry
 from liars_dice_game_logic import LiarDiceGame
+from probability import bid_probability, matching_dice
+from inference_scheduler import InferenceScheduler
+from ai_executor import AIExecutor, AIExecutorSaturated, parse_limits
+from action_masks import decode_action, state_action_mask
+from room_registry import RoomLimitReached, RoomRegistry, ai_sid_for, is_ai_sid
+from cluster import create_client_manager, generate_room_name as sharded_room_name
+from game_store import create_game_store
+from game_protocol import GameUpdates, packet_json
+from checkpoint import CheckpointWriter
 import sys
 import os
-import math
 
 game_counter = 0
 SAVE_INTERVAL = 10 
+checkpoint_writer = CheckpointWriter()
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-# Load the agents
-easy_agent, medium_agent, hard_agent = load_agents(
-    easy_filename="q_learning_agent.pkl",
-    medium_filename="dqn_agent.pkl",
-    hard_filename="sarsa_agent.pkl",
-)
-
-# Initialize the models dictionary
-models = {
-    "tutorial": None,
-    "easy": easy_agent,
-    "medium": medium_agent,
-    "hard": hard_agent,
+# Agents are loaded on first use (or by warm_up), so importing this module loads no model
+MODEL_FILES = {
+    "easy": "q_learning_agent.qtable",
+    "medium": "dqn_agent.npz",
+    "hard": "sarsa_agent.qtable",
+    "expert": "cfr_strategy.npz",  # written by cfr_solver.py
 }
+agent_registry = AgentRegistry({
+    "easy": functools.partial(load_easy_agent, MODEL_FILES["easy"]),
+    "medium": functools.partial(load_medium_agent, MODEL_FILES["medium"]),
+    "hard": functools.partial(load_hard_agent, MODEL_FILES["hard"]),
+    "expert": functools.partial(load_expert_agent, MODEL_FILES["expert"]),
+    "bayesian": BayesianAgent,  # no model file: the posterior is computed per room
+})
+# With MODEL_REGISTRY_DIR set, difficulties with a promoted version are served from the versioned
+# model registry instead, and promotions are picked up every MODEL_POLL_INTERVAL seconds
+model_registry = ModelRegistry(os.getenv("MODEL_REGISTRY_DIR")) if os.getenv("MODEL_REGISTRY_DIR") else None
+MODEL_POLL_INTERVAL = float(os.getenv("MODEL_POLL_INTERVAL", "10"))
+if model_registry is not None:
+    for difficulty in model_registry.difficulties():
+        agent_registry.register(difficulty, loader=model_registry.loader(difficulty))
+model_poll_task = None
+# Difficulties loaded at startup and required by the readiness check, e.g. "easy,medium,hard"
+AI_WARMUP = [difficulty for difficulty in os.getenv("AI_WARMUP", "").split(",") if difficulty]
 
 # Initialize logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-socketio_server = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins=[])
+# With several workers, SOCKETIO_MESSAGE_QUEUE (redis:// or amqp://) carries emits between them,
+# each worker runs with its own WORKER_SHARD of NUM_SHARDS, and GAME_STORE_URL (redis://, or
+# local:// in tests) holds the games that reconnecting clients resume. All unset: one process
+WORKER_SHARD = int(os.getenv("WORKER_SHARD", "0"))
+NUM_SHARDS = int(os.getenv("NUM_SHARDS", "1"))
+
+socketio_server = socketio.AsyncServer(
+    async_mode="asgi",
+    cors_allowed_origins=[],
+    json=packet_json(),
+    client_manager=create_client_manager(os.getenv("SOCKETIO_MESSAGE_QUEUE", "")),
+)
 
 socketio_app = socketio.ASGIApp(socketio_server=socketio_server, socketio_path="/")
 
-rooms = {}  # Dictionary to keep track of rooms and their connections
-games = {}  # Dictionary to keep track of games and their states
+# Pending AI decisions are collected across rooms for this many milliseconds and run as one batch
+AI_BATCH_WINDOW_MS = float(os.getenv("AI_BATCH_WINDOW_MS", "5"))
+AI_MAX_BATCH_SIZE = int(os.getenv("AI_MAX_BATCH_SIZE", "256"))
+
+# AI decisions run in this pool, never on the event loop. AI_EXECUTOR is "thread" or "process";
+# AI_CONCURRENCY_LIMITS caps running jobs (searches or batches) per difficulty, e.g. "easy=8,hard=2"
+ai_executor = AIExecutor(
+    kind=os.getenv("AI_EXECUTOR", "thread"),
+    max_workers=int(os.getenv("AI_EXECUTOR_WORKERS", "0")) or None,
+    limits=parse_limits(os.getenv("AI_CONCURRENCY_LIMITS", "")),
+    default_limit=int(os.getenv("AI_DEFAULT_CONCURRENCY", "8")),
+    max_waiting=int(os.getenv("AI_MAX_WAITING", "64")),
+)
+if ai_executor.kind == "process":
+    logger.info("AI_EXECUTOR=process: batched agents run in worker processes, per-room agents (MCTS, Bayesian) on threads")
+inference_scheduler = InferenceScheduler(window=AI_BATCH_WINDOW_MS / 1000, max_batch_size=AI_MAX_BATCH_SIZE, executor=ai_executor)
+
+# Rooms, their connected sids (including the ai_ pseudo-sid) and their games. Rooms idle for
+# ROOM_IDLE_TIMEOUT seconds are reaped every ROOM_REAP_INTERVAL seconds, new games are refused past
+# MAX_LIVE_GAMES, and only the MAX_FINISHED_GAMES most recently active finished games are kept
+room_registry = RoomRegistry(
+    idle_timeout=float(os.getenv("ROOM_IDLE_TIMEOUT", "1800")),
+    max_live_games=int(os.getenv("MAX_LIVE_GAMES", "10000")),
+    max_finished_games=int(os.getenv("MAX_FINISHED_GAMES", "1000")),
+)
+ROOM_REAP_INTERVAL = float(os.getenv("ROOM_REAP_INTERVAL", "60"))
+room_reaper_task = None
+
+game_store = create_game_store(os.getenv("GAME_STORE_URL", ""), ttl=room_registry.idle_timeout)
+
+# What each game's client has been sent, dropped together with the game
+game_updates = weakref.WeakKeyDictionary()
 
 
 def generate_room_name(difficulty):
-    return f"{difficulty}_{uuid.uuid4()}"
+    # Only names that hash to this worker, so a proxy routing by room name finds the game here
+    return sharded_room_name(difficulty, WORKER_SHARD, NUM_SHARDS)
+
+
+async def save_game(room, game):
+    if game_store is not None:
+        await game_store.save(room, game)
+
+
+def release_agent_state(room):
+    # Search and Bayesian agents keep a tree or a belief per room between moves
+    agent = agent_registry.get_loaded(room.split('_')[0])
+    if hasattr(agent, "release"):
+        agent.release(room)
+
+
+async def delete_game(room):
+    if game_store is not None:
+        await game_store.delete(room)
+    release_agent_state(room)
+
+
+async def emit_game_update(room, game, snapshot=False):
+    # A snapshot or a delta depending on the protocol the client asked for on connect
+    updates = game_updates.get(game)
+    if updates is None:
+        updates = game_updates[game] = GameUpdates()
+    message = updates.snapshot(game) if snapshot else updates.update(game)
+    if message is not None:
+        event, payload = message
+        await socketio_server.emit(event, payload, room=room)
+
+
+async def resume_game(sid, room):
+    """Rejoins a room after a reconnect; returns False if the game is not live here or in the store."""
+    if room_registry.join(room, sid):
+        return True
+    game = await game_store.load(room) if game_store is not None else None
+    if game is None:
+        return False
+    room_registry.create(room, sid, game)
+    return True
 
 
 @socketio_server.event
 async def connect(sid, environ):
     query_params = environ.get("QUERY_STRING", "")
+    params = {}
     if query_params:
         params = dict(qc.split("=") for qc in query_params.split("&"))
         difficulty = params.get("room", "default_room")
@@ -59,16 +161,26 @@ async def connect(sid, environ):
     else:
         room = generate_room_name("default_room")
 
-    rooms[room] = {sid}
-    games[room] = LiarDiceGame()
+    ensure_background_tasks()
+    try:
+        # Clients send the room they were in as "resume" when they reconnect
+        resume = params.get("resume")
+        if resume and resume.startswith(f"{params.get('room', 'default_room')}_") and await resume_game(sid, resume):
+            room = resume
+        else:
+            room_registry.create(room, sid, LiarDiceGame())
+    except RoomLimitReached:
+        logger.warning(f"{sid}: refused, live game limit of {room_registry.max_live_games} reached")
+        raise socketio.exceptions.ConnectionRefusedError("Server is full, please try again later")
 
     await socketio_server.enter_room(sid, room)
     logger.info(f"{sid}: connected to {room}")
-    await socketio_server.emit("join", {"sid": sid}, room=room)
+    await socketio_server.emit("join", {"sid": sid, "room": room}, room=room)
 
     # Emit the initial game state to the user
-    game_state = games[room].get_game_state()
-    await socketio_server.emit("game_update", game_state, room=room)
+    game = room_registry.get_game(room)
+    game_updates[game] = GameUpdates(params.get("proto", "full"))
+    await emit_game_update(room, game, snapshot=True)
 
     # Simulate AI connection
     asyncio.create_task(simulate_ai_connection(room))
@@ -76,38 +188,38 @@ async def connect(sid, environ):
 
 @socketio_server.event
 async def player_names(sid, data):
-    room = None
-    for r, sids in rooms.items():
-        if sid in sids:
-            room = r
-            break
+    room, game = room_registry.game_of(sid)
 
     if room:
+        room_registry.touch(room)
         user_name = data["userName"]
         ai_name = data["aiName"]
-        games[room].set_player_names(user_name, ai_name)
+        game.set_player_names(user_name, ai_name)
+        await save_game(room, game)
         logger.info(f"Player names received in {room}: {user_name}, {ai_name}")
         # Update game state with player names
-        game_state = games[room].get_game_state()
-        await socketio_server.emit("game_update", game_state, room=room)
+        await emit_game_update(room, game, snapshot=True)
+
+
+@socketio_server.event
+async def resync(sid):
+    room, game = room_registry.game_of(sid)
+    if room:
+        await emit_game_update(room, game, snapshot=True)
 
 
 @socketio_server.event
 async def chat(sid, message):
-    room = None
-    for r, sids in rooms.items():
-        if sid in sids:
-            room = r
-            break
+    room, game = room_registry.game_of(sid)
 
     if room:
+        room_registry.touch(room)
         logger.info(f"Message from {sid} in {room}: {message}")
-        game = games[room]
         response_message = None
         user_message = None
 
         # If the message is from the user, let the AI respond
-        if not sid.startswith("ai_"):
+        if not is_ai_sid(sid):
             # Handle player move
             if message.startswith("bid"):
                 _, quantity, face_value = message.split()
@@ -141,8 +253,8 @@ async def chat(sid, message):
                     )
 
             # Send game state update to all users
-            game_state = game.get_game_state()
-            await socketio_server.emit("game_update", game_state, room=room)
+            await save_game(room, game)
+            await emit_game_update(room, game)
 
             # Check game over condition after player move
             if game.is_game_over():
@@ -150,10 +262,10 @@ async def chat(sid, message):
                 await socketio_server.emit(
                     "game_over", {"winner": game.player_names[winner]}, room=room
                 )
-                increment_game_counter()
+                await finish_game(room)
                 return
             else:
-                ai_sid = f"ai_{room}"
+                ai_sid = ai_sid_for(room)
                 if game.is_game_over():
                     winner = game.get_winner()
                     await socketio_server.emit(
@@ -161,17 +273,17 @@ async def chat(sid, message):
                         {"sid": ai_sid, "message": f"Game over! Player {winner} wins!"},
                         room=room,
                     )
-                    increment_game_counter()
+                    await finish_game(room)
                     return
                 else:
                     await asyncio.sleep(0.5)  # Adding delay before AI response
-                    ai_message = generate_ai_response(game, room)
+                    ai_message = await generate_ai_response(game, room)
                     await socketio_server.emit(
                         "chat", {"sid": ai_sid, "message": ai_message}, room=room
                     )
                     # Send updated game state after AI move
-                    game_state = game.get_game_state()
-                    await socketio_server.emit("game_update", game_state, room=room)
+                    await save_game(room, game)
+                    await emit_game_update(room, game)
                     if game.is_game_over():
                         winner = game.get_winner()
                         await socketio_server.emit(
@@ -179,31 +291,77 @@ async def chat(sid, message):
                             {"winner": game.player_names[winner]},
                             room=room,
                         )
-                        increment_game_counter()
+                        await finish_game(room)
                         return
 
 
 @socketio_server.event
 async def disconnect(sid):
-    room = None
-    for r, sids in rooms.items():
-        if sid in sids:
-            sids.remove(sid)
-            room = r
-            if not sids:  # If the room is empty, remove it from the dictionary
-                del rooms[room]
-                del games[room]
-            break
+    # The room and its game are dropped once only the AI pseudo-sid is left; a game store
+    # keeps its copy until it expires so the player can resume from any worker
+    room, destroyed = room_registry.leave(sid)
 
     if room:
         logger.info(f"{sid}: disconnected from {room}")
+    if destroyed and game_store is None:
+        release_agent_state(room)  # nothing can resume the room, so its tree or belief goes too
 
 
 def save_agents():
-    models["easy"].save("q_learning_agent.pkl")
-    models["medium"].save("dqn_agent.pkl")
-    models["hard"].save("dqn_agent.pkl")
-    logging.info("Agents saved.")
+    # Snapshots are taken here; serializing and writing happens on the checkpoint thread
+    # Only agents that have been loaded can have changed; registry versions are immutable
+    served_from_registry = model_registry.routed if model_registry is not None else set()
+    agents = {
+        MODEL_FILES[difficulty]: agent
+        for difficulty, agent in agent_registry.loaded().items()
+        if difficulty in MODEL_FILES and difficulty not in served_from_registry
+    }
+    if checkpoint_writer.submit(agents) is not None:
+        logging.info("Agent checkpoint started.")
+
+
+async def close_rooms(closed, reason):
+    for room, members in closed.items():
+        logger.info(f"Closing {room}: {reason}")
+        await delete_game(room)
+        for sid in members:
+            if not is_ai_sid(sid):
+                # The room is already gone, so the disconnect handler has nothing left to free
+                await socketio_server.disconnect(sid)
+
+
+async def finish_game(room):
+    increment_game_counter()
+    await delete_game(room)  # nothing left to resume
+    await close_rooms(room_registry.mark_finished(room), "finished game evicted")
+
+
+async def reap_rooms():
+    while True:
+        await asyncio.sleep(ROOM_REAP_INTERVAL)
+        try:
+            await close_rooms(room_registry.reap(), "idle timeout")
+            logger.info(f"Rooms: {room_registry.stats()}")
+        except Exception:
+            logger.exception("Room reaper failed")
+
+
+async def poll_model_registry():
+    while True:
+        await asyncio.sleep(MODEL_POLL_INTERVAL)
+        try:
+            await model_registry.poll(agent_registry)
+        except Exception:
+            logger.exception("Model registry poll failed")
+
+
+def ensure_background_tasks():
+    # Started from the first connection, once the server's event loop is running
+    global room_reaper_task, model_poll_task
+    if room_reaper_task is None or room_reaper_task.done():
+        room_reaper_task = asyncio.create_task(reap_rooms())
+    if model_registry is not None and (model_poll_task is None or model_poll_task.done()):
+        model_poll_task = asyncio.create_task(poll_model_registry())
 
 
 def increment_game_counter():
@@ -214,8 +372,9 @@ def increment_game_counter():
 
 
 async def simulate_ai_connection(room):
-    ai_sid = f"ai_{room}"
-    rooms[room].add(ai_sid)
+    ai_sid = ai_sid_for(room)
+    if not room_registry.join(room, ai_sid):
+        return  # the player left before the AI joined
     logger.info(f"AI {ai_sid}: connected to {room}")
     await socketio_server.emit("join", {"sid": ai_sid}, room=room)
     await socketio_server.emit(
@@ -224,15 +383,11 @@ async def simulate_ai_connection(room):
 
 
 def get_ai_model(difficulty):
-    return models.get(
-        difficulty, models["tutorial"]
-    )  # Default to tutorial if difficulty not found
+    return agent_registry.get(difficulty)  # None (tutorial) if the difficulty has no agent
 
 
-def generate_ai_response(game, room):
+async def generate_ai_response(game, room):
     difficulty = room.split('_')[0]  # Extract difficulty from room name
-    model = models.get(difficulty, models['tutorial'])  # Default to tutorial if difficulty not found
-
     if difficulty == 'tutorial':
         return handle_tutorial_mode(game)
 
@@ -242,45 +397,40 @@ def generate_ai_response(game, room):
 
     state = game.get_game_state()
     logging.info(f"Current game state: {state}")
+    mask = state_action_mask(game.state)
 
-    if isinstance(model, QLearningAgent):
-        action = model.get_action(state)
-    elif isinstance(model, DQNAgent):
-        state_sequence = (
-            tuple(state["dice_count"]) + 
-            tuple(state["current_bid"]) + 
-            tuple(state["scores"]) + 
-            (state["current_player"],)
-        )
-        action = model.act(state_sequence)
-        logging.info(f"DQNAgent raw action: {action}")
-    elif isinstance(model, SARSAAgent):
-        action = model.get_action(state)
-        logging.info(f"SARSAAgent raw action: {action}")
-    elif isinstance(model, MCTSAgent):
-        action = model.select_action(state, game)
-        logging.info(f"MCTSAgent raw action: {action}")
-    else:
+    # Loaded on a worker thread the first time a difficulty is played
+    model = await agent_registry.aget(difficulty)
+    if model is None and difficulty in agent_registry:
+        logging.warning(f"The {difficulty} agent is unavailable; answering {room} with the tutorial heuristic")
+        return handle_tutorial_mode(game)
+
+    # Batched agents provide batch_input/act_batch, per-room agents (MCTS, Bayesian) select_action
+    if not hasattr(model, "act_batch") and not hasattr(model, "select_action"):
         logging.error(f"Invalid model type: {type(model)}")
         return "Invalid AI model type"
 
+    try:
+        if not hasattr(model, "act_batch"):
+            # Searches a copy, so the room can keep handling events while the worker runs. Always on a
+            # thread: the agent keeps the room's tree or belief, which a process worker would lose
+            action = await ai_executor.run_threaded(difficulty, model.select_action, state, game.clone(), room)
+        else:
+            # Batched with the same model's pending decisions from other rooms
+            action = await inference_scheduler.decide(model, game.state, mask, difficulty)
+    except AIExecutorSaturated:
+        logging.warning(f"AI pool saturated for {difficulty}; answering {room} with the tutorial heuristic")
+        return handle_tutorial_mode(game)
+    logging.info(f"{type(model).__name__} raw action: {action}")
+
     action_type, quantity, face_value = decode_action(action)
     logging.info(f"{type(model).__name__} action: {action} (Type: {action_type}, Quantity: {quantity}, Face Value: {face_value})")
 
-    # Validate and reselect action if invalid
-    attempts = 0
-    while not is_valid_action(action_type, quantity, face_value, state) and attempts < 10:
-        action = model.get_valid_random_action(state)
-        action_type, quantity, face_value = decode_action(action)
-        logging.info(f"Reselected action: {action} (Type: {action_type}, Quantity: {quantity}, Face Value: {face_value})")
-        attempts += 1
-
-    if not is_valid_action(action_type, quantity, face_value, state):
-        logging.error(f"Unable to find valid action after {attempts} attempts.")
+    # Agents only pick from the legal-action mask, so there is nothing to reselect
+    if not mask[action]:
+        logging.error(f"{type(model).__name__} selected an invalid action: {action}")
         return "Invalid action"
 
-    logging.info(f"Final action: {action} (Type: {action_type}, Quantity: {quantity}, Face Value: {face_value})")
-
     if action_type == 0:  # Bid
         valid_bid = game.make_bid(2, quantity, face_value)
         if valid_bid:
@@ -299,51 +449,13 @@ def generate_ai_response(game, room):
         return f"Challenge! {result}"
 
 
-def decode_action(action):
-    if isinstance(action, tuple):
-        return action
-    else:
-        action_type = action // 66
-        quantity = (action % 66) // 6 + 1
-        face_value = action % 6 + 1
-        return action_type, quantity, face_value
-
-def is_valid_action(action_type, quantity, face_value, state):
-    current_quantity, current_face_value = state["current_bid"]
-    total_dice = sum(state["dice_count"])
-
-    if action_type == 0:  # Bid
-        if quantity > total_dice or quantity < 1:
-            return False
-        if face_value < 1 or face_value > 6:
-            return False
-        if quantity < current_quantity or (
-            quantity == current_quantity and face_value <= current_face_value
-        ):
-            return False
-    elif action_type == 1:  # Challenge
-        if state["last_action_was_challenge"]:
-            return False
-    return True
-
-def binomial_probability(n, k, p):
-    # Binomial coefficient
-    coeff = math.comb(n, k)
-    return coeff * (p ** k) * ((1 - p) ** (n - k))
-
 def calculate_challenge_probability(game, current_bid):
-    total_dice = game.dice_count[1] + game.dice_count[2]
+    # The AI (player 2) knows its own dice; only the opponent's dice are unknown
     current_bid_quantity, current_bid_face_value = current_bid
+    own_matching = matching_dice(game.state.dice[1], current_bid_face_value)
+    unknown_dice = game.state.dice_count[0]
 
-    # Calculate the combined probability of a face value considering wilds (1s)
-    face_probability = 1 / 6
-    wild_probability = 1 / 6
-    combined_probability = face_probability + wild_probability
-
-    probability = 0
-    for k in range(current_bid_quantity, total_dice + 1):
-        probability += binomial_probability(total_dice, k, combined_probability)
-
+    probability = bid_probability(unknown_dice, own_matching, current_bid_quantity, current_bid_face_value)
     return 1 - probability  # Probability of the bid being false
 
 def determine_next_bid(game):
@@ -0,0 +1,124 @@
+"""Canonical state encoding shared by every agent.
+
+A game state is reduced to the fields the agents were trained on, in this
+order: both dice counts, the current bid, both scores (in units of 100) and
+the index of the player to move (0 for player 1, 1 for player 2). The
+`last_action_was_challenge` flag is not stored: it is True exactly when the
+bid is the (0, 0) placeholder left by a challenge.
+
+`encode_state` packs those fields into one int below `NUM_STATES`;
+`state_features` returns them as a float32 vector of `STATE_SIZE` for the DQN.
+"""
+import numpy as np
+
+from liars_dice_game_logic import GameState
+
+# (name, bits), least significant first
+FIELDS = (
+    ("dice_count_1", 3),
+    ("dice_count_2", 3),
+    ("bid_quantity", 4),
+    ("bid_face_value", 3),
+    ("score_1", 4),
+    ("score_2", 4),
+    ("player", 1),
+)
+SHIFTS = tuple(int(s) for s in np.cumsum([0] + [bits for _, bits in FIELDS[:-1]]))
+LIMITS = tuple((1 << bits) - 1 for _, bits in FIELDS)
+STATE_BITS = sum(bits for _, bits in FIELDS)
+NUM_STATES = 1 << STATE_BITS
+STATE_SIZE = len(FIELDS)
+
+SCORE_UNIT = 100
+
+
+def _fields(state):
+    if isinstance(state, GameState):
+        return (state.dice_count[0], state.dice_count[1], state.current_bid[0], state.current_bid[1],
+                state.scores[0], state.scores[1], state.current_player)
+    dice_count, scores = state["dice_count"], state["scores"]
+    return (dice_count[1], dice_count[2], state["current_bid"][0], state["current_bid"][1],
+            scores[1], scores[2], state["current_player"])
+
+
+def encode_fields(dice_count_1, dice_count_2, bid_quantity, bid_face_value, score_1, score_2, player_index):
+    values = (dice_count_1, dice_count_2, bid_quantity, bid_face_value,
+              min(score_1 // SCORE_UNIT, LIMITS[4]), min(score_2 // SCORE_UNIT, LIMITS[5]), player_index)
+    key = 0
+    for value, shift in zip(values, SHIFTS):
+        key |= int(value) << shift
+    return key
+
+
+def encode_state(state):
+    """Packs a `GameState` or a `LiarDiceGame.get_game_state()` dict into one int."""
+    c1, c2, quantity, face_value, s1, s2, player = _fields(state)
+    return encode_fields(c1, c2, quantity, face_value, s1, s2, player - 1)
+
+
+def decode_state(key):
+    """Inverse of `encode_state`: (dice_count_1, dice_count_2, bid_quantity, bid_face_value, score_1, score_2, player)."""
+    values = [(key >> shift) & limit for shift, limit in zip(SHIFTS, LIMITS)]
+    values[4] *= SCORE_UNIT
+    values[5] *= SCORE_UNIT
+    values[6] += 1
+    return tuple(values)
+
+
+def legacy_key_to_state(key):
+    # Q-tables trained in ai_training/ are keyed by
+    # (dice_count_1, dice_count_2, bid_quantity, bid_face_value, score_1, score_2, player_index)
+    return encode_fields(*key)
+
+
+def state_features(state, out=None):
+    """The DQN input vector: the same fields as `encode_state`, scores unscaled."""
+    c1, c2, quantity, face_value, s1, s2, player = _fields(state)
+    if out is None:
+        out = np.empty(STATE_SIZE, dtype=np.float32)
+    out[0] = c1
+    out[1] = c2
+    out[2] = quantity
+    out[3] = face_value
+    out[4] = s1
+    out[5] = s2
+    out[6] = player - 1
+    return out
+
+
+def encode_batch(dice_count, current_bid, scores, current_player):
+    """Vectorized `encode_state` over (N, 2), (N, 2), (N, 2) and (N,) arrays."""
+    dice_count = np.asarray(dice_count, dtype=np.int64)
+    current_bid = np.asarray(current_bid, dtype=np.int64)
+    scores = np.minimum(np.asarray(scores, dtype=np.int64) // SCORE_UNIT, LIMITS[4])
+    player_index = np.asarray(current_player, dtype=np.int64) - 1
+    columns = (dice_count[:, 0], dice_count[:, 1], current_bid[:, 0], current_bid[:, 1],
+               scores[:, 0], scores[:, 1], player_index)
+    keys = np.zeros(len(player_index), dtype=np.int64)
+    for column, shift in zip(columns, SHIFTS):
+        keys |= column << shift
+    return keys
+
+
+def features_batch(dice_count, current_bid, scores, current_player):
+    """Vectorized `state_features`; returns an (N, STATE_SIZE) float32 array."""
+    features = np.empty((len(current_player), STATE_SIZE), dtype=np.float32)
+    features[:, 0:2] = dice_count
+    features[:, 2:4] = current_bid
+    features[:, 4:6] = scores
+    features[:, 6] = np.asarray(current_player) - 1
+    return features
+
+
+def encode_batched_game(game):
+    """Keys for every game in a `BatchedLiarDiceGame`."""
+    return encode_batch(game.dice_count, game.current_bid, game.scores, game.current_player)
+
+
+def batched_game_features(game):
+    return features_batch(game.dice_count, game.current_bid, game.scores, game.current_player)
+
+
+def rekey_legacy_table(q_table):
+    """Converts a tuple-keyed Q-table dict to canonical int keys; int keys pass through."""
+    return {legacy_key_to_state(key) if isinstance(key, tuple) else key: values for key, values in q_table.items()}
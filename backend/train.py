@@ -0,0 +1,360 @@
+"""Parallel self-play training for the backend agents.
+
+    python train.py --agent sarsa --workers 4 --seconds 3600 --output sarsa_agent.qtable
+    python train.py --agent dqn --workers 3 --transitions 5000000 --output dqn_agent.pkl --export dqn_agent.npz
+
+Every worker process plays `--games-per-worker` games at once on a
+`BatchedLiarDiceGame` and appends each step's transitions to its own
+`ExperienceRing` in shared memory. This process is the learner: it drains the
+rings, updates the agent, writes a checkpoint in the background every
+`--checkpoint-every` transitions and logs throughput every `--report-every`
+seconds. Workers act epsilon-greedily on the learner's latest policy: DQN
+weights are published through a `SharedPolicy`, tabular agents are re-mapped
+from the checkpoint file once it has been written.
+
+One policy plays both seats and every move hands the turn to the opponent, so
+a transition's next state is the opponent's decision. The learners bootstrap
+negamax-style: the target is the reward minus the discounted value of the
+next state. At the end the greedy policy plays `--eval-games` games against
+uniformly random legal moves and its win rate is logged.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from action_masks import ACTION_FACE_VALUES, ACTION_QUANTITIES, ACTION_SIZE, ACTION_TYPES, batch_action_masks, epsilon_greedy_batch, masked_argmax
+from batched_liars_dice_game import BatchedLiarDiceGame
+from checkpoint import CheckpointWriter
+from dqn_inference import LAYERS, NumpyDQN
+from experience_ring import ExperienceRing, SharedPolicy
+from state_codec import STATE_SIZE, batched_game_features, encode_batched_game
+
+logger = logging.getLogger(__name__)
+
+AGENTS = ("q_learning", "sarsa", "dqn")
+
+
+def observe(game):
+    masks = batch_action_masks(game.current_bid, game.dice_count.sum(axis=1), game.last_action_was_challenge)
+    return encode_batched_game(game), batched_game_features(game), masks
+
+
+def evaluate(greedy_values, games, seed=None):
+    """Win rate of the greedy policy against uniformly random legal moves, half the games from each seat.
+
+    `greedy_values(keys, states)` returns the policy's action values for encoded states.
+    """
+    game = BatchedLiarDiceGame(games, seed=seed)
+    seats = np.where(np.arange(games) % 2 == 0, 1, 2)
+    running = np.ones(games, dtype=bool)
+    while running.any():
+        keys, states, masks = observe(game)
+        actions = masked_argmax(np.random.rand(*masks.shape), masks)
+        greedy = running & (game.current_player == seats)
+        if greedy.any():
+            actions[greedy] = masked_argmax(greedy_values(keys[greedy], states[greedy]), masks[greedy])
+        _, dones = game.step(ACTION_TYPES[actions], ACTION_QUANTITIES[actions], ACTION_FACE_VALUES[actions], running)
+        running &= ~dones
+    return float(np.mean(game.get_winner() == seats))
+
+
+class BehaviourPolicy:
+    """The worker's copy of the learner's policy, refreshed when the shared version changes."""
+
+    def __init__(self, agent, shared, q_table_file):
+        self.agent = agent
+        self.shared = shared
+        self.q_table_file = q_table_file
+        self.version = -1
+        self.epsilon = 1.0
+        self.network = None
+        self.q_table = None
+
+    def refresh(self):
+        if int(self.shared.version[0]) == self.version:
+            return
+        if self.agent == "dqn":
+            self.version, weights, biases, self.epsilon = self.shared.read()
+            self.network = NumpyDQN(weights, biases)
+        else:
+            from q_table_store import load_q_table
+
+            self.version, _, _, self.epsilon = self.shared.read()
+            if os.path.exists(self.q_table_file):
+                self.q_table = load_q_table(self.q_table_file, ACTION_SIZE)
+
+    def act(self, keys, states, masks):
+        if self.network is not None:
+            values = self.network.q_values(states)
+        elif self.q_table is not None:
+            values = self.q_table.gather(keys)
+        else:
+            values = np.zeros(masks.shape, dtype=np.float32)
+        return epsilon_greedy_batch(values, masks, self.epsilon)
+
+
+def self_play_worker(worker_id, config):
+    """Plays until the learner stops the ring; returns the number of transitions written."""
+    seed = None if config["seed"] is None else config["seed"] + worker_id
+    np.random.seed(seed)  # epsilon_greedy_batch draws from the global generator
+    ring = ExperienceRing.attach(config["rings"][worker_id], config["ring_size"], STATE_SIZE, ACTION_SIZE)
+    shared = SharedPolicy(config["policy_shapes"], name=config["policy"])
+    policy = BehaviourPolicy(config["agent"], shared, config["output"])
+    game = BatchedLiarDiceGame(config["games_per_worker"], seed=seed)
+    try:
+        policy.refresh()
+        keys, states, masks = observe(game)
+        actions = policy.act(keys, states, masks)
+        while not ring.stopped:
+            rewards, dones = game.step(ACTION_TYPES[actions], ACTION_QUANTITIES[actions], ACTION_FACE_VALUES[actions])
+            next_keys, next_states, next_masks = observe(game)
+            # Chosen now so SARSA learns from the action that is actually played next
+            next_actions = policy.act(next_keys, next_states, next_masks)
+            ring.write({
+                "keys": keys, "next_keys": next_keys, "states": states, "next_states": next_states,
+                "actions": actions, "next_actions": next_actions, "rewards": rewards, "dones": dones,
+                "next_masks": next_masks,
+            })
+            if dones.any():
+                game.reset(dones)
+                next_keys, next_states, next_masks = observe(game)
+                next_actions[dones] = policy.act(next_keys[dones], next_states[dones], next_masks[dones])
+            keys, states, masks, actions = next_keys, next_states, next_masks, next_actions
+            policy.refresh()
+        return ring.written
+    finally:
+        ring.close()
+        shared.close()
+
+
+class TabularLearner:
+    def __init__(self, kind, args):
+        if kind == "q_learning":
+            from q_learning_agent import QLearningAgent as agent_class
+        else:
+            from sarsa_agent import SARSAAgent as agent_class
+        self.kind = kind
+        self.agent = agent_class(STATE_SIZE, ACTION_SIZE, alpha=args.alpha, gamma=args.gamma, epsilon=args.epsilon,
+                                 epsilon_decay=args.epsilon_decay, epsilon_min=args.epsilon_min)
+        if args.resume and os.path.exists(args.output):
+            self.agent.load(args.output)
+            logger.info(f"Resumed {len(self.agent.q_table)} states from {args.output}")
+        self.updates = 0
+
+    def policy_shapes(self):
+        return []
+
+    def publish(self, shared):
+        shared.publish([], [], self.agent.epsilon)
+
+    def learn(self, batch):
+        if self.kind == "q_learning":
+            self.agent.update_batch(batch["keys"], batch["actions"], batch["rewards"], batch["next_keys"], batch["next_masks"],
+                                    batch["dones"])
+        else:
+            self.agent.update_batch(batch["keys"], batch["actions"], batch["rewards"], batch["next_keys"], batch["next_actions"],
+                                    batch["dones"])
+        self.updates += len(batch["actions"])
+        # Epsilon decays once per finished game, as in the per-episode training loop
+        games = int(batch["dones"].sum())
+        self.agent.epsilon = max(self.agent.epsilon_min, self.agent.epsilon * self.agent.epsilon_decay ** games)
+        return False
+
+    def describe(self):
+        return f"{len(self.agent.q_table)} states"
+
+    def values(self, keys, states):
+        return self.agent.q_table.gather(keys)
+
+
+class DQNLearner:
+    def __init__(self, args):
+        from dqn_agent import DQNAgent
+
+        self.agent = DQNAgent(STATE_SIZE, ACTION_SIZE, epsilon=args.epsilon, epsilon_decay=args.epsilon_decay,
+                              epsilon_min=args.epsilon_min, gamma=args.gamma, batch_size=args.batch_size,
+                              memory_size=args.memory_size, prioritized=args.prioritized,
+                              target_update_interval=args.target_update_interval)
+        if args.resume and os.path.exists(args.output):
+            self.agent.load(args.output)
+            logger.info(f"Resumed {args.output} with {len(self.agent.memory)} transitions in memory")
+        self.replay_ratio = args.replay_ratio
+        self.sync_every = args.sync_every
+        self.credit = 0.0
+        self.updates = 0
+        self.loss = None
+
+    def policy_shapes(self):
+        state = self.agent.network.state_dict()
+        return [(tuple(state[f"{layer}.weight"].shape), tuple(state[f"{layer}.bias"].shape)) for layer in LAYERS]
+
+    def publish(self, shared):
+        state = self.agent.network.state_dict()
+        shared.publish([state[f"{layer}.weight"].numpy() for layer in LAYERS],
+                       [state[f"{layer}.bias"].numpy() for layer in LAYERS], self.agent.epsilon)
+
+    def learn(self, batch):
+        """Stores the batch and runs `replay_ratio` sampled transitions per new one; True if weights should be published."""
+        self.agent.memory.add_batch(batch["states"], batch["actions"], batch["rewards"], batch["next_states"],
+                                    batch["dones"], batch["next_masks"])
+        self.credit += len(batch["actions"]) * self.replay_ratio / self.agent.batch_size
+        publish = False
+        while self.credit >= 1:
+            self.credit -= 1
+            loss = self.agent.replay()
+            if loss is None:
+                break
+            self.loss = loss
+            self.updates += 1
+            publish |= self.updates % self.sync_every == 0
+        return publish
+
+    def describe(self):
+        loss = "n/a" if self.loss is None else f"{self.loss:.4f}"
+        return f"memory {len(self.agent.memory)}, loss {loss}"
+
+    def values(self, keys, states):
+        import torch
+
+        with torch.no_grad():
+            return self.agent.network(torch.from_numpy(np.asarray(states, dtype=np.float32))).numpy()
+
+    def export(self, filename):
+        from dqn_inference import export_weights
+
+        export_weights(self.agent.network.state_dict(), filename, epsilon=self.agent.epsilon)
+
+
+def train(args):
+    learner = DQNLearner(args) if args.agent == "dqn" else TabularLearner(args.agent, args)
+    writer = CheckpointWriter()
+    rings = [ExperienceRing(args.ring_size, STATE_SIZE, ACTION_SIZE) for _ in range(args.workers)]
+    shared = SharedPolicy(learner.policy_shapes())
+    learner.publish(shared)
+    config = {
+        "agent": args.agent, "rings": [ring.name for ring in rings], "ring_size": args.ring_size,
+        "policy": shared.name, "policy_shapes": learner.policy_shapes(), "output": args.output,
+        "games_per_worker": args.games_per_worker, "seed": args.seed,
+    }
+    if args.ring_size < args.games_per_worker:
+        raise ValueError("--ring-size must hold at least one step of --games-per-worker games")
+    # spawn: workers start from a clean interpreter and never import torch
+    pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"))
+    workers = [pool.submit(self_play_worker, i, config) for i in range(args.workers)]
+
+    start = last_report = time.perf_counter()
+    consumed = games = 0
+    last_consumed, last_updates, last_checkpoint = 0, learner.updates, 0
+    pending = None  # tabular checkpoint the workers should switch to once it is on disk
+    logger.info(f"Training {args.agent} with {args.workers} workers x {args.games_per_worker} games")
+    try:
+        while True:
+            idle = True
+            for ring in rings:
+                batch = ring.read(args.read_limit)
+                n = len(batch["actions"])
+                if n == 0:
+                    continue
+                idle = False
+                consumed += n
+                games += int(batch["dones"].sum())
+                if learner.learn(batch):
+                    learner.publish(shared)
+
+            if consumed - last_checkpoint >= args.checkpoint_every:
+                last_checkpoint = consumed
+                future = writer.submit({args.output: learner.agent})
+                if future is not None and args.agent != "dqn":
+                    pending = future
+            if pending is not None and pending.done():
+                pending = None
+                learner.publish(shared)
+
+            now = time.perf_counter()
+            if now - last_report >= args.report_every:
+                elapsed = now - last_report
+                generated = sum(ring.written for ring in rings)
+                logger.info(
+                    f"{consumed} transitions ({(consumed - last_consumed) / elapsed:.0f}/s), "
+                    f"{learner.updates} updates ({(learner.updates - last_updates) / elapsed:.0f}/s), "
+                    f"{games} games, backlog {generated - consumed}, "
+                    f"epsilon {learner.agent.epsilon:.3f}, {learner.describe()}"
+                )
+                last_report, last_consumed, last_updates = now, consumed, learner.updates
+
+            if (args.transitions is not None and consumed >= args.transitions) or \
+                    (args.seconds is not None and now - start >= args.seconds):
+                break
+            if idle:
+                for worker in workers:
+                    if worker.done():
+                        worker.result()  # re-raises the worker's exception
+                        raise RuntimeError("A self-play worker stopped early")
+                time.sleep(0.001)
+    except KeyboardInterrupt:
+        logger.info("Interrupted, writing a final checkpoint")
+    finally:
+        for ring in rings:
+            ring.stop()
+        pool.shutdown(wait=True)
+        for ring in rings:
+            ring.close()
+        shared.close()
+
+    if writer.running is not None:
+        writer.running.result()
+    writer.submit({args.output: learner.agent}).result()
+    if args.export:
+        learner.export(args.export)
+    writer.close()
+    elapsed = time.perf_counter() - start
+    logger.info(f"Done: {consumed} transitions, {learner.updates} updates, {games} games in {elapsed:.1f}s "
+                f"({consumed / elapsed:.0f} transitions/s); saved {args.output}")
+    if args.eval_games:
+        win_rate = evaluate(learner.values, args.eval_games, args.seed)
+        logger.info(f"Greedy policy vs random moves: won {win_rate:.1%} of {args.eval_games} games")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train an agent with parallel self-play")
+    parser.add_argument("--agent", choices=AGENTS, required=True)
+    parser.add_argument("--output", help="checkpoint file (default: <agent>_agent.qtable, or .pkl for dqn)")
+    parser.add_argument("--resume", action="store_true", help="continue from --output if it exists")
+    parser.add_argument("--export", help="dqn only: also write torch-free .npz weights here")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--games-per-worker", type=int, default=256, help="games each worker steps together")
+    parser.add_argument("--ring-size", type=int, default=1 << 16, help="transitions buffered per worker before it waits")
+    parser.add_argument("--read-limit", type=int, default=8192, help="transitions taken from one ring at a time")
+    parser.add_argument("--transitions", type=int, help="stop after learning from this many transitions")
+    parser.add_argument("--seconds", type=float, help="stop after this many seconds")
+    parser.add_argument("--checkpoint-every", type=int, default=1_000_000, help="transitions between checkpoints")
+    parser.add_argument("--report-every", type=float, default=10.0, help="seconds between throughput reports")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--eval-games", type=int, default=2000, help="games against random moves after training (0: skip)")
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--gamma", type=float, default=0.99)
+    parser.add_argument("--epsilon", type=float, default=1.0)
+    parser.add_argument("--epsilon-decay", type=float, default=0.995)
+    parser.add_argument("--epsilon-min", type=float, default=0.01)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--memory-size", type=int, default=100_000)
+    parser.add_argument("--prioritized", action="store_true")
+    parser.add_argument("--target-update-interval", type=int, default=100)
+    parser.add_argument("--replay-ratio", type=float, default=1.0, help="dqn: sampled per new transition")
+    parser.add_argument("--sync-every", type=int, default=50, help="dqn: updates between publishing weights to workers")
+    args = parser.parse_args(argv)
+    if args.output is None:
+        args.output = "dqn_agent.pkl" if args.agent == "dqn" else f"{args.agent}_agent.qtable"
+    if args.export and args.agent != "dqn":
+        parser.error("--export is only supported for --agent dqn")
+    return args
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    train(parse_args())
@@ -18,6 +18,50 @@ interface GameState {
   scores: { [key: number]: number };
 }
 
+interface GameDelta extends Partial<GameState> {
+  seq: number;
+}
+
+// Binary game_delta layout from backend/game_protocol.py (version 1, little-endian)
+const decodeGameDelta = (payload: ArrayBuffer | GameDelta): GameDelta => {
+  if (!(payload instanceof ArrayBuffer)) {
+    return payload;
+  }
+  const view = new DataView(payload);
+  const mask = view.getUint8(1);
+  const delta: GameDelta = { seq: view.getUint32(2, true) };
+  let offset = 6;
+  if (mask & 1) {
+    delta.current_bid = [view.getUint8(offset), view.getUint8(offset + 1)];
+    offset += 2;
+  }
+  if (mask & 2) {
+    delta.current_player = view.getUint8(offset);
+    offset += 1;
+  }
+  if (mask & 4) {
+    delta.last_action_was_challenge = view.getUint8(offset) === 1;
+    offset += 1;
+  }
+  if (mask & 8) {
+    delta.dice_count = { 1: view.getUint8(offset), 2: view.getUint8(offset + 1) };
+    offset += 2;
+  }
+  if (mask & 16) {
+    const players: { [key: number]: number[] } = {};
+    for (const player of [1, 2]) {
+      const count = view.getUint8(offset);
+      players[player] = Array.from(new Uint8Array(payload, offset + 1, count));
+      offset += 1 + count;
+    }
+    delta.players = players;
+  }
+  if (mask & 32) {
+    delta.scores = { 1: view.getUint32(offset, true), 2: view.getUint32(offset + 4, true) };
+  }
+  return delta;
+};
+
 const diceFaces = ['⚀', '⚁', '⚂', '⚃', '⚄', '⚅'];
 
 const GamePage: React.FC = () => {
@@ -34,6 +78,9 @@ const GamePage: React.FC = () => {
   const [messages, setMessages] = useState<Array<{ type: 'join' | 'chat'; sid: string; message?: string }>>([]);
   const [sidMaps, setSidMaps] = useState<{ name: string; pic: string; sid: string; isAI: boolean }[]>([]);
   const [gameState, setGameState] = useState<GameState | null>(null);
+  // Latest full state and sequence number, which game_delta events are applied to
+  const gameStateRef = useRef<GameState | null>(null);
+  const gameSeqRef = useRef<number>(0);
   const [isFirstBid, setIsFirstBid] = useState<boolean>(true);
 
   const [isGameOver, setIsGameOver] = useState<boolean>(false);
@@ -99,7 +146,7 @@ const GamePage: React.FC = () => {
     const connectSocket = () => {
       const socketInstance = io(import.meta.env.VITE_BACKEND_URL, {
         path: import.meta.env.VITE_REACT_APP_SOCKET_PATH,
-        query: { room: difficulty },
+        query: { room: difficulty, proto: 'bin' },
       });
 
       socketInstance.on('connect', () => {
@@ -112,8 +159,12 @@ const GamePage: React.FC = () => {
         setIsConnected(false);
       });
 
-      socketInstance.on('join', (data: { sid: string }) => {
-        setMessages(prevMessages => [...prevMessages, { ...data, type: 'join' }]);
+      socketInstance.on('join', (data: { sid: string; room?: string }) => {
+        if (data.sid === socketInstance.id && data.room) {
+          // Reconnects resume this room, on whichever server worker holds it
+          socketInstance.io.opts.query = { room: difficulty, proto: 'bin', resume: data.room };
+        }
+        setMessages(prevMessages => [...prevMessages, { sid: data.sid, type: 'join' }]);
         if (data.sid.startsWith('ai_')) {
           setSidMaps(prevMaps => [...prevMaps, { name: aiName, pic: aiPic, sid: data.sid, isAI: true }]);
         } else if (data.sid !== socketInstance.id) {
@@ -125,7 +176,7 @@ const GamePage: React.FC = () => {
         setMessages(prevMessages => [...prevMessages, { ...data, type: 'chat' }]);
       });
 
-      socketInstance.on('game_update', (data: GameState) => {
+      const applyGameState = (data: GameState) => {
         setGameState(data);
 
 
@@ -142,6 +193,24 @@ const GamePage: React.FC = () => {
             AIScore: data.scores[2],
           });
         }
+      };
+
+      socketInstance.on('game_update', (data: GameState & { seq?: number }) => {
+        gameStateRef.current = data;
+        gameSeqRef.current = data.seq ?? 0;
+        applyGameState(data);
+      });
+
+      socketInstance.on('game_delta', (payload: ArrayBuffer | GameDelta) => {
+        const { seq, ...delta } = decodeGameDelta(payload);
+        if (!gameStateRef.current || seq !== gameSeqRef.current + 1) {
+          // Missed an update; the server answers with a full game_update
+          socketInstance.emit('resync');
+          return;
+        }
+        gameStateRef.current = { ...gameStateRef.current, ...delta };
+        gameSeqRef.current = seq;
+        applyGameState(gameStateRef.current);
       });
 
       socketInstance.on('game_over', (data: { winner: string }) => {
@@ -203,7 +272,7 @@ const GamePage: React.FC = () => {
     setTimeout(() => {
       const socketInstance = io(import.meta.env.VITE_BACKEND_URL, {
         path: import.meta.env.VITE_REACT_APP_SOCKET_PATH,
-        query: { room: difficulty },
+        query: { room: difficulty, proto: 'bin' },
       });
 
       socketInstance.on('connect', () => {
@@ -216,8 +285,12 @@ const GamePage: React.FC = () => {
         setIsConnected(false);
       });
 
-      socketInstance.on('join', (data: { sid: string }) => {
-        setMessages(prevMessages => [...prevMessages, { ...data, type: 'join' }]);
+      socketInstance.on('join', (data: { sid: string; room?: string }) => {
+        if (data.sid === socketInstance.id && data.room) {
+          // Reconnects resume this room, on whichever server worker holds it
+          socketInstance.io.opts.query = { room: difficulty, proto: 'bin', resume: data.room };
+        }
+        setMessages(prevMessages => [...prevMessages, { sid: data.sid, type: 'join' }]);
         if (data.sid.startsWith('ai_')) {
           setSidMaps(prevMaps => [...prevMaps, { name: aiName, pic: aiPic, sid: data.sid, isAI: true }]);
         } else if (data.sid !== socketInstance.id) {
@@ -229,7 +302,7 @@ const GamePage: React.FC = () => {
         setMessages(prevMessages => [...prevMessages, { ...data, type: 'chat' }]);
       });
 
-      socketInstance.on('game_update', (data: GameState) => {
+      const applyGameState = (data: GameState) => {
         setGameState(data);
 
         if (data.dice_count[1] === 0 || data.dice_count[2] === 0) {
@@ -243,6 +316,24 @@ const GamePage: React.FC = () => {
             AIScore: data.scores[2],
           });
         }
+      };
+
+      socketInstance.on('game_update', (data: GameState & { seq?: number }) => {
+        gameStateRef.current = data;
+        gameSeqRef.current = data.seq ?? 0;
+        applyGameState(data);
+      });
+
+      socketInstance.on('game_delta', (payload: ArrayBuffer | GameDelta) => {
+        const { seq, ...delta } = decodeGameDelta(payload);
+        if (!gameStateRef.current || seq !== gameSeqRef.current + 1) {
+          // Missed an update; the server answers with a full game_update
+          socketInstance.emit('resync');
+          return;
+        }
+        gameStateRef.current = { ...gameStateRef.current, ...delta };
+        gameSeqRef.current = seq;
+        applyGameState(gameStateRef.current);
       });
 
       socketInstance.on('game_over', (data: { winner: string }) => {
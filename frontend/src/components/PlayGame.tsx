@@ -24,6 +24,12 @@ const PlayGamePage: React.FC = () => {
         <Button onClick={() => handleGameButtonClick('hard')} name="play-button">
         State–action–reward–state–action
         </Button>
+        <Button onClick={() => handleGameButtonClick('bayesian')} name="play-button">
+          Bayesian Inference
+        </Button>
+        <Button onClick={() => handleGameButtonClick('expert')} name="play-button">
+          Counterfactual Regret Minimization
+        </Button>
         <Button onClick={() => handleGameButtonClick('pvp')} name="play-button" isDisabled={isDisabled} style={disabledStyle} tooltip="Coming soon">
           Play with a friend
         </Button>